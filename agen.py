@@ -1,7 +1,11 @@
-from agen import AssistantAgent, UserProxyAgent, GroupChatManager, GroupChat
 from typing import Dict, List, Optional
 import os
-from docx import Document
+from agent_context import apply_context_policies, context_stats
+from model_registry import autogen_config_list
+from report_loader import load_report_text
+from report_index import CITATION_INSTRUCTION, report_index
+from speaker_selection import PhaseSpeakerSelector
+from structured_output import QUESTIONS_SCHEMA, parse_questions, schema_instruction
 
 # Configuration
 config_list = [{"model": "gpt-4", "api_key": os.getenv("OPENAI_API_KEY")}]
@@ -11,6 +15,12 @@ config_list = [{"model": "gpt-4", "api_key": os.getenv("OPENAI_API_KEY")}]
 # ==================
 class MedicalAgentSystem:
     def __init__(self):
+        # AutoGen (and the openai client it pulls in) loads on first use, not at import
+        from autogen import AssistantAgent, GroupChat, GroupChatManager, UserProxyAgent
+
+        # Every agent (and speaker selection) reuses one keep-alive connection pool
+        llm_config = {"config_list": autogen_config_list(config_list)}
+
         # Initialize all agents
         self.user_proxy = UserProxyAgent(
             name="Patient_Proxy",
@@ -23,59 +33,68 @@ class MedicalAgentSystem:
             system_message="""Conduct structured medical interviews. Ask ONE question at a time 
                             about symptoms, duration, and severity. End with 'SUMMARY: [summary]' 
                             when complete.""",
-            llm_config={"config_list": config_list}
+            llm_config=llm_config
         )
         
         self.report_agent = AssistantAgent(
             name="Report_Analyzer",
             system_message="""Analyze medical reports and answer patient questions. 
                             Use document content to provide accurate answers.""",
-            llm_config={"config_list": config_list}
+            llm_config=llm_config
         )
         
         self.verification_agent = AssistantAgent(
             name="Symptom_Verifier",
             system_message="""Generate verification questions based on test reports 
                             and symptom summaries. Ask ONE question at a time.""",
-            llm_config={"config_list": config_list}
+            llm_config=llm_config
         )
         
         self.doctor_liaison = AssistantAgent(
             name="Doctor_Liaison",
             system_message="""Manage follow-ups and generate doctor reports. Schedule 
                             reminders and escalate urgent cases.""",
-            llm_config={"config_list": config_list}
+            llm_config=llm_config
         )
 
+        # Each agent sees only what its role needs, with old rounds condensed
+        self.context_policies = apply_context_policies([
+            self.symptom_agent, self.report_agent, self.verification_agent, self.doctor_liaison
+        ])
+
         # Set up group chat
+        # The phases run in a fixed order; the LLM picks a speaker only when that order doesn't settle it.
+        # The report reaches the chat as a DOCUMENT_UPLOAD message.
+        self.speaker_selector = PhaseSpeakerSelector()
         self.group_chat = GroupChat(
             agents=[self.user_proxy, self.symptom_agent, self.report_agent, 
                    self.verification_agent, self.doctor_liaison],
             messages=[],
-            max_round=20
+            max_round=20,
+            speaker_selection_method=self.speaker_selector
         )
-        self.manager = GroupChatManager(groupchat=self.group_chat, llm_config={"config_list": config_list})
+        self.manager = GroupChatManager(groupchat=self.group_chat, llm_config=llm_config)
 
     # ==================
     # 2. Core Functionality
     # ==================
     def process_document(self, file_path: str) -> str:
-        """Convert DOCX to text with formatting preservation"""
+        """Extract text from DOCX or PDF reports"""
         try:
-            doc = Document(file_path)
-            return "\n".join([para.text for para in doc.paragraphs])
+            return load_report_text(file_path)
         except Exception as e:
             return f"Error processing document: {str(e)}"
 
     def handle_report_qa(self, doc_text: str, question: str) -> str:
-        """Handle report-based questions with context"""
+        """Handle report-based questions with the report chunks relevant to the question"""
         prompt = f"""
-        Medical Report Content:
-        {doc_text}
+        Medical Report Excerpts:
+        {report_index(doc_text).context(question)}
         
         Patient Question: {question}
         
         Provide a detailed, professional answer in 2-3 sentences.
+        {CITATION_INSTRUCTION}
         """
         return self.report_agent.generate_reply(messages=[{"content": prompt}])
 
@@ -86,10 +105,10 @@ class MedicalAgentSystem:
         Test Findings: {report}
         
         Generate 3 verification questions to confirm symptom accuracy.
-        Format as numbered items.
+        {schema_instruction(QUESTIONS_SCHEMA)}
         """
         response = self.verification_agent.generate_reply(messages=[{"content": prompt}])
-        return [q.split(" ", 1)[1] for q in response.split("\n")[:3]]
+        return parse_questions(response, limit=3)
 
     # ==================
     # 3. Conversation Flow
@@ -127,6 +146,8 @@ class MedicalAgentSystem:
             recipient=self.manager
         )
         self.schedule_follow_up()
+        print(f"[Speaker selection] {self.speaker_selector.stats()}")
+        print(f"[Context] {context_stats(self.context_policies)}")
 
     # ==================
     # 4. Helper Methods
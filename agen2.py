@@ -1,7 +1,9 @@
-from autogen import AssistantAgent, UserProxyAgent, GroupChatManager, GroupChat
 from typing import Dict, List, Optional
 import os
-from docx import Document
+from agent_context import apply_context_policies
+from model_registry import autogen_config_list
+from report_loader import load_report_text
+from structured_output import QUESTIONS_SCHEMA, parse_questions, schema_instruction
 
 # Configuration
 config_list = [{"model": "gpt-4", "api_key": os.getenv("OPENAI_API_KEY")}]
@@ -11,6 +13,12 @@ config_list = [{"model": "gpt-4", "api_key": os.getenv("OPENAI_API_KEY")}]
 # ==================
 class MedicalAgentSystem:
     def __init__(self):
+        # AutoGen (and the openai client it pulls in) loads on first use, not at import
+        from autogen import AssistantAgent, GroupChat, GroupChatManager, UserProxyAgent
+
+        # Every agent (and speaker selection) reuses one keep-alive connection pool
+        llm_config = {"config_list": autogen_config_list(config_list)}
+
         self.user_proxy = UserProxyAgent(
             name="Patient_Proxy",
             human_input_mode="ALWAYS",  # For real patient interaction
@@ -22,30 +30,35 @@ class MedicalAgentSystem:
             system_message="""Conduct structured medical interviews. Ask ONE question at a time 
                             about symptoms, duration, and severity. End with 'SUMMARY: [summary]' 
                             when complete.""",
-            llm_config={"config_list": config_list}
+            llm_config=llm_config
         )
         
         self.report_agent = AssistantAgent(
             name="Report_Analyzer",
             system_message="""Analyze medical reports and extract key findings. Provide accurate 
                             interpretations without requiring manual text input.""",
-            llm_config={"config_list": config_list}
+            llm_config=llm_config
         )
         
         self.verification_agent = AssistantAgent(
             name="Symptom_Verifier",
             system_message="""Generate verification questions based on test reports 
                             and symptom summaries. Ask ONE question at a time.""",
-            llm_config={"config_list": config_list}
+            llm_config=llm_config
         )
         
         self.doctor_liaison = AssistantAgent(
             name="Doctor_Liaison",
             system_message="""Manage follow-ups and generate doctor reports. Schedule 
                             reminders and escalate urgent cases.""",
-            llm_config={"config_list": config_list}
+            llm_config=llm_config
         )
 
+        # Each agent sees only what its role needs, with old rounds condensed
+        self.context_policies = apply_context_policies([
+            self.symptom_agent, self.report_agent, self.verification_agent, self.doctor_liaison
+        ])
+
         # Set up group chat
         self.group_chat = GroupChat(
             agents=[self.user_proxy, self.symptom_agent, self.report_agent, 
@@ -53,17 +66,16 @@ class MedicalAgentSystem:
             messages=[],
             max_round=20
         )
-        self.manager = GroupChatManager(groupchat=self.group_chat, llm_config={"config_list": config_list})
+        self.manager = GroupChatManager(groupchat=self.group_chat, llm_config=llm_config)
 
     # ==================
     # 2. Core Functionality
     # ==================
     
     def process_document(self, file_path: str) -> str:
-        """Convert DOCX to text with formatting preservation"""
+        """Extract text from DOCX or PDF reports"""
         try:
-            doc = Document(file_path)
-            text = "\n".join([para.text for para in doc.paragraphs if para.text.strip()])
+            text = load_report_text(file_path)
             return text if text else "Error: No readable text found in the document."
         except Exception as e:
             return f"Error processing document: {str(e)}"
@@ -85,10 +97,10 @@ class MedicalAgentSystem:
         Test Findings: {report}
         
         Generate 3 verification questions to confirm symptom accuracy.
-        Format as numbered items.
+        {schema_instruction(QUESTIONS_SCHEMA)}
         """
         response = self.verification_agent.generate_reply(messages=[{"role": "user", "content": prompt}])
-        return [q.split(" ", 1)[1] for q in response.split("\n") if q.strip()][:3]  # Get first 3 questions
+        return parse_questions(response, limit=3)
 
     # ==================
     # 3. Conversation Flow
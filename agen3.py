@@ -1,8 +1,18 @@
-from autogen import AssistantAgent, UserProxyAgent, GroupChatManager, GroupChat
-from langchain_community.document_loaders import Docx2txtLoader
 from typing import Dict, List, Optional
 import os
+import uuid
 from datetime import datetime
+from llm_cache import attach_autogen_cache
+from agent_context import apply_context_policies, context_stats
+from model_registry import autogen_config_list
+from rate_limiter import stats as rate_limiter_stats
+from report_loader import load_report_text
+from report_worker import parse_report_command
+from session_archive import archive_session
+from speaker_selection import PhaseSpeakerSelector
+from structured_output import (ANALYSIS_SCHEMA, QUESTIONS_SCHEMA, format_analysis, parse_structured,
+                               request_structured, schema_instruction, stats as structured_output_stats)
+from task_graph import TaskGraph
 
 # Configuration
 config_list = [{"model": "gpt-4o-mini", "api_key": os.getenv("OPENAI_API_KEY")}]
@@ -12,6 +22,12 @@ config_list = [{"model": "gpt-4o-mini", "api_key": os.getenv("OPENAI_API_KEY")}]
 # ==================
 class MedicalAgentSystem:
     def __init__(self):
+        # AutoGen (and the openai client it pulls in) loads on first use, not at import
+        from autogen import AssistantAgent, GroupChat, GroupChatManager, UserProxyAgent
+
+        # Every agent (and speaker selection) reuses one keep-alive connection pool
+        llm_config = {"config_list": autogen_config_list(config_list)}
+
         # Initialize agents
         self.user_proxy = UserProxyAgent(
             name="Patient_Proxy",
@@ -25,7 +41,7 @@ class MedicalAgentSystem:
             system_message="""Conduct structured medical interviews. Ask ONE question at a time 
                             about symptoms, duration, and severity. End with 'SUMMARY: [summary]' 
                             when complete.""",
-            llm_config={"config_list": config_list}
+            llm_config=llm_config
         )
         
         self.report_agent = AssistantAgent(
@@ -35,7 +51,7 @@ class MedicalAgentSystem:
                             - Key Findings: Bullet points
                             - Recommendations: Clinical suggestions
                             Never mention inability to process documents.""",
-            llm_config={"config_list": config_list}
+            llm_config=llm_config
         )
         
         self.verification_agent = AssistantAgent(
@@ -43,7 +59,7 @@ class MedicalAgentSystem:
             system_message="""Generate verification questions based on test reports,
                              after the test_report is analyzed. Ask ONE question at a time.End with 'SUMMARY: [summary]' 
                             when complete.""",
-            llm_config={"config_list": config_list}
+            llm_config=llm_config
         )
         
         self.doctor_liaison = AssistantAgent(
@@ -53,76 +69,140 @@ class MedicalAgentSystem:
                             - Test Correlation
                             - Urgency Assessment
                             do not try to be a replacement for the doctor.""",
-            llm_config={"config_list": config_list}
+            llm_config=llm_config
         )
 
+        # Each agent sees only what its role needs, with old rounds condensed
+        self.context_policies = apply_context_policies([
+            self.symptom_agent, self.report_agent, self.verification_agent, self.doctor_liaison
+        ])
+
         # Configure group chat
+        # The phases run in a fixed order; the LLM picks a speaker only when that order doesn't settle it
+        self.speaker_selector = PhaseSpeakerSelector(report_available=lambda: bool(self.report_text))
         self.group_chat = GroupChat(
             agents=[self.user_proxy, self.symptom_agent, self.report_agent, 
                    self.verification_agent, self.doctor_liaison],
             messages=[],
-            max_round=40
+            max_round=40,
+            speaker_selection_method=self.speaker_selector
         )
         self.manager = GroupChatManager(
             groupchat=self.group_chat, 
-            llm_config={"config_list": config_list}
+            llm_config=llm_config
         )
         
+        # Share cached responses across all agents and the manager
+        self.llm_cache = attach_autogen_cache([
+            self.symptom_agent, self.report_agent, self.verification_agent,
+            self.doctor_liaison, self.manager
+        ])
+
         # Initialize data stores
         self.verification_data = {}
         self.report_text = ""
+        self.session_id = str(uuid.uuid4())
+
+        # Reports handed over with /report during the interview start the post-interview graph early
+        self.report_path = ""
+        self.post_interview: Optional[TaskGraph] = None
+        ask_patient = self.user_proxy.get_human_input
+
+        def get_human_input(prompt: str, **kwargs) -> str:
+            self.provide_summary()
+            reply = ask_patient(prompt, **kwargs)
+            while parse_report_command(reply):
+                self.report_path = parse_report_command(reply)
+                self.start_post_interview(self.report_path)
+                print("\n[System] Report received. It's being analysed while we continue.")
+                reply = ask_patient(prompt, **kwargs)
+            return reply
+
+        self.user_proxy.get_human_input = get_human_input
 
     # ==================
     # 2. Core Functionality
     # ==================
     def process_document(self, file_path: str) -> str:
-        """Process DOCX files using LangChain loader"""
+        """Extract text from DOCX or PDF reports"""
         try:
-            loader = Docx2txtLoader(file_path)
-            docs = loader.load()
-            return "\n\n".join([doc.page_content for doc in docs if doc.page_content.strip()])
+            return load_report_text(file_path)
         except Exception as e:
             return f"Document processing error: {str(e)}"
 
     def analyze_report(self, doc_text: str) -> str:
         """Force structured report analysis"""
+        # Task first and the report last, so the instructions stay a provider-cached prefix
         prompt = f"""
         MEDICAL REPORT ANALYSIS TASK:
+        Give a 2-3 sentence overview, the key findings and your recommendations.
+        {schema_instruction(ANALYSIS_SCHEMA)}
+
         {doc_text}
-        
-        Respond EXACTLY in this format:
-        
-        Report Summary: [2-3 sentence overview]
-        
-        Key Findings:
-        - Finding 1
-        - Finding 2
-        - Finding 3
-        
-        Recommendations:
-        - Recommendation 1
-        - Recommendation 2
         """
-        return self.report_agent.generate_reply(
+        reply = self.report_agent.generate_reply(
             messages=[{"role": "user", "content": prompt}]
         )
+        analysis = parse_structured(reply, ANALYSIS_SCHEMA)
+        return format_analysis(analysis) if analysis else reply
 
-    def generate_verification_questions(self) -> List[str]:
+    def generate_verification_questions(self, report_text: Optional[str] = None,
+                                        summary: Optional[str] = None) -> List[str]:
         """Create symptom verification questions"""
         prompt = f"""
-        Symptom Summary: {self.extract_summary()}
-        Test Report: {self.report_text}
-        
         Generate 3 verification questions to confirm symptom-report correlation.
-        Format as:
-        1. Question 1
-        2. Question 2
-        3. Question 3
+        {schema_instruction(QUESTIONS_SCHEMA)}
+
+        Symptom Summary: {summary or self.extract_summary()}
+        Test Report: {report_text or self.report_text}
         """
-        response = self.verification_agent.generate_reply(
-            messages=[{"role": "user", "content": prompt}]
+        questions = request_structured(
+            lambda: self.verification_agent.generate_reply(messages=[{"role": "user", "content": prompt}]),
+            QUESTIONS_SCHEMA
         )
-        return [q.split(" ", 1)[1].strip() for q in response.split("\n")[:3]]
+        return questions["questions"][:3] if questions else []
+
+    def build_post_interview_graph(self, file_path: str) -> TaskGraph:
+        """Post-interview steps as a dependency graph, started at once.
+
+        Analysis and verification questions both need only the report text
+        (questions also the summary), so they run side by side; the final
+        report waits for the summary, report text and answers, not the analysis.
+        The summary and answers are inputs supplied from the interview.
+        """
+        def failed(text: str) -> bool:
+            return not text or text.startswith("Document processing error")
+
+        graph = TaskGraph()
+        graph.add_input("summary")
+        graph.add_input("answers")
+        if file_path:
+            graph.add("report_text", lambda: self.process_document(file_path))
+        else:
+            graph.add_value("report_text", "")
+        graph.add("analysis", lambda report_text: None if failed(report_text) else self.analyze_report(report_text),
+                  deps=["report_text"])
+        graph.add("questions",
+                  lambda report_text, summary: [] if failed(report_text)
+                  else self.generate_verification_questions(report_text, summary),
+                  deps=["report_text", "summary"])
+        graph.add("final_report", self.generate_final_report, deps=["summary", "report_text", "answers"])
+        return graph.start()
+
+    def start_post_interview(self, file_path: str) -> TaskGraph:
+        """Start the graph for this report, cancelling the one for an earlier report so it stops using the model"""
+        if self.post_interview is not None:
+            self.post_interview.cancel()
+        self.post_interview = self.build_post_interview_graph(file_path)
+        return self.post_interview
+
+    def provide_summary(self, final: bool = False) -> None:
+        """Hand the symptom summary to the graph once the chat has one (or the chat is over)"""
+        graph = self.post_interview
+        if graph is None or graph.future("summary").done():
+            return
+        if final or any("SUMMARY:" in str(m.get("content") or "") for m in self.group_chat.messages):
+            graph.set_input("summary", self.extract_summary())
 
     # ==================
     # 3. Conversation Flow
@@ -135,20 +215,25 @@ class MedicalAgentSystem:
         # Phase 1: Symptom Collection
         self.user_proxy.initiate_chat(
             self.manager,
+            cache=self.llm_cache,
             message="we shall begin the symptom assessment."
         )
         
-        # Phase 2: Report Handling
-        doc_path = input("\nUpload DOCX report path (or press Enter to skip): ").strip()
+        # Phase 2: Report Handling (already under way if it was sent with /report)
+        doc_path = self.report_path or input("\nUpload DOCX/PDF report path (or press Enter to skip): ").strip()
+        if self.post_interview is None or doc_path != self.report_path:
+            self.start_post_interview(doc_path)
+        graph = self.post_interview
+        self.provide_summary(final=True)
         if doc_path:
-            self.report_text = self.process_document(doc_path)
-            if not self.report_text.startswith("Error"):
-                print("\nAnalyzing report...")
-                analysis = self.analyze_report(self.report_text)
+            print("\nAnalyzing report...")
+            self.report_text = graph.result("report_text")
+            analysis = graph.result("analysis")
+            if analysis is not None:
                 print(f"\nReport Analysis:\n{analysis}")
                 
-                # Phase 3: Verification Questions
-                questions = self.generate_verification_questions()
+                # Phase 3: Verification Questions (generated alongside the analysis)
+                questions = graph.result("questions")
                 print("\nVerification Questions:")
                 for i, q in enumerate(questions, 1):
                     user_input = input(f"{i}. {q}\nYour answer: ")
@@ -156,12 +241,19 @@ class MedicalAgentSystem:
         
         # Phase 4: Final Reporting
         print("\nGenerating final report...")
-        final_report = self.generate_final_report()
+        graph.set_input("answers", self.verification_data)
+        final_report = graph.result("final_report")
         print("\n" + "="*40)
         print(" Final Doctor Report ")
         print("="*40)
         print(final_report)
         print("\nFollow-up scheduled in 3 days. Thank you!")
+        print(f"[Speaker selection] {self.speaker_selector.stats()}")
+        print(f"[Context] {context_stats(self.context_policies)}")
+        print(f"[Task graph] {graph.stats()}")
+        print(f"[Structured output] {structured_output_stats()}")
+        print(f"[Rate limiter] {rate_limiter_stats()}")
+        graph.shutdown()
 
     # ==================
     # 4. Reporting & Utilities
@@ -173,26 +265,38 @@ class MedicalAgentSystem:
                 return msg["content"].split("SUMMARY:")[-1].strip()
         return "No symptom summary available"
 
-    def generate_final_report(self) -> str:
+    def generate_final_report(self, summary: Optional[str] = None, report_text: Optional[str] = None,
+                              answers: Optional[Dict] = None) -> str:
         """Compile comprehensive doctor report"""
+        report_text = self.report_text if report_text is None else report_text
+        answers = self.verification_data if answers is None else answers
         prompt = f"""
+        Create a detailed medical report including:
+        - Clinical Assessment
+        - Urgency Level (Low/Medium/High)
+        do not take the role of the doctor in any case.
+
         Patient Summary:
-        {self.extract_summary()}
+        {summary or self.extract_summary()}
         
         Test Findings:
-        {self.report_text if self.report_text else 'No reports submitted'}
+        {report_text if report_text else 'No reports submitted'}
         
         Verification Answers:
-        {self.verification_data}
-        
-        Create a detailed medical report including:
-        - Clinical Assessment
-        - Urgency Level (Low/Medium/High)
-        do not take the role of the doctor in any case.
+        {answers}
         """
-        return self.doctor_liaison.generate_reply(
+        report = self.doctor_liaison.generate_reply(
             messages=[{"role": "user", "content": prompt}]
         )
+        # Keep the report searchable instead of only printing it
+        archive_session(
+            self.session_id,
+            report.get("content", "") if isinstance(report, dict) else str(report or ""),
+            report_text=report_text,
+            verification=answers,
+            source="agen3"
+        )
+        return report
 
 # ==================
 # 5. Execution
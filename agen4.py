@@ -1,17 +1,33 @@
-from autogen import AssistantAgent, UserProxyAgent, GroupChatManager, GroupChat
-from langchain_community.document_loaders import Docx2txtLoader
 from typing import Dict, List, Optional
 import os
+import uuid
 from datetime import datetime
+from llm_cache import attach_autogen_cache
+from agent_context import apply_context_policies, context_stats
+from model_registry import autogen_config_list
+from model_tiers import apply_autogen_tiers, stats as model_tier_stats
+from report_loader import load_report_text
+from report_worker import ReportPreprocessor, parse_report_command
+from session_archive import archive_session
+from structured_output import ANALYSIS_SCHEMA, format_analysis, parse_structured, schema_instruction
 
 # Configuration
 config_list = [{"model": "gpt-4", "api_key": os.getenv("OPENAI_API_KEY")}]
+# Agents answer on the first model and escalate only replies that fail validation
+# (MODEL_TIERS_<AGENT_NAME> overrides per agent); the GroupChatManager stays on config_list
+AGENT_TIERS = ["gpt-4o-mini", "gpt-4"]
 
 # ==================
 # 1. Medical Agent System (Fixed Version)
 # ==================
 class MedicalAgentSystem:
     def __init__(self):
+        # AutoGen (and the openai client it pulls in) loads on first use, not at import
+        from autogen import AssistantAgent, GroupChat, GroupChatManager, UserProxyAgent
+
+        # Every agent (and speaker selection) reuses one keep-alive connection pool
+        llm_config = {"config_list": autogen_config_list(config_list)}
+
         # Initialize agents with proper conversation control
         self.user_proxy = UserProxyAgent(
             name="Patient_Proxy",
@@ -26,7 +42,7 @@ class MedicalAgentSystem:
             system_message="""You are a medical interview specialist. Ask ONE question at a time 
                             about symptoms, duration, and severity. End with 'SUMMARY: [summary]' 
                             when complete. After each question, wait for patient response.""",
-            llm_config={"config_list": config_list}
+            llm_config=llm_config
         )
         
         self.report_agent = AssistantAgent(
@@ -35,14 +51,14 @@ class MedicalAgentSystem:
                             - Report Summary: 2-3 sentence overview
                             - Key Findings: Bullet points
                             - Recommendations: Clinical suggestions""",
-            llm_config={"config_list": config_list}
+            llm_config=llm_config
         )
         
         self.verification_agent = AssistantAgent(
             name="Symptom_Verifier",
             system_message="""Generate verification questions based on test reports. 
                             Ask ONE question at a time. Wait for patient response.""",
-            llm_config={"config_list": config_list}
+            llm_config=llm_config
         )
         
         self.doctor_liaison = AssistantAgent(
@@ -52,9 +68,18 @@ class MedicalAgentSystem:
                             - Test Correlation
                             - Urgency Assessment
                             - Recommended Next Steps""",
-            llm_config={"config_list": config_list}
+            llm_config=llm_config
         )
 
+        # Each agent sees only what its role needs, with old rounds condensed
+        self.context_policies = apply_context_policies([
+            self.symptom_agent, self.report_agent, self.verification_agent, self.doctor_liaison
+        ])
+
+        self.model_tiers = apply_autogen_tiers([
+            self.symptom_agent, self.report_agent, self.verification_agent, self.doctor_liaison
+        ], config_list, AGENT_TIERS)
+
         # Configure group chat with explicit turn control
         self.group_chat = GroupChat(
             agents=[self.user_proxy, self.symptom_agent, self.report_agent, 
@@ -66,47 +91,70 @@ class MedicalAgentSystem:
         
         self.manager = GroupChatManager(
             groupchat=self.group_chat,
-            llm_config={"config_list": config_list}
+            llm_config=llm_config
         )
         
+        # Share cached responses across all agents and the manager
+        self.llm_cache = attach_autogen_cache([
+            self.symptom_agent, self.report_agent, self.verification_agent,
+            self.doctor_liaison, self.manager
+        ])
+
         # Initialize data stores
         self.verification_data = {}
         self.report_text = ""
+        self.session_id = str(uuid.uuid4())
+
+        # Reports handed over with /report during the interview are processed in the background
+        self.report_path = ""
+        self.reports = ReportPreprocessor(self.preprocess_report)
+        ask_patient = self.user_proxy.get_human_input
+
+        def get_human_input(prompt: str, **kwargs) -> str:
+            reply = ask_patient(prompt, **kwargs)
+            while parse_report_command(reply):
+                self.report_path = parse_report_command(reply)
+                self.reports.submit(self.report_path)
+                print("\n[System] Report received. It's being analysed while we continue.")
+                reply = ask_patient(prompt, **kwargs)
+            return reply
+
+        self.user_proxy.get_human_input = get_human_input
 
     # ==================
     # 2. Core Functionality
     # ==================
     def process_document(self, file_path: str) -> str:
-        """Process DOCX files using LangChain loader"""
+        """Extract text from DOCX or PDF reports"""
         try:
-            loader = Docx2txtLoader(file_path)
-            docs = loader.load()
-            return "\n\n".join([doc.page_content for doc in docs if doc.page_content.strip()])
+            return load_report_text(file_path)
         except Exception as e:
             return f"Document processing error: {str(e)}"
 
     def analyze_report(self, doc_text: str) -> str:
         """Structured report analysis"""
+        # Task first and the report last, so the instructions stay a provider-cached prefix
         prompt = f"""
         MEDICAL REPORT ANALYSIS TASK:
+        Give a 2-3 sentence overview, the key findings and your recommendations.
+        {schema_instruction(ANALYSIS_SCHEMA)}
+
         {doc_text}
-        
-        Respond in this format:
-        
-        Report Summary: [2-3 sentence overview]
-        
-        Key Findings:
-        - Finding 1
-        - Finding 2
-        - Finding 3
-        
-        Recommendations:
-        - Recommendation 1
-        - Recommendation 2
         """
-        return self.report_agent.generate_reply(
-            messages=[{"role": "user", "content": prompt}]
-        )
+        # Replies that don't match the schema escalate to the next tier
+        with self.model_tiers[self.report_agent.name].expecting(ANALYSIS_SCHEMA):
+            reply = self.report_agent.generate_reply(
+                messages=[{"role": "user", "content": prompt}]
+            )
+        analysis = parse_structured(reply, ANALYSIS_SCHEMA)
+        return format_analysis(analysis) if analysis else reply
+
+    def preprocess_report(self, file_path: str) -> Dict:
+        """Text and analysis for a report (runs on the worker thread)"""
+        text = self.process_document(file_path)
+        if text.startswith("Document processing error"):
+            return {"text": text, "analysis": None}
+        return {"text": text, "analysis": self.analyze_report(text)}
 
     # ==================
     # 3. Fixed Conversation Flow
@@ -119,18 +167,20 @@ class MedicalAgentSystem:
         # Phase 1: Symptom Collection
         self.user_proxy.initiate_chat(
             self.manager,
+            cache=self.llm_cache,
             message="Let's begin the symptom assessment.",
             clear_history=True
         )
         
-        # Phase 2: Report Handling
-        doc_path = input("\nUpload DOCX report path (or press Enter to skip): ").strip()
+        # Phase 2: Report Handling (already under way if it was sent with /report)
+        doc_path = self.report_path or input("\nUpload DOCX/PDF report path (or press Enter to skip): ").strip()
         if doc_path:
-            self.report_text = self.process_document(doc_path)
-            if not self.report_text.startswith("Error"):
-                print("\nAnalyzing report...")
-                analysis = self.analyze_report(self.report_text)
-                print(f"\nReport Analysis:\n{analysis}")
+            print("\nAnalyzing report...")
+            self.reports.submit(doc_path)
+            report = self.reports.result(doc_path)
+            self.report_text = report["text"]
+            if report["analysis"] is not None:
+                print(f"\nReport Analysis:\n{report['analysis']}")
                 
                 # Phase 3: Verification Questions
                 self._handle_verification_phase()
@@ -162,23 +212,35 @@ class MedicalAgentSystem:
             messages=[{
                 "role": "user",
                 "content": f"""
-                Patient Summary: {self._extract_summary()}
-                Test Findings: {self.report_text}
-                Verification Answers: {self.verification_data}
-                
                 Create a clinical report with:
                 1. Symptom Analysis
                 2. Test Correlation
                 3. Urgency Level
                 4. Recommended Next Steps
+
+                Patient Summary: {self._extract_summary()}
+                Test Findings: {self.report_text}
+                Verification Answers: {self.verification_data}
                 """
             }]
         )
+        # generate_reply returns a str or a message dict
+        content = final_report.get("content", "") if isinstance(final_report, dict) else str(final_report or "")
+        archive_session(
+            self.session_id,
+            content,
+            report_text=self.report_text,
+            verification=self.verification_data,
+            source="agen4"
+        )
         print("\n" + "="*40)
         print(" Final Doctor Report ")
         print("="*40)
-        print(final_report.content)
+        print(content)
         print("\nFollow-up scheduled in 3 days. Thank you!")
+        print(f"[Context] {context_stats(self.context_policies)}")
+        print(f"[Report worker] {self.reports.stats()}")
+        print(f"[Model tiers] {model_tier_stats()}")
 
     def _extract_summary(self) -> str:
         """Extract symptom summary from chat history"""
@@ -1,13 +1,20 @@
-from autogen import AssistantAgent, UserProxyAgent, GroupChatManager, GroupChat
-from langchain_community.document_loaders import Docx2txtLoader
 from typing import Dict, List, Optional
 import os
+from agent_context import apply_context_policies
+from model_registry import autogen_config_list
+from report_loader import load_report_text
 
 # Configuration
 config_list = [{"model": "gpt-4", "api_key": os.getenv("OPENAI_API_KEY")}]
 
 class MedicalAgentSystem:
     def __init__(self):
+        # AutoGen (and the openai client it pulls in) loads on first use, not at import
+        from autogen import AssistantAgent, GroupChat, GroupChatManager, UserProxyAgent
+
+        # Every agent (and speaker selection) reuses one keep-alive connection pool
+        llm_config = {"config_list": autogen_config_list(config_list)}
+
         # Initialize core agents
         self.user_proxy = UserProxyAgent(
             name="Patient_Proxy",
@@ -27,7 +34,7 @@ class MedicalAgentSystem:
                             - other relevant questions
                             ask atleast 5 questions
                             End with 'SUMMARY: [summary]' when complete.""",
-            llm_config={"config_list": config_list}
+            llm_config=llm_config
         )
         
         # Phase 2: Report Analysis Agent
@@ -39,7 +46,7 @@ class MedicalAgentSystem:
                             - Key Findings: Bullet points
                             - Recommendations: Clinical steps
                             Say "I don't see any reports" if none provided.""",
-            llm_config={"config_list": config_list}
+            llm_config=llm_config
         )
         
         # Phase 3: Verification Agent
@@ -47,7 +54,7 @@ class MedicalAgentSystem:
             name="Symptom_Verifier",
             system_message="""ask the patient if he/she is experiencing the symptoms that are tested positive in the report. atleast ask 5 questions. Ask ONE question at a time.
                             Format: "VERIFICATION: [question]" """,
-            llm_config={"config_list": config_list}
+            llm_config=llm_config
         )
         
         # Phase 4: Reporting Agent
@@ -58,9 +65,14 @@ class MedicalAgentSystem:
                             - Test Correlation
                             - Urgency Level
                             - Next Steps""",
-            llm_config={"config_list": config_list}
+            llm_config=llm_config
         )
 
+        # Each agent sees only what its role needs, with old rounds condensed
+        self.context_policies = apply_context_policies([
+            self.symptom_agent, self.report_agent, self.verification_agent, self.doctor_liaison
+        ])
+
         # Phase-specific group chats
         self.symptom_chat = GroupChat(
             agents=[self.user_proxy, self.symptom_agent],
@@ -84,6 +96,8 @@ class MedicalAgentSystem:
         )
 
     def run_interview(self):
+        from autogen import GroupChatManager
+
         print("="*40)
         print(" Medical Interview Session Started ")
         print("="*40)
@@ -99,7 +113,7 @@ class MedicalAgentSystem:
         symptom_summary = self._extract_summary(self.symptom_chat.messages)
         
         # Phase 2: Report Handling
-        doc_path = input("\nUpload DOCX report path (or Enter to skip): ").strip()
+        doc_path = input("\nUpload DOCX/PDF report path (or Enter to skip): ").strip()
         report_text = ""
         if doc_path:
             report_text = self.process_document(doc_path)
@@ -129,9 +143,9 @@ class MedicalAgentSystem:
         print("="*40)
 
     def process_document(self, path: str) -> str:
+        """Extract text from DOCX or PDF reports"""
         try:
-            loader = Docx2txtLoader(path)
-            return "\n".join([doc.page_content for doc in loader.load()])
+            return load_report_text(path)
         except Exception as e:
             return f"Error processing document: {str(e)}"
 
@@ -0,0 +1,164 @@
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from conversation_memory import count_tokens, truncate_to_tokens
+from speaker_selection import REPORT_MARKER, SUMMARY_MARKER
+
+# ==================
+# 1. Configuration
+# ==================
+# Budget for the condensed note that replaces rounds older than keep_last
+CONDENSED_TOKENS = int(os.getenv("AGENT_CONDENSED_TOKENS", 400))
+CONDENSED_LINE_TOKENS = 40
+# Budget for each artifact (summary, report, analysis) handed to an agent
+ARTIFACT_TOKENS = int(os.getenv("AGENT_ARTIFACT_TOKENS", 800))
+
+PATIENT_NAME = "Patient_Proxy"
+
+# artifact -> (label, predicate on a message)
+ARTIFACTS = {
+    "symptom_summary": ("Symptom summary",
+                        lambda m: m.get("name") == "Symptom_Collector" and SUMMARY_MARKER in _content(m)),
+    "report": ("Test report", lambda m: REPORT_MARKER in _content(m)),
+    "report_analysis": ("Report analysis", lambda m: m.get("name") == "Report_Analyzer"),
+    "verification_summary": ("Verification summary",
+                             lambda m: m.get("name") == "Symptom_Verifier" and SUMMARY_MARKER in _content(m)),
+}
+
+# What each agent sees: its role's artifacts, then its own recent turns with the patient.
+# "since" drops everything before that artifact, so later phases never see the raw interview.
+CONTEXT_POLICIES = {
+    "Symptom_Collector": {"artifacts": [], "keep_last": 8, "since": None},
+    "Report_Analyzer": {"artifacts": ["symptom_summary", "report"], "keep_last": 2, "since": "symptom_summary"},
+    "Symptom_Verifier": {"artifacts": ["symptom_summary", "report_analysis"], "keep_last": 6,
+                         "since": "symptom_summary"},
+    "Doctor_Liaison": {"artifacts": ["symptom_summary", "report_analysis", "verification_summary"],
+                       "keep_last": 2, "since": "symptom_summary"},
+}
+
+
+def _content(message: dict) -> str:
+    return str(message.get("content") or "")
+
+
+def _artifact_text(key: str, message: dict) -> str:
+    text = _content(message)
+    for marker in (SUMMARY_MARKER, REPORT_MARKER):
+        if marker in text:
+            text = text.split(marker)[-1]
+            break
+    return truncate_to_tokens(text.strip(), ARTIFACT_TOKENS)
+
+
+def _tokens(messages: List[dict]) -> int:
+    return sum(count_tokens(_content(m)) for m in messages)
+
+
+# ==================
+# 2. Per-agent transform
+# ==================
+class RoleContext:
+    """AutoGen message transform that rebuilds an agent's view of the group chat.
+
+    Artifacts the role needs go first in one message, rounds older than
+    keep_last are folded into a condensed note with a fixed budget, and the
+    newest turns stay verbatim, so the prompt stops growing with the chat.
+    Direct generate_reply calls (a single prompt message) pass through.
+    """
+
+    def __init__(self, agent_name: str, artifacts: List[str], keep_last: int, since: Optional[str] = None):
+        self.agent_name = agent_name
+        self.artifacts = artifacts
+        self.keep_last = keep_last
+        self.since = since
+        self.stats = {"rounds": 0, "tokens_before": 0, "tokens_after": 0}
+
+    def _latest(self, messages: List[dict], key: str) -> Optional[int]:
+        matches = ARTIFACTS[key][1]
+        return next((i for i in range(len(messages) - 1, -1, -1) if matches(messages[i])), None)
+
+    def _is_turn(self, message: dict) -> bool:
+        name = message.get("name")
+        if name is None:
+            return True
+        return name in (self.agent_name, PATIENT_NAME)
+
+    def _condense(self, older: List[dict]) -> str:
+        lines = [f"{m.get('name') or m.get('role')}: {truncate_to_tokens(_content(m).strip(), CONDENSED_LINE_TOKENS)}"
+                 for m in older]
+        # Newest lines win when the note is over budget
+        kept, used = [], 0
+        for line in reversed(lines):
+            cost = count_tokens(line)
+            if used + cost > CONDENSED_TOKENS:
+                kept.append("...")
+                break
+            kept.append(line)
+            used += cost
+        return "\n".join(reversed(kept))
+
+    def apply_transform(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if len(messages) <= 1:
+            return messages
+        artifact_index = {key: self._latest(messages, key) for key in ARTIFACTS}
+        start = -1
+        if self.since:
+            # Before that phase has produced its artifact the earlier turns aren't this role's business
+            start = artifact_index[self.since] if artifact_index[self.since] is not None else len(messages)
+        artifact_positions = {i for key, i in artifact_index.items() if key in self.artifacts and i is not None}
+
+        turns = [
+            m for i, m in enumerate(messages[:-1])
+            if i > start and i not in artifact_positions and self._is_turn(m)
+        ]
+        # The message being answered is always kept, whoever sent it
+        turns.append(messages[-1])
+        older, recent = turns[:-self.keep_last], turns[-self.keep_last:]
+
+        sections = [
+            f"{ARTIFACTS[key][0]}:\n{_artifact_text(key, messages[artifact_index[key]])}"
+            for key in self.artifacts
+            if artifact_index[key] is not None and artifact_index[key] != len(messages) - 1
+        ]
+        if older:
+            note = self._condense(older)
+            # Short interviews cost less verbatim than condensed
+            if count_tokens(note) < _tokens(older):
+                sections.append(f"Earlier turns (condensed):\n{note}")
+            else:
+                recent = older + recent
+        transformed = ([{"role": "user", "content": "\n\n".join(sections)}] if sections else []) + recent
+
+        self.stats["rounds"] += 1
+        self.stats["tokens_before"] += _tokens(messages)
+        self.stats["tokens_after"] += _tokens(transformed)
+        return transformed
+
+    def get_logs(self, pre_transform_messages: List[Dict[str, Any]],
+                 post_transform_messages: List[Dict[str, Any]]) -> Tuple[str, bool]:
+        before, after = _tokens(pre_transform_messages), _tokens(post_transform_messages)
+        return (f"{self.agent_name}: {len(pre_transform_messages)} messages ({before} tokens) -> "
+                f"{len(post_transform_messages)} ({after} tokens)", before != after)
+
+
+# ==================
+# 3. Wiring
+# ==================
+def apply_context_policies(agents: List[Any]) -> Dict[str, RoleContext]:
+    """Attach each agent's policy (agents without one keep the full transcript)"""
+    from autogen.agentchat.contrib.capabilities.transform_messages import TransformMessages
+
+    contexts = {}
+    for agent in agents:
+        policy = CONTEXT_POLICIES.get(agent.name)
+        if policy is None:
+            continue
+        context = RoleContext(agent.name, **policy)
+        TransformMessages(transforms=[context], verbose=False).add_to_agent(agent)
+        contexts[agent.name] = context
+    return contexts
+
+
+def context_stats(contexts: Dict[str, RoleContext]) -> Dict[str, Dict[str, int]]:
+    """Prompt tokens each agent would have been sent vs. what it was sent"""
+    return {name: dict(context.stats) for name, context in contexts.items() if context.stats["rounds"]}
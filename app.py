@@ -1,10 +1,18 @@
 from typing import TypedDict, List, Dict, Optional
-from langchain_community.document_loaders import Docx2txtLoader
 from langchain_core.prompts import ChatPromptTemplate
 from langgraph.graph import StateGraph, END
 from langchain.memory import ConversationBufferMemory
-from langchain_community.chat_models import ChatOpenAI
 import re
+from llm_cache import enable_llm_cache
+from model_registry import chat_model
+from report_loader import load_report_text
+from report_index import CITATION_INSTRUCTION, report_index
+from structured_output import QUESTIONS_SCHEMA, parse_questions, schema_instruction
+
+# Share cached responses across every ChatOpenAI call site
+llm_cache = enable_llm_cache()
+# Every node shares one model instance and its pooled connections
+llm = chat_model("gpt-4o-mini", temperature=0.2)
 
 # ==================
 # 1. Enhanced State
@@ -60,24 +68,27 @@ def test_report_processor_node(state: AgentState):
     if state["conversation_phase"] != "report" or not state.get("uploaded_files"):
         return state
 
-    # Load document only once
+    # Load document only once; re-uploads of the same file hit the extraction cache
     if not state.get("report_text"):
-        loader = Docx2txtLoader(state["uploaded_files"][0])
-        docs = loader.load()
-        state["report_text"] = "\n".join([doc.page_content for doc in docs])
+        state["report_text"] = load_report_text(state["uploaded_files"][0])
+        report_index(state["report_text"])  # Chunk and index at ingestion
     
     # Process only report-related questions
     last_msg = state["messages"][-1]
     if last_msg["type"] == "human" and "report" in last_msg["content"].lower():
         qa_prompt = ChatPromptTemplate.from_template("""
-        Report: {report}
+        Report excerpts:
+        {report}
         Question: {question}
+        {citation}
         Answer:""")
         
         answer = qa_prompt | llm
         response = answer.invoke({
-            "report": state["report_text"],
-            "question": last_msg["content"]
+            # Only the chunks relevant to this question, not the whole report
+            "report": report_index(state["report_text"]).context(last_msg["content"]),
+            "question": last_msg["content"],
+            "citation": CITATION_INSTRUCTION
         })
         state["messages"].append({"type": "ai", "content": response.content})
     
@@ -91,13 +102,11 @@ def verification_generator_node(state: AgentState):
         prompt = ChatPromptTemplate.from_template("""
         Generate 3 verification questions for these findings:
         {report}
-        Format as numbered questions.""")
+        {format}""")
         
         questions = prompt | llm
-        response = questions.invoke({"report": state["report_text"]})
-        state["verification_questions"] = [
-            q.strip() for q in response.content.split("\n") if q.strip().startswith("1") or q.strip().startswith("2") or q.strip().startswith("3")
-        ][:3]
+        response = questions.invoke({"report": state["report_text"], "format": schema_instruction(QUESTIONS_SCHEMA)})
+        state["verification_questions"] = parse_questions(response.content, limit=3)
         state["conversation_phase"] = "verification"
         state["messages"].append({"type": "ai", "content": "Please verify:\n" + "\n".join(state["verification_questions"])})
     
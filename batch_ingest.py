@@ -0,0 +1,134 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+from dotenv import load_dotenv
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_openai import ChatOpenAI
+
+from llm_cache import enable_llm_cache
+from model_registry import chat_model
+from report_cache import file_digest
+from report_loader import SUPPORTED_EXTENSIONS, load_report_text
+from structured_output import (ANALYSIS_SCHEMA, QUESTIONS_SCHEMA, format_analysis, parse_questions, parse_structured,
+                               schema_instruction)
+
+# ==================
+# 1. Prompts
+# ==================
+ANALYSIS_PROMPT = """Analyze this medical test report: a 2-3 sentence overview, the key findings
+and recommendations.
+""" + schema_instruction(ANALYSIS_SCHEMA)
+
+QUESTIONS_PROMPT = """Analyze this test report and generate specific yes/no questions
+to verify patient experiences. Write each question as '[finding]: [question]'.
+""" + schema_instruction(QUESTIONS_SCHEMA)
+
+
+# ==================
+# 2. Pipeline stages
+# ==================
+def find_reports(input_dir: str) -> List[str]:
+    return sorted(
+        os.path.join(input_dir, name) for name in os.listdir(input_dir)
+        if name.lower().endswith(SUPPORTED_EXTENSIONS) and not name.startswith("~$")
+    )
+
+
+def load_completed(output_path: str) -> Dict[str, str]:
+    """Paths already processed successfully, with the content hash they were processed at"""
+    completed = {}
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Torn last line from a crash
+            if record.get("status") == "ok":
+                completed[record["path"]] = record["sha256"]
+    return completed
+
+
+async def analyze_report(llm: ChatOpenAI, slots: asyncio.Semaphore, text: str) -> Dict[str, object]:
+    async def ask(system_prompt: str) -> str:
+        async with slots:
+            response = await llm.ainvoke([SystemMessage(content=system_prompt), HumanMessage(content=text)])
+        return response.content
+
+    analysis, questions = await asyncio.gather(ask(ANALYSIS_PROMPT), ask(QUESTIONS_PROMPT))
+    structured = parse_structured(analysis, ANALYSIS_SCHEMA)
+    return {
+        "analysis": format_analysis(structured) if structured else analysis,
+        "questions": parse_questions(questions),
+    }
+
+
+# ==================
+# 3. Batch runner
+# ==================
+async def run_batch(input_dir: str, output_path: str, workers: int = os.cpu_count() or 1,
+                    max_concurrent_llm: int = 8, model: str = "gpt-4o") -> Dict[str, int]:
+    completed = load_completed(output_path)
+    reports = find_reports(input_dir)
+    llm = chat_model(model, temperature=0.1)
+    slots = asyncio.Semaphore(max_concurrent_llm)
+    # Caps how many extracted texts are held in memory waiting for the model
+    in_flight = asyncio.Semaphore(max_concurrent_llm * 2)
+    counts = {"ok": 0, "error": 0, "skipped": 0}
+    loop = asyncio.get_running_loop()
+
+    with open(output_path, "a", encoding="utf-8") as out, ProcessPoolExecutor(max_workers=workers) as pool:
+        def write(record: dict) -> None:
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            os.fsync(out.fileno())
+            counts[record["status"]] += 1
+
+        async def process(file_path: str) -> None:
+            async with in_flight:
+                started = time.perf_counter()
+                digest = None
+                try:
+                    digest = await loop.run_in_executor(pool, file_digest, file_path)
+                    if completed.get(file_path) == digest:
+                        counts["skipped"] += 1
+                        return
+                    text = await loop.run_in_executor(pool, load_report_text, file_path, digest)
+                    result = await analyze_report(llm, slots, text)
+                    write({
+                        "path": file_path,
+                        "sha256": digest,
+                        "status": "ok",
+                        "seconds": round(time.perf_counter() - started, 3),
+                        **result,
+                    })
+                except Exception as e:
+                    write({"path": file_path, "sha256": digest, "status": "error", "error": str(e)})
+
+        await asyncio.gather(*(process(path) for path in reports))
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze a directory of test reports into JSONL")
+    parser.add_argument("input_dir")
+    parser.add_argument("output", help="JSONL file; re-running resumes after the last processed report")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="text extraction processes")
+    parser.add_argument("--max-concurrent-llm", type=int, default=8)
+    parser.add_argument("--model", default="gpt-4o")
+    args = parser.parse_args()
+
+    load_dotenv()
+    enable_llm_cache()
+    counts = asyncio.run(run_batch(args.input_dir, args.output, args.workers, args.max_concurrent_llm, args.model))
+    print(f"Processed {counts['ok']} reports, {counts['error']} errors, {counts['skipped']} already done")
+
+
+if __name__ == "__main__":
+    main()
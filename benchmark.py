@@ -0,0 +1,456 @@
+import argparse
+import builtins
+import contextlib
+import glob
+import importlib
+import io
+import json
+import logging
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+from fake_llm import RESPONDERS, LatencyModel, ScriptedChatModel, ScriptedModelClient, ScriptedResponder
+
+# ==================
+# 1. Scripted model behaviour
+# ==================
+SYMPTOM_QUESTIONS = [
+    "When did this start?",
+    "How severe is it on a scale of 1-10?",
+    "Where exactly do you feel it?",
+    "Does anything make it better or worse?",
+    "Have you noticed any other symptoms?",
+    "Are you taking any medication for it?",
+    "SUMMARY: Patient reports the symptoms described, with duration, severity and triggers noted.",
+]
+
+DEFAULT_RULES = [
+    # AutoGen speaker selection alternates the interviewer and the patient
+    (r"select the next role|name of the next speaker", ["Symptom_Collector", "Patient_Proxy"] * 40),
+    # Ambiguous supervisor states ask for the report; scripts without one keep talking
+    (r"medical workflow supervisor", "process_report"),
+    # Batched verification analysis; questions it leaves out fall back to single calls
+    (r"Analyze the patient's answers", json.dumps({"answers": [
+        {"question": i, "answer": "as reported", "analysis": "Response is consistent with the report findings."}
+        for i in range(1, 4)
+    ]})),
+    (r"running clinical summary", "Patient reports symptoms with duration, severity and triggers noted."),
+    (r"yes/no questions|verification questions",
+     "1. Do your symptoms get worse around animals?\n2. Have you had skin rashes?\n3. Does dust trigger sneezing?"),
+    (r"REPORT ANALYSIS|Analyze this medical test report|Analyze medical reports",
+     "Report Summary: Sensitization to common aeroallergens.\n\nKey Findings:\n- Positive to cat dander\n- Positive to dust mite\n\nRecommendations:\n- Allergen avoidance"),
+    (r"Analyze patient's response", "Response is consistent with the report findings."),
+    (r"clinical summary|clinical report|Urgency Level|Final Doctor Report",
+     "Symptoms: as reported.\nTest Findings: as reported.\nUrgency Level: Low"),
+    (r"Follow-up|follow-up", "Have your symptoms changed since we last spoke?"),
+    (r"medical assistant|medical interview|Symptom_Collector", SYMPTOM_QUESTIONS * 10),
+]
+
+
+def load_scripts(path: str) -> List[Dict[str, Any]]:
+    files = sorted(glob.glob(os.path.join(path, "*.json"))) if os.path.isdir(path) else [path]
+    scripts = []
+    for file_path in files:
+        with open(file_path, encoding="utf-8") as f:
+            scripts.append(json.load(f))
+    return scripts
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(impl: str, script: Dict[str, Any], turns: List[Dict[str, float]], wall: float,
+              responder: ScriptedResponder) -> Dict[str, Any]:
+    latencies = [t["seconds"] for t in turns]
+    totals = responder.totals()
+    return {
+        "impl": impl,
+        "script": script["name"],
+        "turns": len(turns),
+        "turn_latency_p50": round(statistics.median(latencies), 4) if latencies else 0.0,
+        "turn_latency_p95": round(percentile(latencies, 95), 4),
+        "llm_calls_per_turn": round(sum(t["calls"] for t in turns) / len(turns), 2) if turns else 0.0,
+        "llm_calls_total": totals["calls"],
+        "prompt_tokens": totals["prompt_tokens"],
+        # Share of prompt tokens repeating an earlier prompt's prefix, and what a provider cache would serve
+        "prefix_reuse": round(totals["shared_prefix_tokens"] / totals["prompt_tokens"], 3)
+        if totals["prompt_tokens"] else 0.0,
+        "cached_prompt_tokens": totals["cached_prompt_tokens"],
+        "completion_tokens": totals["completion_tokens"],
+        "wall_seconds": round(wall, 4),
+        # Time not spent waiting on the (simulated) model
+        "framework_overhead_seconds": round(wall - totals["llm_seconds"], 4),
+    }
+
+
+# ==================
+# 2. LangGraph implementations
+# ==================
+# Module-level chat models each implementation calls
+LANGGRAPH_MODELS = {
+    "main": ["supervisor_llm", "symptom_llm", "analysis_llm", "summary_llm"],
+    "main2": ["llm", "analysis_llm", "summary_llm"],
+}
+
+
+def bench_langgraph(impl: str, script: Dict[str, Any], responder: ScriptedResponder) -> Dict[str, Any]:
+    module = importlib.import_module(impl)
+    for name in LANGGRAPH_MODELS[impl]:
+        setattr(module, name, ScriptedChatModel(responder=responder, model_name=name))
+    turns, wall = run_langgraph_script(module, impl, script)
+    return summarize(impl, script, turns, wall, responder)
+
+
+def run_langgraph_script(module, impl: str, script: Dict[str, Any]):
+    """Play a script through the graph with whatever models are set on the module; (turns, wall seconds)"""
+    from langchain_core.globals import set_llm_cache
+
+    set_llm_cache(None)  # Cached responses would hide the work being measured
+    responders = _responders(module, impl)
+
+    def calls() -> int:
+        return sum(len(r.calls) for r in responders)
+
+    state = module.new_session_state()
+    config = {"metadata": {"session_id": f"bench-{impl}-{script['name']}"}}
+    turns = []
+    started = time.perf_counter()
+    for line in script["turns"]:
+        if line.startswith("[REPORT] "):
+            state["test_report"] = line[len("[REPORT] "):]
+            state["user_input"] = "[REPORT_UPLOADED]"
+        else:
+            state["user_input"] = line
+        calls_before = calls()
+        turn_started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            state.update(module.agent.invoke(state, config=config))
+        turns.append({"seconds": time.perf_counter() - turn_started, "calls": calls() - calls_before})
+        if state.get("next_action") == "exit":
+            break
+    module.generate_summary(state, config)
+    return turns, time.perf_counter() - started
+
+
+def _responders(module, impl: str) -> List[ScriptedResponder]:
+    """Distinct responders behind the module's models, tiered or not"""
+    responders = []
+    for name in LANGGRAPH_MODELS[impl]:
+        model = getattr(module, name)
+        for llm in [m for _, m in getattr(model, "models", [])] or [model]:
+            if llm.responder not in responders:
+                responders.append(llm.responder)
+    return responders
+
+
+# ==================
+# 3. AutoGen implementations
+# ==================
+def bench_autogen(impl: str, script: Dict[str, Any], responder: ScriptedResponder) -> Dict[str, Any]:
+    module = importlib.import_module(impl)
+    RESPONDERS[impl] = responder
+    module.config_list[:] = [{"model": "scripted", "model_client_cls": "ScriptedModelClient", "responder": impl}]
+    system = module.MedicalAgentSystem()
+    for agent in system.group_chat.agents + [system.manager]:
+        if agent.llm_config:
+            agent.register_model_client(ScriptedModelClient)
+    for reply in getattr(system, "model_tiers", {}).values():
+        for client in reply.clients:
+            client.register_model_client(ScriptedModelClient)
+    # The manager runs the chat on a copy of the GroupChat taken at construction
+    group_chats = [system.group_chat] + [
+        entry["config"] for entry in system.manager._reply_func_list
+        if type(entry.get("config")) is type(system.group_chat)
+    ]
+    for group_chat in group_chats:
+        group_chat.select_speaker_auto_model_client_cls = ScriptedModelClient
+        group_chat.select_speaker_auto_llm_config = {"config_list": module.config_list}
+    for agent in system.group_chat.agents + [system.manager]:
+        agent.client_cache = None
+    system.llm_cache = None
+
+    patient_lines = [line for line in script["turns"] if not line.startswith("[REPORT] ")]
+    answers = list(script.get("verification_answers", []))
+    turns: List[Dict[str, float]] = []
+    mark = {"time": time.perf_counter(), "calls": 0}
+
+    def next_turn(lines: List[str], fallback: str) -> str:
+        # A turn is the time between two consecutive patient inputs
+        now = time.perf_counter()
+        turns.append({"seconds": now - mark["time"], "calls": len(responder.calls) - mark["calls"]})
+        text = lines.pop(0) if lines else fallback
+        mark["time"], mark["calls"] = time.perf_counter(), len(responder.calls)
+        return text
+
+    def fake_input(prompt: str = "") -> str:
+        if "report path" in prompt.lower():
+            return script.get("report", "")
+        return next_turn(answers, "No")
+
+    system.user_proxy.get_human_input = lambda prompt="", **kwargs: next_turn(patient_lines, "exit")
+
+    started = time.perf_counter()
+    original_input = builtins.input
+    builtins.input = fake_input
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            system.run_interview()
+    finally:
+        builtins.input = original_input
+    # The first mark is session start, not a patient turn
+    return summarize(impl, script, turns[1:], time.perf_counter() - started, responder)
+
+
+IMPLEMENTATIONS: Dict[str, Callable] = {
+    "main": bench_langgraph,
+    "main2": bench_langgraph,
+    "agen3": bench_autogen,
+    "agen4": bench_autogen,
+}
+
+
+# ==================
+# 4. Cold start
+# ==================
+# Runs in a fresh interpreter: import, then build what the first turn needs
+STARTUP_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+module = __import__(sys.argv[1])
+imported = time.perf_counter()
+if hasattr(module, "get_agent"):
+    module.get_agent()
+    for name in module.LLM_SETTINGS:
+        module._llm(name)
+else:
+    module.MedicalAgentSystem()
+built = time.perf_counter()
+print(json.dumps({"import_seconds": imported - started, "build_seconds": built - imported}))
+"""
+
+
+def heaviest_imports(importtime_log: str, top: int) -> List[str]:
+    """Top-level packages by cumulative -X importtime cost, from the interpreter's stderr"""
+    costs: Dict[str, int] = {}
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        # Nested imports are indented; only direct imports of the probe count
+        if name.startswith("   ") or not cumulative.strip().isdigit():
+            continue
+        root = name.strip().split(".")[0]
+        costs[root] = costs.get(root, 0) + int(cumulative)
+    ranked = sorted(costs.items(), key=lambda item: item[1], reverse=True)[:top]
+    return [f"{name}={us / 1e6:.3f}s" for name, us in ranked]
+
+
+def bench_startup(impl: str, top: int = 5) -> Dict[str, Any]:
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", STARTUP_PROBE, impl],
+                          capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    process_seconds = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "probe failed")
+    timings = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {
+        "impl": impl,
+        "process_seconds": round(process_seconds, 4),
+        "import_seconds": round(timings["import_seconds"], 4),
+        "build_seconds": round(timings["build_seconds"], 4),
+        "heaviest_imports": " ".join(heaviest_imports(proc.stderr, top)),
+    }
+
+
+# ==================
+# 5. Model tiering eval
+# ==================
+# Policies replayed over the scripts; "fast" stands in for the first tier, "large" for the escalation tier
+TIERING_POLICIES = {
+    "fast_only": ["fast"],
+    "large_only": ["large"],
+    "tiered": ["fast", "large"],
+}
+TIER_MODELS = {"fast": "gpt-4o-mini", "large": "gpt-4o"}
+DEGRADED_REPLY = "I'm not sure how to answer that."
+
+
+class DegradedResponder(ScriptedResponder):
+    """The fast tier: the same rules, but a seeded share of replies come back unusable"""
+
+    def __init__(self, *args, error_rate: float = 0.1, seed: int = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.error_rate = error_rate
+        self.degraded = 0
+        self._rng = random.Random(seed)
+
+    def respond(self, prompt: str):
+        text, delay = super().respond(prompt)
+        with self._lock:
+            if self._rng.random() < self.error_rate:
+                self.degraded += 1
+                text = DEGRADED_REPLY
+        return text, delay
+
+
+def bench_tiering(impl: str, script: Dict[str, Any], policy: str, latency: str, time_scale: float,
+                  fast_error_rate: float, fast_speedup: float, seed: int = 0) -> Dict[str, Any]:
+    """Latency, estimated cost and quality of one tiering policy on one script.
+
+    Quality is the share of model calls whose returned reply was usable: a
+    degraded fast reply either fails validation (JSON shape, or the
+    non-answer check on free text) and escalates, or slips through.
+    """
+    import model_tiers
+    from metrics import estimate_cost
+
+    large_latency = LatencyModel.parse(latency, seed)
+    fast_latency = LatencyModel(large_latency.kind, large_latency.mean / fast_speedup, large_latency.spread, seed)
+    responders = {
+        "fast": DegradedResponder(DEFAULT_RULES, latency=fast_latency, time_scale=time_scale,
+                                  error_rate=fast_error_rate, seed=seed),
+        "large": ScriptedResponder(DEFAULT_RULES, latency=large_latency, time_scale=time_scale),
+    }
+    module = importlib.import_module(impl)
+    for name in LANGGRAPH_MODELS[impl]:
+        setattr(module, name, model_tiers.TieredChatModel(name, [
+            (TIER_MODELS[tier], ScriptedChatModel(responder=responders[tier], model_name=TIER_MODELS[tier]))
+            for tier in TIERING_POLICIES[policy]
+        ]))
+    model_tiers.reset_stats()
+    turns, wall = run_langgraph_script(module, impl, script)
+
+    sites = model_tiers.stats().values()
+    calls = sum(site["calls"] for site in sites)
+    escalations = sum(site["escalations"] for site in sites)
+    # Every escalation used up one degraded reply; the rest reached the graph
+    bad_replies = responders["fast"].degraded - escalations if "fast" in TIERING_POLICIES[policy] else 0
+    latencies = [t["seconds"] for t in turns]
+    cost = 0.0
+    for tier, responder in responders.items():
+        totals = responder.totals()
+        cost += estimate_cost(TIER_MODELS[tier], totals["prompt_tokens"], totals["completion_tokens"])
+    return {
+        "policy": policy,
+        "script": script["name"],
+        "turns": len(turns),
+        "turn_latency_p50": round(statistics.median(latencies), 4) if latencies else 0.0,
+        "turn_latency_p95": round(percentile(latencies, 95), 4),
+        "llm_calls": sum(len(r.calls) for r in responders.values()),
+        "escalations": escalations,
+        "cost_usd": round(cost, 6),
+        "quality": round(1 - bad_replies / calls, 3) if calls else 1.0,
+        "wall_seconds": round(wall, 4),
+    }
+
+
+def print_tiering(args) -> None:
+    results = []
+    for script in load_scripts(args.scripts):
+        for policy in TIERING_POLICIES:
+            try:
+                results.append(bench_tiering("main", script, policy, args.latency, args.time_scale,
+                                             args.fast_error_rate, args.fast_speedup, args.seed))
+            except Exception as e:
+                results.append({"policy": policy, "script": script["name"], "error": f"{type(e).__name__}: {e}"})
+    if args.json:
+        for result in results:
+            print(json.dumps(result))
+        return
+    columns = ["policy", "script", "turns", "turn_latency_p50", "turn_latency_p95", "llm_calls",
+               "escalations", "cost_usd", "quality"]
+    print("  ".join(f"{c:>18}" for c in columns))
+    for result in results:
+        if "error" in result:
+            print(f"{result['policy']:>18}  {result['script']:>18}  error: {result['error']}")
+        else:
+            print("  ".join(f"{str(result[c]):>18}" for c in columns))
+
+
+# ==================
+# 6. CLI
+# ==================
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark with a scripted fake LLM")
+    parser.add_argument("--impl", nargs="+", default=list(IMPLEMENTATIONS), choices=list(IMPLEMENTATIONS))
+    parser.add_argument("--scripts", default="bench_scripts", help="script file or directory of *.json")
+    parser.add_argument("--latency", default="lognormal:0.8:0.3",
+                        help="kind:mean[:spread] with kind constant, uniform or lognormal (seconds)")
+    parser.add_argument("--time-scale", type=float, default=0.01, help="multiplier on simulated latency")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print one JSON object per run")
+    parser.add_argument("--startup", action="store_true",
+                        help="measure cold start (import and first build) in fresh interpreters instead")
+    parser.add_argument("--tiering", action="store_true",
+                        help="compare model tiering policies on the scripts (latency, cost, quality) instead")
+    parser.add_argument("--fast-error-rate", type=float, default=0.1,
+                        help="share of unusable replies from the fast tier in --tiering")
+    parser.add_argument("--fast-speedup", type=float, default=2.5,
+                        help="how much faster the fast tier answers than the large one in --tiering")
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+    os.environ.setdefault("SESSION_ARCHIVE_PATH", ":memory:")  # Benchmark sessions stay out of the real archive
+    for logger_name in ("autogen", "autogen.oai.client"):
+        logging.getLogger(logger_name).setLevel(logging.WARNING)
+    if args.startup:
+        print_startup(args.impl, args.json)
+        return
+    if args.tiering:
+        print_tiering(args)
+        return
+    results = []
+    for impl in args.impl:
+        for script in load_scripts(args.scripts):
+            responder = ScriptedResponder(DEFAULT_RULES, latency=LatencyModel.parse(args.latency, args.seed),
+                                          time_scale=args.time_scale)
+            try:
+                results.append(IMPLEMENTATIONS[impl](impl, script, responder))
+            except Exception as e:
+                results.append({"impl": impl, "script": script["name"], "error": f"{type(e).__name__}: {e}"})
+
+    if args.json:
+        for result in results:
+            print(json.dumps(result))
+        return
+    columns = ["impl", "script", "turns", "turn_latency_p50", "turn_latency_p95", "llm_calls_per_turn",
+               "prompt_tokens", "prefix_reuse", "completion_tokens", "framework_overhead_seconds"]
+    print("  ".join(f"{c:>18}" for c in columns))
+    for result in results:
+        if "error" in result:
+            print(f"{result['impl']:>18}  {result['script']:>18}  error: {result['error']}")
+        else:
+            print("  ".join(f"{str(result[c]):>18}" for c in columns))
+
+
+def print_startup(impls: List[str], as_json: bool) -> None:
+    results = []
+    for impl in impls:
+        try:
+            results.append(bench_startup(impl))
+        except Exception as e:
+            results.append({"impl": impl, "error": f"{type(e).__name__}: {e}"})
+    if as_json:
+        for result in results:
+            print(json.dumps(result))
+        return
+    columns = ["impl", "process_seconds", "import_seconds", "build_seconds"]
+    print("  ".join(f"{c:>16}" for c in columns) + "  heaviest_imports")
+    for result in results:
+        if "error" in result:
+            print(f"{result['impl']:>16}  error: {result['error']}")
+        else:
+            print("  ".join(f"{str(result[c]):>16}" for c in columns) + f"  {result['heaviest_imports']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import asyncio
+import os
+import sqlite3
+import time
+from typing import Any, AsyncIterator, Optional, Tuple
+
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from metrics import registry, session_id_from
+
+# ==================
+# 1. Configuration
+# ==================
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", "checkpoints.sqlite")
+
+
+# ==================
+# 2. Timed SQLite checkpointer
+# ==================
+class TimedSqliteSaver(SqliteSaver):
+    """SqliteSaver that records every checkpoint read and write in the metrics registry.
+
+    The async methods run the sync ones in a thread so the same store also
+    serves ainvoke (the stock SqliteSaver refuses async use).
+    """
+
+    def _timed(self, operation: str, config, call, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return call(*args, **kwargs)
+        finally:
+            registry.record_checkpoint(operation, time.perf_counter() - started, session_id_from(config))
+
+    def get_tuple(self, config):
+        return self._timed("read", config, super().get_tuple, config)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        return self._timed("write", config, super().put, config, checkpoint, metadata, new_versions)
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        return self._timed("write", config, super().put_writes, config, writes, task_id, task_path)
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None) -> AsyncIterator[Any]:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+
+def open_checkpointer(path: str = CHECKPOINT_DB) -> TimedSqliteSaver:
+    conn = sqlite3.connect(path, check_same_thread=False)
+    # WAL keeps checkpoint writes from blocking concurrent reads
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    saver = TimedSqliteSaver(conn)
+    saver.setup()
+    return saver
+
+
+# ==================
+# 3. Sessions
+# ==================
+def session_config(session_id: str) -> dict:
+    """Run config keyed by session: thread_id for the checkpointer, session_id for metrics"""
+    return {"configurable": {"thread_id": session_id}, "metadata": {"session_id": session_id}}
+
+
+def load_session(graph, session_id: str) -> Tuple[dict, dict]:
+    """Config and last checkpointed values for a session (empty values for a new one)"""
+    config = session_config(session_id)
+    return config, dict(graph.get_state(config).values)
+
+
+def checkpoint_overhead(session_id: str, turns: int) -> Optional[str]:
+    totals = registry.session_totals(session_id)
+    if not totals or not turns:
+        return None
+    return (f"{totals['checkpoint_reads']} reads, {totals['checkpoint_writes']} writes, "
+            f"{totals['checkpoint_seconds'] * 1000 / turns:.1f} ms per turn")
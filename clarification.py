@@ -0,0 +1,109 @@
+import os
+from typing import Dict, List, Optional
+
+from structured_output import ANSWERS_SCHEMA, parse_structured, schema_instruction
+
+# ==================
+# 1. Configuration
+# ==================
+# Verification questions shown to the patient per turn; 1 restores one question per turn
+CLARIFY_BATCH_SIZE = max(1, int(os.getenv("CLARIFY_BATCH_SIZE", 5)))
+
+
+def question_batch(pending: List[str]) -> List[str]:
+    return pending[:CLARIFY_BATCH_SIZE]
+
+
+def format_question_batch(questions: List[str]) -> str:
+    """Assistant text asking a batch of questions"""
+    if len(questions) == 1:
+        return questions[0]
+    numbered = "\n".join(f"{i}. {q}" for i, q in enumerate(questions, 1))
+    return f"Please answer each question, numbering your answers (e.g. '1. yes 2. no'):\n{numbered}"
+
+
+# ==================
+# 2. Batched analysis
+# ==================
+def _single_analysis(llm, question: str, reply: str, config: Optional[dict] = None) -> str:
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    messages = [
+        SystemMessage(content="Analyze patient's response to the medical question. Provide 1-sentence analysis."),
+        HumanMessage(content=f"""Question: {question}
+        Patient Response: {reply}""")
+    ]
+    return llm.invoke(messages, config=config).content
+
+
+def _parse_batch(text: str, count: int) -> Dict[int, Dict[str, str]]:
+    """Question number -> {"answer", "analysis"}; entries that don't parse are dropped.
+
+    Goes through structured_output, so almost-valid JSON is repaired
+    locally instead of costing a call per question.
+    """
+    data = parse_structured(text, ANSWERS_SCHEMA)
+    parsed = {}
+    for position, item in enumerate(data["answers"] if data else [], 1):
+        if not item.get("analysis"):
+            continue
+        try:
+            number = int(item.get("question", position))
+        except (TypeError, ValueError):
+            number = position
+        if 1 <= number <= count:
+            parsed[number] = {"answer": str(item.get("answer") or ""), "analysis": str(item["analysis"])}
+    return parsed
+
+
+def analyze_answers(llm, questions: List[str], reply: str, config: Optional[dict] = None) -> List[Dict[str, str]]:
+    """Analyze the patient's reply to a batch of questions in one model call.
+
+    Returns one {"question", "reply", "answer", "analysis"} per question, in order:
+    "reply" is what the patient typed, "answer" the model's extraction for that
+    question ("" when there is none). Questions the model skipped fall back to a
+    single-question call.
+    """
+    if len(questions) == 1:
+        return [{"question": questions[0], "reply": reply, "answer": "",
+                 "analysis": _single_analysis(llm, questions[0], reply, config)}]
+
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    numbered = "\n".join(f"{i}. {q}" for i, q in enumerate(questions, 1))
+    messages = [
+        SystemMessage(content="""Analyze the patient's answers to several medical verification questions.
+        For each question, extract the patient's answer from their reply and give a 1-sentence analysis.
+        Include every question. Use "not answered" when the reply does not address a question.
+        """ + schema_instruction(ANSWERS_SCHEMA)),
+        HumanMessage(content=f"Questions:\n{numbered}\n\nPatient reply:\n{reply}")
+    ]
+    parsed = _parse_batch(llm.invoke(messages, config=config, schema=ANSWERS_SCHEMA).content, len(questions))
+
+    results = []
+    for number, question in enumerate(questions, 1):
+        entry = parsed.get(number)
+        if entry is None:
+            entry = {"answer": "", "analysis": _single_analysis(llm, question, reply, config)}
+        results.append({"question": question, "reply": reply, **entry})
+    return results
+
+
+def clarification_update(llm, pending: List[str], reply: str, config: Optional[dict] = None) -> dict:
+    """State update for the clarify_questions node: history entries plus the next batch"""
+    batch = question_batch(pending)
+    history = []
+    for result in analyze_answers(llm, batch, reply, config):
+        # The Patient line keeps the patient's own words; the extraction belongs to the analysis
+        analysis = result["analysis"]
+        if result["answer"]:
+            analysis = f"(answer: {result['answer']}) {analysis}"
+        history += [
+            f"Asked: {result['question']}",
+            f"Patient: {result['reply']}",
+            f"Analysis: {analysis}"
+        ]
+    remaining = pending[len(batch):]
+    if remaining:
+        history.append(f"Assistant: {format_question_batch(question_batch(remaining))}")
+    return {"conversation_history": history, "pending_questions": remaining}
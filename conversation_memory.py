@@ -0,0 +1,105 @@
+import os
+from typing import List, Tuple
+
+# ==================
+# 1. Configuration
+# ==================
+# Prompt token budget for the conversation context of each node
+NODE_TOKEN_BUDGETS = {
+    "collect_symptoms": int(os.getenv("MEMORY_BUDGET_COLLECT_SYMPTOMS", 1200)),
+    "follow_up": int(os.getenv("MEMORY_BUDGET_FOLLOW_UP", 1500)),
+    "summary": int(os.getenv("MEMORY_BUDGET_SUMMARY", 3000)),
+}
+DEFAULT_TOKEN_BUDGET = 1500
+
+# History entries always kept verbatim
+KEEP_LAST_ENTRIES = int(os.getenv("MEMORY_KEEP_LAST", 6))
+# Older entries are folded into the summary in batches so not every turn pays for a summary call
+FOLD_BATCH = int(os.getenv("MEMORY_FOLD_BATCH", 6))
+
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    """tiktoken's encoding, loaded on the first count rather than at import; None without tiktoken"""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:  # tiktoken missing or its encoding files unavailable offline
+            _encoding = None
+        _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoding = _get_encoding()
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text)[:max_tokens]) + "..."
+    return text[:max_tokens * 4] + "..."
+
+
+# ==================
+# 2. Rolling summary
+# ==================
+def fold_into_summary(summarizer, summary: str, entries: List[str], max_tokens: int) -> str:
+    """Incrementally update the running summary with entries that left the window"""
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    messages = [
+        SystemMessage(content=f"""You maintain a running clinical summary of a patient consultation.
+        Merge the new conversation lines into the existing summary. Keep every symptom, duration,
+        severity, location, test finding and patient answer. Stay under {int(max_tokens * 0.75)} words."""),
+        HumanMessage(content=f"Existing summary:\n{summary or '(none)'}\n\nNew lines:\n" + "\n".join(entries))
+    ]
+    # Tagged so the summary never streams to the patient
+    return truncate_to_tokens(summarizer.invoke(messages, config={"tags": ["nostream"]}).content.strip(), max_tokens)
+
+
+def window_context(state: dict, node: str, summarizer) -> Tuple[str, dict]:
+    """Conversation context for a node, bounded by the node's token budget.
+
+    Returns the context text and the state update carrying the new summary
+    (empty when nothing was folded this turn).
+    """
+    history = state.get("conversation_history", [])
+    summary = state.get("history_summary", "")
+    summarized_upto = state.get("summarized_upto", 0)
+    budget = NODE_TOKEN_BUDGETS.get(node, DEFAULT_TOKEN_BUDGET)
+    update = {}
+
+    fold_end = len(history) - KEEP_LAST_ENTRIES
+    if fold_end - summarized_upto >= FOLD_BATCH:
+        summary = fold_into_summary(summarizer, summary, history[summarized_upto:fold_end], budget // 3)
+        summarized_upto = fold_end
+        update = {"history_summary": summary, "summarized_upto": summarized_upto}
+
+    # Fill the rest of the budget with the newest entries, newest first
+    remaining = budget - (count_tokens(summary) if summary else 0)
+    recent = []
+    for entry in reversed(history[summarized_upto:]):
+        cost = count_tokens(entry)
+        if cost > remaining:
+            if not recent:
+                recent.append(truncate_to_tokens(entry, max(remaining, 0)))
+            break
+        recent.append(entry)
+        remaining -= cost
+    recent.reverse()
+
+    context = "\n".join(recent)
+    if summary:
+        context = f"Summary of earlier conversation:\n{summary}\n\nRecent conversation:\n{context}"
+    return context, update
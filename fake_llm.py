@@ -0,0 +1,220 @@
+import asyncio
+import math
+import os
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from conversation_memory import count_tokens
+
+# ==================
+# 1. Scripted responder
+# ==================
+class LatencyModel:
+    """Seeded latency distribution: constant, uniform or lognormal (seconds)"""
+
+    def __init__(self, kind: str = "constant", mean: float = 0.0, spread: float = 0.0, seed: int = 0):
+        self.kind = kind
+        self.mean = mean
+        self.spread = spread
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, spec: str, seed: int = 0) -> "LatencyModel":
+        """"lognormal:0.8:0.3" -> kind, mean, spread"""
+        kind, *values = spec.split(":")
+        numbers = [float(v) for v in values] + [0.0, 0.0]
+        return cls(kind, numbers[0], numbers[1], seed)
+
+    def sample(self) -> float:
+        with self._lock:
+            if self.kind == "uniform":
+                return max(0.0, self._rng.uniform(self.mean - self.spread, self.mean + self.spread))
+            if self.kind == "lognormal" and self.mean > 0:
+                # mean is the median; spread is sigma of the underlying normal
+                return self._rng.lognormvariate(math.log(self.mean), self.spread)
+            return self.mean
+
+
+Response = Union[str, Sequence[str]]
+
+# Provider prefix caching (OpenAI's rules): prompts from 1024 tokens on, matched in 128-token steps
+PREFIX_CACHE_MIN_TOKENS = 1024
+PREFIX_CACHE_STEP_TOKENS = 128
+
+
+def shared_prefix_tokens(prompt: str, earlier: Sequence[str]) -> int:
+    """Tokens in the longest prefix the prompt shares with any earlier prompt"""
+    longest = max((len(os.path.commonprefix([prompt, other])) for other in earlier), default=0)
+    return count_tokens(prompt[:longest]) if longest else 0
+
+
+def cached_tokens(shared: int, prompt_tokens: int) -> int:
+    """What a provider prefix cache would serve of a prompt that shares `shared` tokens with earlier ones"""
+    if prompt_tokens < PREFIX_CACHE_MIN_TOKENS or shared < PREFIX_CACHE_MIN_TOKENS:
+        return 0
+    return min(shared, prompt_tokens) // PREFIX_CACHE_STEP_TOKENS * PREFIX_CACHE_STEP_TOKENS
+
+
+class ScriptedResponder:
+    """Picks a canned response by regex over the prompt and logs every call.
+
+    A rule with a list of responses cycles through them in order. Each call
+    also records how much of its prompt repeats an earlier prompt's prefix
+    and what a provider prefix cache would have served of it.
+    """
+
+    def __init__(self, rules: List[Tuple[str, Response]], default: str = "OK",
+                 latency: Optional[LatencyModel] = None, time_scale: float = 1.0):
+        self.rules = [(re.compile(pattern, re.I | re.S), response) for pattern, response in rules]
+        self.default = default
+        self.latency = latency or LatencyModel()
+        self.time_scale = time_scale
+        self.calls: List[Dict[str, Any]] = []
+        self._positions: Dict[int, int] = {}
+        self._prompts: List[str] = []
+        self._last = threading.local()
+        self._lock = threading.Lock()
+
+    def respond(self, prompt: str) -> Tuple[str, float]:
+        text = self.default
+        with self._lock:
+            for i, (pattern, response) in enumerate(self.rules):
+                if pattern.search(prompt):
+                    if isinstance(response, str):
+                        text = response
+                    else:
+                        position = self._positions.get(i, 0)
+                        text = response[min(position, len(response) - 1)]
+                        self._positions[i] = position + 1
+                    break
+        delay = self.latency.sample() * self.time_scale
+        prompt_tokens = count_tokens(prompt)
+        with self._lock:
+            shared = shared_prefix_tokens(prompt, self._prompts)
+            self._prompts.append(prompt)
+            self._last.cached = cached_tokens(shared, prompt_tokens)
+            self.calls.append({
+                "latency": delay,
+                "prompt_tokens": prompt_tokens,
+                "shared_prefix_tokens": shared,
+                "cached_prompt_tokens": self._last.cached,
+                "completion_tokens": count_tokens(text),
+            })
+        return text, delay
+
+    def last_cached_tokens(self) -> int:
+        """Cached prompt tokens of this thread's latest respond() call"""
+        return getattr(self._last, "cached", 0)
+
+    def totals(self, since: int = 0) -> Dict[str, float]:
+        with self._lock:
+            calls = self.calls[since:]
+        return {
+            "calls": len(calls),
+            "llm_seconds": sum(c["latency"] for c in calls),
+            "prompt_tokens": sum(c["prompt_tokens"] for c in calls),
+            "shared_prefix_tokens": sum(c["shared_prefix_tokens"] for c in calls),
+            "cached_prompt_tokens": sum(c["cached_prompt_tokens"] for c in calls),
+            "completion_tokens": sum(c["completion_tokens"] for c in calls),
+        }
+
+
+def _prompt_text(messages: Sequence[Any]) -> str:
+    parts = []
+    for message in messages:
+        content = message.content if isinstance(message, BaseMessage) else message.get("content")
+        parts.append(content if isinstance(content, str) else str(content))
+    return "\n".join(parts)
+
+
+# ==================
+# 2. LangChain chat model
+# ==================
+class ScriptedChatModel(BaseChatModel):
+    """Drop-in stand-in for ChatOpenAI that never touches the network"""
+
+    responder: Any
+    model_name: str = "scripted"
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name}
+
+    def _result(self, text: str, prompt: str, cached: int = 0) -> ChatResult:
+        usage = {
+            "input_tokens": count_tokens(prompt),
+            "output_tokens": count_tokens(text),
+            "input_token_details": {"cache_read": cached},
+        }
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        prompt = _prompt_text(messages)
+        text, delay = self.responder.respond(prompt)
+        cached = self.responder.last_cached_tokens()
+        time.sleep(delay)
+        return self._result(text, prompt, cached)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        prompt = _prompt_text(messages)
+        text, delay = self.responder.respond(prompt)
+        cached = self.responder.last_cached_tokens()
+        await asyncio.sleep(delay)
+        return self._result(text, prompt, cached)
+
+
+# ==================
+# 3. AutoGen model client
+# ==================
+# AutoGen builds clients from config dicts, so responders are looked up by name
+RESPONDERS: Dict[str, ScriptedResponder] = {}
+
+
+class ScriptedModelClient:
+    """AutoGen ModelClient; use with {"model_client_cls": "ScriptedModelClient", "responder": name}"""
+
+    def __init__(self, config: Dict[str, Any], **kwargs):
+        self.model = config.get("model", "scripted")
+        self.responder = RESPONDERS[config["responder"]]
+
+    def create(self, params: Dict[str, Any]):
+        prompt = _prompt_text(params.get("messages", []))
+        text, delay = self.responder.respond(prompt)
+        time.sleep(delay)
+        message = SimpleNamespace(content=text, function_call=None, tool_calls=None, role="assistant")
+        usage = SimpleNamespace(
+            prompt_tokens=count_tokens(prompt),
+            completion_tokens=count_tokens(text),
+        )
+        usage.total_tokens = usage.prompt_tokens + usage.completion_tokens
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], model=self.model, usage=usage, cost=0.0)
+
+    def message_retrieval(self, response) -> List[str]:
+        return [choice.message.content for choice in response.choices]
+
+    def cost(self, response) -> float:
+        return 0.0
+
+    @staticmethod
+    def get_usage(response) -> Dict[str, Any]:
+        return {
+            "prompt_tokens": response.usage.prompt_tokens,
+            "completion_tokens": response.usage.completion_tokens,
+            "total_tokens": response.usage.total_tokens,
+            "cost": 0.0,
+            "model": response.model,
+        }
@@ -0,0 +1,59 @@
+from typing import Any, List, Optional
+
+from langgraph.types import Command, interrupt
+
+# ==================
+# 1. Interrupt points
+# ==================
+def ask_patient(message: str, prompt: str = "[Patient]", kind: str = "patient_response", **details) -> Any:
+    """Suspend the graph until the patient answers and return the answer.
+
+    The node re-runs from the top on resume, so anything costly (LLM calls)
+    must happen in an earlier node or be stored in state before this call.
+    """
+    return interrupt({"kind": kind, "message": message, "prompt": prompt, **details})
+
+
+def ask_patient_many(message: str, questions: List[str], kind: str = "verification") -> List[str]:
+    """One interrupt for a batch of questions; resumes with one answer per question"""
+    answers = interrupt({"kind": kind, "message": message, "prompt": "", "questions": questions})
+    return answers if isinstance(answers, list) else [answers]
+
+
+# ==================
+# 2. Driving a suspended graph
+# ==================
+def _event(result: dict) -> dict:
+    interrupts = result.get("__interrupt__")
+    if interrupts:
+        return {"status": "needs_input", **interrupts[0].value}
+    return {"status": "done", "state": result}
+
+
+def next_event(graph, config: dict, answer: Optional[Any] = None, state: Optional[dict] = None) -> dict:
+    """Run until the graph needs the patient or finishes.
+
+    Start a session with state, continue it with answer. Between calls
+    nothing is held but the checkpoint, so any worker can resume the thread.
+    """
+    payload = state if state is not None else Command(resume=answer)
+    return _event(graph.invoke(payload, config=config))
+
+
+async def anext_event(graph, config: dict, answer: Optional[Any] = None, state: Optional[dict] = None) -> dict:
+    payload = state if state is not None else Command(resume=answer)
+    return _event(await graph.ainvoke(payload, config=config))
+
+
+def run_in_terminal(graph, state: dict, config: dict) -> dict:
+    """Answer interrupts from stdin until the graph finishes; returns the final state"""
+    event = next_event(graph, config, state=state)
+    while event["status"] == "needs_input":
+        if event.get("message"):
+            print(f"[Assistant] {event['message']}")
+        if event.get("questions"):
+            answer = [input(f"{q} ") for q in event["questions"]]
+        else:
+            answer = input(f"{event['prompt']} ")
+        event = next_event(graph, config, answer=answer)
+    return event["state"]
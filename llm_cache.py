@@ -0,0 +1,231 @@
+import hashlib
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence
+
+from langchain_core.caches import BaseCache
+from langchain_core.globals import set_llm_cache
+
+# ==================
+# 1. Persistent response store
+# ==================
+DEFAULT_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".llm_cache.sqlite")
+DEFAULT_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600))
+DEFAULT_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 10000))
+DEFAULT_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+# Hits update recency in memory; it is written back in one transaction every N hits or T seconds
+RECENCY_FLUSH_HITS = int(os.getenv("LLM_CACHE_RECENCY_FLUSH_HITS", 256))
+RECENCY_FLUSH_SECONDS = float(os.getenv("LLM_CACHE_RECENCY_FLUSH_SECONDS", 30))
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so indentation changes in prompts don't miss the cache"""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def make_key(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(normalize_text(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+class ResponseStore:
+    """SQLite-backed response cache with LRU eviction, TTL and size limits.
+
+    A hit only records its access time in memory, so reads never commit;
+    the batch is written before every eviction, periodically, and on close.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_access)")
+        self._conn.commit()
+        self._accessed: Dict[str, float] = {}
+        self._flushed_at = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return default
+            value, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self._accessed.pop(key, None)
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._accessed[key] = now
+            self.hits += 1
+            if (len(self._accessed) >= RECENCY_FLUSH_HITS
+                    or time.monotonic() - self._flushed_at >= RECENCY_FLUSH_SECONDS):
+                self._write_access_times()
+                self._conn.commit()
+        return pickle.loads(value)
+
+    def _write_access_times(self) -> None:
+        """Persist pending hit times (caller holds the lock and commits)"""
+        if self._accessed:
+            self._conn.executemany("UPDATE responses SET last_access = ? WHERE key = ?",
+                                   [(at, key) for key, at in self._accessed.items()])
+            self._accessed.clear()
+        self._flushed_at = time.monotonic()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._write_access_times()
+            self._conn.commit()
+
+    def set(self, key: str, value: Any) -> None:
+        blob = pickle.dumps(value)
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now, now)
+            )
+            self._accessed.pop(key, None)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until both limits hold"""
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        self._write_access_times()  # LRU order must include recent hits
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        while count > self.max_entries or total > self.max_bytes:
+            key, size = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access LIMIT 1"
+            ).fetchone()
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            count -= 1
+            total -= size
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._accessed.clear()
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._write_access_times()
+            self._conn.commit()
+            self._conn.close()
+
+
+# ==================
+# 2. Framework adapters
+# ==================
+class LangChainResponseCache(BaseCache):
+    """Global LangChain cache; llm_string already carries the model name and temperature"""
+
+    def __init__(self, store: ResponseStore):
+        self.store = store
+
+    def lookup(self, prompt: str, llm_string: str):
+        return self.store.get(make_key("langchain", llm_string, prompt))
+
+    def update(self, prompt: str, llm_string: str, return_val) -> None:
+        self.store.set(make_key("langchain", llm_string, prompt), return_val)
+
+    def clear(self, **kwargs: Any) -> None:
+        self.store.clear()
+
+
+class AutoGenResponseCache:
+    """Implements AutoGen's cache protocol; its keys already include model, temperature and messages"""
+
+    def __init__(self, store: ResponseStore):
+        self.store = store
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.store.get(make_key("autogen", key), default)
+
+    def set(self, key: str, value: Any) -> None:
+        self.store.set(make_key("autogen", key), value)
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# ==================
+# 3. Setup helpers
+# ==================
+_store: Optional[ResponseStore] = None
+
+
+def get_store() -> ResponseStore:
+    """Process-wide store shared by every call site"""
+    global _store
+    if _store is None:
+        _store = ResponseStore()
+    return _store
+
+
+def enable_llm_cache(store: Optional[ResponseStore] = None) -> ResponseStore:
+    """Route every LangChain chat model call through the shared cache"""
+    store = store or get_store()
+    set_llm_cache(LangChainResponseCache(store))
+    return store
+
+
+def attach_autogen_cache(agents: Sequence[Any], store: Optional[ResponseStore] = None) -> AutoGenResponseCache:
+    """Give every AutoGen agent the shared cache for generate_reply"""
+    cache = AutoGenResponseCache(store or get_store())
+    for agent in agents:
+        agent.client_cache = cache
+    return cache
@@ -1,19 +1,36 @@
-from dotenv import load_dotenv
+import asyncio
 import os
+import sys
+import threading
+import uuid
 from typing import TypedDict, List, Literal, Annotated
-from langgraph.graph import StateGraph, END
-from langchain_community.document_loaders import Docx2txtLoader
-from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_openai import ChatOpenAI
 import operator
 import datetime
+from report_cache import get_cache as get_report_cache
+from report_loader import iter_report_chunks, load_report_text
+from report_worker import ReportPreprocessor, parse_report_command
+from conversation_memory import window_context
+from clarification import clarification_update, format_question_batch, question_batch
+from model_registry import prewarm, stats as model_registry_stats
+from model_tiers import stats as model_tier_stats, tiered_chat_model
+from rate_limiter import stats as rate_limiter_stats
+from session_archive import archive_session, consultation_id
+from session_engine import SessionEngine, TerminalTransport
+from streaming import stream_turn
+from structured_output import (QUESTIONS_SCHEMA, parse_questions, request_structured, routing_schema,
+                               schema_instruction, stats as structured_output_stats)
+from router import AWAIT_INPUT, VALID_ACTIONS, decide_next_action, route_after_supervisor, routing_counters
 
-# Load the .env file
-load_dotenv()
+_env_loaded = False
 
-# Access the API key
-api_key = os.getenv("OPENAI_API_KEY")
-os.environ["OPENAI_API_KEY"] = api_key
+
+def _load_env():
+    """Load the .env file (API key etc.) before the first client or graph is built, not at import"""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
 
 
 
@@ -25,6 +42,12 @@ class AgentState(TypedDict):
     pending_questions: List[str]
     last_follow_up: datetime.datetime
     symptoms_collected: bool
+    report_processed: bool
+    report_path: str
+    history_summary: str
+    summarized_upto: int
+    routing_llm_calls: int
+    routing_llm_calls_saved: int
     next_action: Literal[
         "collect_symptoms", 
         "process_report",
@@ -34,198 +57,451 @@ class AgentState(TypedDict):
     ]
     user_input: str
 
-# Initialize LLMs
-supervisor_llm = ChatOpenAI(temperature=0.1, model="gpt-4-turbo")
-symptom_llm = ChatOpenAI(temperature=0.2, model="gpt-3.5-turbo")
-analysis_llm = ChatOpenAI(temperature=0.1, model="gpt-4o")
-summary_llm = ChatOpenAI(temperature=0.1, model="gpt-4-turbo")
+# LLM settings; clients are built on first use over one shared connection pool (see _llm)
+# Inside the graph each node starts on the fastest model and escalates a reply only when it fails
+# validation; a client's own tiers apply outside the graph. MODEL_TIERS_<NODE or CLIENT>
+# (e.g. MODEL_TIERS_FOLLOW_UP="gpt-4o-mini,gpt-4o") overrides.
+NODE_TIERS = {
+    "supervisor": ["gpt-4o-mini", "gpt-4-turbo"],
+    "collect_symptoms": ["gpt-4o-mini", "gpt-4o"],
+    "process_report": ["gpt-4o-mini", "gpt-4o"],
+    "clarify_questions": ["gpt-4o-mini", "gpt-4o"],
+    "follow_up": ["gpt-4o-mini", "gpt-4o"],
+}
+LLM_SETTINGS = {
+    "supervisor_llm": {"temperature": 0.1, "tiers": ["gpt-4o-mini", "gpt-4-turbo"]},
+    "symptom_llm": {"temperature": 0.2, "tiers": ["gpt-4o-mini", "gpt-4o"]},
+    "analysis_llm": {"temperature": 0.1, "tiers": ["gpt-4o-mini", "gpt-4o"]},
+    # The doctor-facing summary has no shape to validate, so it stays on the large model
+    "summary_llm": {"temperature": 0.1, "tiers": ["gpt-4-turbo"]},
+}
+_client_lock = threading.Lock()
+
+
+def _llm(name: str):
+    """Chat model by name, built on first use; a module attribute set by callers (e.g. a fake) wins"""
+    llm = globals().get(name)
+    if llm is None:
+        with _client_lock:
+            llm = globals().get(name)
+            if llm is None:
+                from llm_cache import enable_llm_cache
+                from metrics import llm_callback
+
+                _load_env()
+                # Share cached responses across every ChatOpenAI call site
+                enable_llm_cache()
+                llm = tiered_chat_model(name, **LLM_SETTINGS[name], node_tiers=NODE_TIERS,
+                                        callbacks=[llm_callback])
+                globals()[name] = llm
+    return llm
 
 def supervisor_node(state: AgentState):
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    # Obvious cases are settled from state without a model call
+    action = decide_next_action(state)
+    if action is not None:
+        return {"next_action": action, **routing_counters(state, used_llm=False)}
+
+    # Static instructions first and the state last, so every call shares the provider-cached prefix
     messages = [
         SystemMessage(content="""You are a medical workflow supervisor. Decide next action based on:
         1. Continue symptom collection until at least 5 patient responses
         2. Process test reports immediately when uploaded
         3. Address clarification questions before follow-ups
         4. Only exit when symptoms are collected and reports processed
-        
-        Current State:
+
+        """ + schema_instruction(routing_schema(VALID_ACTIONS))),
+        HumanMessage(content="""Current State:
         Symptoms Collected: {symptoms_collected}
         Test Report: {test_report_status}
         Pending Questions: {pending_questions}
-        Conversation Length: {conv_len}""".format(
+        Conversation Length: {conv_len}
+
+        Last 3 messages:
+        """.format(
             symptoms_collected=state["symptoms_collected"],
             test_report_status="Uploaded" if state["test_report"] else "None",
             pending_questions=len(state["pending_questions"]),
             conv_len=len(state["conversation_history"])
-        )),
-        HumanMessage(content="Last 3 messages:\n" + "\n".join(state["conversation_history"][-3:]))
+        ) + "\n".join(state["conversation_history"][-3:]))
     ]
     
-    decision = supervisor_llm.invoke(messages).content.lower().strip()
-    return {"next_action": "collect_symptoms" if decision == "exit" and len(state["conversation_history"]) < 5 else decision}
+    schema = routing_schema(VALID_ACTIONS)
+    routing = request_structured(lambda: _llm("supervisor_llm").invoke(messages, schema=schema).content, schema)
+    decision = routing["action"] if routing else None
+    if decision is None or (decision == "exit" and len(state["conversation_history"]) < 5):
+        decision = "collect_symptoms"
+    return {"next_action": decision, **routing_counters(state, used_llm=True)}
 
 def handle_symptoms(state: AgentState):
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    context, memory_update = window_context(state, "collect_symptoms", summarizer=_llm("symptom_llm"))
     messages = [
         SystemMessage(content="""You are a persistent medical assistant. Even if patient is brief:
         1. Ask specific symptom questions
         2. Request details about duration, intensity, location
         3. Ask one question at a time
         4. Maintain friendly tone"""),
-        HumanMessage(content=f"Conversation History:\n{state['conversation_history']}\nPatient Input: {state['user_input']}")
+        HumanMessage(content=f"Conversation History:\n{context}\nPatient Input: {state['user_input']}")
     ]
     
-    response = symptom_llm.invoke(messages).content
+    response = _llm("symptom_llm").invoke(messages).content
     new_state = {
         "conversation_history": [
             f"Patient: {state['user_input']}",
             f"Assistant: {response}"
         ],
-        "next_action": "supervisor"
+        "user_input": "",
+        "next_action": "supervisor",
+        **memory_update
     }
     
     if len(state["conversation_history"]) > 6:
         new_state["symptoms_collected"] = True
     return new_state
 
-def generate_summary(state: AgentState):
+def generate_summary(state: AgentState, config=None):
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    context, _ = window_context(state, "summary", summarizer=_llm("symptom_llm"))
     messages = [
         SystemMessage(content="""Create a clinical summary for the doctor:
         1. Organize symptoms chronologically
         2. Highlight key findings from test reports
         3. Note patient responses to clarification questions
         4. Format with sections: Symptoms, Test Findings, Important Notes"""),
-        HumanMessage(content="\n".join(state["conversation_history"]))
+        HumanMessage(content=context)
     ]
-    return summary_llm.invoke(messages).content
+    summary = _llm("summary_llm").invoke(messages, config=config).content
+    archive_summary(state, summary, config)
+    return summary
 
 
-def process_test_report(state: AgentState):
-    try:
-        loader = Docx2txtLoader(state["test_report"])
-        docs = loader.load()
-        report_content = docs[0].page_content
-        
-        messages = [
+def verification_entries(history: List[str]) -> List[str]:
+    """The Asked/Patient/Analysis triples written by clarify_questions"""
+    entries = []
+    for i, entry in enumerate(history):
+        if entry.startswith("Asked:"):
+            entries += history[i:i + 3]
+    return entries
+
+
+def archive_summary(state: AgentState, summary: str, config=None):
+    """Index the finished session so doctors can search it later instead of regenerating it"""
+    from metrics import session_id_from
+
+    report_text = ""
+    if state.get("report_path"):
+        try:
+            report_text = load_report_text(state["report_path"])  # Served from the extraction cache
+        except Exception:
+            pass
+    archive_session(
+        # One row per consultation, even when sessions share an id (every --async terminal is "terminal")
+        consultation_id(session_id_from(config)),
+        summary,
+        report_text=report_text,
+        verification=verification_entries(state["conversation_history"]),
+        source="main"
+    )
+
+
+def report_questions(report_path: str) -> List[str]:
+    """Verification questions for a report, generated chunk by chunk"""
+    from langchain_core.messages import HumanMessage, SystemMessage
+    from langchain_core.runnables.config import ContextThreadPoolExecutor
+
+    def question_messages(report_content):
+        return [
             SystemMessage(content="""Analyze this test report and generate specific yes/no questions 
-            to verify patient experiences. Format each question as '- [finding]: [question]'"""),
+            to verify patient experiences. Write each question as '[finding]: [question]'.
+            """ + schema_instruction(QUESTIONS_SCHEMA)),
             HumanMessage(content=report_content)
         ]
-        
-        questions = analysis_llm.invoke(messages).content
+
+    # Each chunk goes to the model as soon as it is parsed while later PDF pages keep parsing
+    with ContextThreadPoolExecutor(max_workers=4) as pool:
+        futures = [
+            pool.submit(_llm("analysis_llm").invoke, question_messages(chunk), schema=QUESTIONS_SCHEMA)
+            for chunk in iter_report_chunks(report_path)
+        ]
+        questions = [q for future in futures for q in parse_questions(future.result().content)]
+    # Overlapping chunks can raise the same question twice
+    return list(dict.fromkeys(questions))
+
+
+# Reports handed over with /report mid-interview are processed here while the interview goes on
+report_preprocessor = ReportPreprocessor(report_questions)
+
+
+def process_test_report(state: AgentState):
+    try:
+        questions = report_preprocessor.result(state["test_report"])
+        if questions is None:
+            questions = report_questions(state["test_report"])
         return {
-            "generated_questions": [q.strip() for q in questions.split("\n") if q.strip()],
-            "pending_questions": [q.strip() for q in questions.split("\n") if q.strip()],
+            "conversation_history": [f"Assistant: {format_question_batch(question_batch(questions))}"] if questions else [],
+            "generated_questions": questions,
+            "pending_questions": questions,
             "test_report": "",  # Reset after processing
+            "report_processed": True,
+            "report_path": state["test_report"],
+            "user_input": "",
             "next_action": "supervisor"
         }
     except Exception as e:
         return {
             "conversation_history": [f"Error processing report: {str(e)}"],
+            "test_report": "",
+            "user_input": "",
             "next_action": "supervisor"
         }
 
 def clarify_questions(state: AgentState):
     if not state["pending_questions"]:
-        return {"next_action": "supervisor"}
-    
-    current_question = state["pending_questions"][0]
-    messages = [
-        SystemMessage(content="Analyze patient's response to the medical question."),
-        HumanMessage(content=f"""Question: {current_question}
-        Patient Response: {state['user_input']}
-        Provide 1-sentence analysis:""")
-    ]
-    
-    analysis = analysis_llm.invoke(messages).content
+        # Nothing to clarify; consume the input so it isn't routed through the supervisor again
+        return {"user_input": "", "next_action": "supervisor"}
+
+    # All answers to the current batch are analyzed in one call
+    update = clarification_update(_llm("analysis_llm"), state["pending_questions"], state["user_input"])
     return {
-        "conversation_history": [
-            f"Asked: {current_question}",
-            f"Patient: {state['user_input']}",
-            f"Analysis: {analysis}"
-        ],
-        "pending_questions": state["pending_questions"][1:],
+        **update,
+        "user_input": "",
         "next_action": "supervisor"
     }
 
 def follow_up(state: AgentState):
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    context, memory_update = window_context(state, "follow_up", summarizer=_llm("symptom_llm"))
     messages = [
         SystemMessage(content="""Generate follow-up questions based on:
         - Conversation history
         - Time since last follow-up
         - Unresolved medical points"""),
-        HumanMessage(content=f"""Last Follow-up: {state['last_follow_up']}
-        Conversation History:\n{state['conversation_history']}""")
+        HumanMessage(content=f"""Conversation History:\n{context}
+        Last Follow-up: {state['last_follow_up']}""")
     ]
     
-    questions = analysis_llm.invoke(messages).content
+    questions = _llm("analysis_llm").invoke(messages).content
     return {
         "conversation_history": [f"Follow-up: {questions}"],
         "last_follow_up": datetime.datetime.now(),
-        "next_action": "supervisor"
+        "user_input": "",
+        "next_action": "supervisor",
+        **memory_update
     }
 
 # Build workflow
-workflow = StateGraph(AgentState)
-nodes = {
-    "supervisor": supervisor_node,
-    "collect_symptoms": handle_symptoms,
-    "process_report": process_test_report,
-    "clarify_questions": clarify_questions,
-    "follow_up": follow_up
-}
+def build_workflow():
+    """Graph definition; langgraph is imported here so importing this module stays cheap"""
+    from langgraph.graph import StateGraph, END
+
+    from metrics import timed_node
+
+    _load_env()
+
+    workflow = StateGraph(AgentState)
+    nodes = {
+        "supervisor": supervisor_node,
+        "collect_symptoms": handle_symptoms,
+        "process_report": process_test_report,
+        "clarify_questions": clarify_questions,
+        "follow_up": follow_up
+    }
+
+    for name, node in nodes.items():
+        workflow.add_node(name, timed_node(name, node))
+
+    workflow.add_conditional_edges(
+        "supervisor",
+        route_after_supervisor,
+        {action: action for action in nodes.keys() if action != "supervisor"} | {"exit": END, AWAIT_INPUT: END}
+    )
+
+    for node in ["collect_symptoms", "process_report", "clarify_questions", "follow_up"]:
+        workflow.add_edge(node, "supervisor")
+
+    workflow.set_entry_point("supervisor")
+    return workflow
+
 
-for name, node in nodes.items():
-    workflow.add_node(name, node)
+_agent = None
+_durable_agent = None
 
-workflow.add_conditional_edges(
-    "supervisor",
-    lambda state: state["next_action"],
-    {action: action for action in nodes.keys() if action != "supervisor"} | {"exit": END}
-)
 
-for node in ["collect_symptoms", "process_report", "clarify_questions", "follow_up"]:
-    workflow.add_edge(node, "supervisor")
+def get_agent():
+    global _agent
+    if _agent is None:
+        _agent = build_workflow().compile()
+    return _agent
 
-workflow.set_entry_point("supervisor")
-agent = workflow.compile()
+
+def get_durable_agent():
+    """The same graph with SQLite checkpointing, compiled on first use"""
+    global _durable_agent
+    if _durable_agent is None:
+        from checkpointing import open_checkpointer
+        _durable_agent = build_workflow().compile(checkpointer=open_checkpointer())
+    return _durable_agent
+
+
+def __getattr__(name):
+    # "agent" and the chat models keep working as module attributes, built on first access
+    if name == "agent":
+        return get_agent()
+    if name in LLM_SETTINGS:
+        return _llm(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def warm_up() -> threading.Thread:
+    """Build the clients and open pooled connections in the background while the patient types"""
+    def build():
+        for name in LLM_SETTINGS:
+            _llm(name)
+        prewarm()
+    thread = threading.Thread(target=build, daemon=True)
+    thread.start()
+    return thread
 
 # Modified chat interface
-def chat_interface():
-    state = {
+def new_session_state() -> AgentState:
+    """Fresh, isolated state for one patient session"""
+    return {
         "conversation_history": [],
         "test_report": "",
         "generated_questions": [],
         "pending_questions": [],
         "last_follow_up": None,
         "symptoms_collected": False,
+        "report_processed": False,
+        "report_path": "",
+        "history_summary": "",
+        "summarized_upto": 0,
+        "routing_llm_calls": 0,
+        "routing_llm_calls_saved": 0,
         "next_action": "collect_symptoms",
         "user_input": ""
     }
+
+
+def chat_interface(stream: bool = True, session_id: str = None, durable: bool = True):
+    """Terminal consultation; with durable=True every turn is checkpointed and resumable by session_id"""
+    session_id = session_id or str(uuid.uuid4())
+    from checkpointing import checkpoint_overhead, load_session, session_config
+    from llm_cache import get_store
+    from metrics import registry as metrics
+
+    warm_up()
+    graph = get_durable_agent() if durable else get_agent()
+    if durable:
+        config, saved = load_session(graph, session_id)
+    else:
+        # Tags every node and LLM call of this session in the metrics
+        config, saved = {"metadata": {"session_id": session_id}}, {}
+    if saved.get("next_action") == "exit":
+        print(f"[Session] {session_id} already finished; starting a new session")
+        session_id = str(uuid.uuid4())
+        config, saved = session_config(session_id), {}
+    state = {**new_session_state(), **saved}
+    # Once a checkpoint holds the state, a turn only sends the new input
+    send_full_state = not saved
+    turns = 0
     
-    print("Medical Assistant: Hello! I'm your health assistant. Let's start with your symptoms.")
+    if saved:
+        print(f"[Session] Resuming {session_id}")
+        if state["conversation_history"]:
+            print(f"\nAssistant: {state['conversation_history'][-1].split('Assistant: ')[-1]}")
+    else:
+        print("Medical Assistant: Hello! I'm your health assistant. Let's start with your symptoms.")
+        if durable:
+            print(f"[Session] {session_id} (resume with --session {session_id})")
     
+    queued_report = None
     while True:
-        if state["next_action"] == "process_report":
-            report_path = input("\n[System] Please upload test report path: ")
-            state["test_report"] = report_path
-            state["user_input"] = "[REPORT_UPLOADED]"
+        report_path = None
+        if queued_report and state["symptoms_collected"]:
+            # Symptoms are in: hand over the report, already processed in the background
+            report_path, queued_report = queued_report, None
+        elif state["next_action"] == "process_report":
+            report_path = queued_report or input("\n[System] Please upload test report path: ")
+            queued_report = None
         else:
             user_input = input("\nPatient: ")
-            state["user_input"] = user_input
+            if parse_report_command(user_input):
+                # Parsed and analysed on the worker thread while the interview carries on
+                queued_report = parse_report_command(user_input)
+                report_preprocessor.submit(queued_report)
+                print("\n[System] Report received. It's being analysed while we continue.")
+                continue
+
+        turn = dict(state) if send_full_state else {}
+        send_full_state = not durable
+        if report_path is not None:
+            turn["test_report"] = report_path
+            turn["user_input"] = "[REPORT_UPLOADED]"
+        else:
+            turn["user_input"] = user_input
         
-        result = agent.invoke(state)
+        if stream:
+            result, streamed = stream_turn(graph, turn, config)
+        else:
+            result, streamed = graph.invoke(turn, config=config), False
         state.update(result)
+        turns += 1
         
-        # Print latest assistant message
-        if state["conversation_history"]:
+        # Print latest assistant message unless it was already streamed
+        if state["conversation_history"] and not streamed:
             print(f"\nAssistant: {state['conversation_history'][-1].split('Assistant: ')[-1]}")
         
         if state.get("next_action") == "exit":
-            summary = generate_summary(state)
+            summary = generate_summary(state, config)
             print(f"\nConsultation Summary for Doctor:\n{summary}")
+            print(f"\n[Supervisor] Routing: {state['routing_llm_calls_saved']} LLM calls saved, "
+                  f"{state['routing_llm_calls']} made")
+            print(f"[Cache] {get_store().stats()}")
+            print(f"[Report cache] {get_report_cache().stats()}")
+            print(f"[Model registry] {model_registry_stats()}")
+            print(f"[Rate limiter] {rate_limiter_stats()}")
+            print(f"[Model tiers] {model_tier_stats()}")
+            print(f"[Report worker] {report_preprocessor.stats()}")
+            print(f"[Structured output] {structured_output_stats()}")
+            print(f"[Metrics] {metrics.session_totals(config['metadata']['session_id'])}")
+            print(f"[Prompt cache] {metrics.prompt_cache()}")
+            if durable:
+                print(f"[Checkpoint] {checkpoint_overhead(session_id, turns)}")
             break
 
+
+async def async_chat_interface(transport=None, max_concurrent_llm: int = 32):
+    """Serve any number of patient sessions from one event loop"""
+    if transport is None:
+        transport = TerminalTransport()
+        print("Medical Assistant: Hello! I'm your health assistant. Let's start with your symptoms.")
+    warm_up()
+    engine = SessionEngine(
+        get_agent(),
+        new_session_state,
+        transport,
+        finalize=generate_summary,
+        max_concurrent_llm=max_concurrent_llm,
+        reports=report_preprocessor
+    )
+    await engine.run()
+
 # Keep workflow configuration and other nodes
 
 if __name__ == "__main__":
-    chat_interface()
\ No newline at end of file
+    if "--async" in sys.argv:
+        asyncio.run(async_chat_interface())
+    else:
+        session_id = sys.argv[sys.argv.index("--session") + 1] if "--session" in sys.argv else None
+        chat_interface(
+            stream="--no-stream" not in sys.argv,
+            session_id=session_id,
+            durable="--no-checkpoint" not in sys.argv
+        )
\ No newline at end of file
@@ -0,0 +1,272 @@
+import json
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import RunnableConfig
+
+# ==================
+# 1. Pricing
+# ==================
+# USD per 1M tokens: (prompt, completion)
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4-1106-preview": (10.00, 30.00),
+    "gpt-4": (30.00, 60.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+
+# Prompt tokens served from the provider's prefix cache bill at this share of the prompt price
+CACHED_PROMPT_PRICE_FACTOR = 0.5
+
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_prompt_tokens: int = 0) -> float:
+    """cached_prompt_tokens is the part of prompt_tokens read from the prefix cache"""
+    # Longest matching prefix so dated snapshots ("gpt-4o-2024-08-06") price like their family
+    matches = [name for name in MODEL_PRICES if model.startswith(name)]
+    if not matches:
+        return 0.0
+    prompt_price, completion_price = MODEL_PRICES[max(matches, key=len)]
+    cached = min(cached_prompt_tokens, prompt_tokens)
+    prompt_cost = (prompt_tokens - cached + cached * CACHED_PROMPT_PRICE_FACTOR) * prompt_price
+    return (prompt_cost + completion_tokens * completion_price) / 1_000_000
+
+
+# ==================
+# 2. Registry
+# ==================
+class Histogram:
+    def __init__(self, buckets: List[float] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "buckets": dict(zip([str(b) for b in self.buckets], self.counts)),
+        }
+
+
+class MetricsRegistry:
+    """Latency histograms plus token and cost totals per node, model and session"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.node_latency: Dict[str, Histogram] = defaultdict(Histogram)
+        self.llm_latency: Dict[Tuple[str, str], Histogram] = defaultdict(Histogram)
+        self.llm_tokens: Dict[Tuple[str, str], Dict[str, float]] = defaultdict(
+            lambda: {"prompt_tokens": 0, "cached_prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0, "calls": 0}
+        )
+        self.checkpoint_latency: Dict[str, Histogram] = defaultdict(Histogram)
+        self.rate_limit_wait = Histogram()
+        self.gauges: Dict[str, float] = {}
+        self.sessions: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"node_calls": 0, "node_seconds": 0.0, "llm_calls": 0,
+                     "prompt_tokens": 0, "cached_prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0,
+                     "checkpoint_reads": 0, "checkpoint_writes": 0, "checkpoint_seconds": 0.0}
+        )
+
+    def record_node(self, node: str, seconds: float, session_id: Optional[str] = None) -> None:
+        with self._lock:
+            self.node_latency[node].observe(seconds)
+            if session_id:
+                totals = self.sessions[session_id]
+                totals["node_calls"] += 1
+                totals["node_seconds"] += seconds
+
+    def record_llm(self, node: str, model: str, seconds: float, prompt_tokens: int,
+                   completion_tokens: int, session_id: Optional[str] = None, cached_prompt_tokens: int = 0) -> None:
+        cost = estimate_cost(model, prompt_tokens, completion_tokens, cached_prompt_tokens)
+        with self._lock:
+            self.llm_latency[(node, model)].observe(seconds)
+            usage = self.llm_tokens[(node, model)]
+            usage["calls"] += 1
+            usage["prompt_tokens"] += prompt_tokens
+            usage["cached_prompt_tokens"] += cached_prompt_tokens
+            usage["completion_tokens"] += completion_tokens
+            usage["cost_usd"] += cost
+            if session_id:
+                totals = self.sessions[session_id]
+                totals["llm_calls"] += 1
+                totals["prompt_tokens"] += prompt_tokens
+                totals["cached_prompt_tokens"] += cached_prompt_tokens
+                totals["completion_tokens"] += completion_tokens
+                totals["cost_usd"] += cost
+
+    def record_checkpoint(self, operation: str, seconds: float, session_id: Optional[str] = None) -> None:
+        """operation is "read" or "write" """
+        with self._lock:
+            self.checkpoint_latency[operation].observe(seconds)
+            if session_id:
+                totals = self.sessions[session_id]
+                totals[f"checkpoint_{operation}s"] += 1
+                totals["checkpoint_seconds"] += seconds
+
+    def record_rate_limit(self, wait_seconds: float, queue_depth: int, concurrency_limit: int) -> None:
+        """Time a model call queued in the rate limiter, plus the limiter's current queue and limit"""
+        with self._lock:
+            self.rate_limit_wait.observe(wait_seconds)
+            self.gauges["rate_limit_queue_depth"] = queue_depth
+            self.gauges["rate_limit_concurrency"] = concurrency_limit
+
+    def prompt_cache(self) -> Dict[str, Dict[str, Any]]:
+        """Per node: prompt tokens read from the provider's prefix cache vs. sent uncached"""
+        nodes: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for (node, _), usage in self.llm_tokens.items():
+                totals = nodes.setdefault(node, {"prompt_tokens": 0, "cached_prompt_tokens": 0})
+                totals["prompt_tokens"] += usage["prompt_tokens"]
+                totals["cached_prompt_tokens"] += usage["cached_prompt_tokens"]
+        for totals in nodes.values():
+            totals["uncached_prompt_tokens"] = totals["prompt_tokens"] - totals["cached_prompt_tokens"]
+            totals["hit_rate"] = round(totals["cached_prompt_tokens"] / totals["prompt_tokens"], 3) \
+                if totals["prompt_tokens"] else 0.0
+        return nodes
+
+    def session_totals(self, session_id: str) -> Dict[str, float]:
+        with self._lock:
+            return dict(self.sessions.get(session_id, {}))
+
+    def to_json(self) -> str:
+        with self._lock:
+            return json.dumps({
+                "node_latency_seconds": {node: h.to_dict() for node, h in self.node_latency.items()},
+                "llm_latency_seconds": {f"{node}/{model}": h.to_dict() for (node, model), h in self.llm_latency.items()},
+                "llm_usage": {f"{node}/{model}": dict(usage) for (node, model), usage in self.llm_tokens.items()},
+                "checkpoint_latency_seconds": {op: h.to_dict() for op, h in self.checkpoint_latency.items()},
+                "rate_limit_wait_seconds": self.rate_limit_wait.to_dict(),
+                "gauges": dict(self.gauges),
+                "sessions": {sid: dict(totals) for sid, totals in self.sessions.items()},
+            }, indent=2)
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            lines += _histogram_lines("agent_node_latency_seconds", "Wall time per graph node invocation",
+                                      {(("node", node),): h for node, h in self.node_latency.items()})
+            lines += _histogram_lines("agent_llm_latency_seconds", "Wall time per LLM call",
+                                      {(("node", node), ("model", model)): h
+                                       for (node, model), h in self.llm_latency.items()})
+            lines += _histogram_lines("agent_checkpoint_latency_seconds", "Wall time per checkpoint read or write",
+                                      {(("operation", op),): h for op, h in self.checkpoint_latency.items()})
+            lines += _histogram_lines("agent_rate_limit_wait_seconds", "Time model calls queued for rate limits",
+                                      {(("limiter", "openai"),): self.rate_limit_wait})
+            for name, value in self.gauges.items():
+                lines += [f"# TYPE agent_{name} gauge", f"agent_{name} {value}"]
+            for metric, key, help_text in [
+                ("agent_llm_prompt_tokens_total", "prompt_tokens", "Prompt tokens sent"),
+                ("agent_llm_cached_prompt_tokens_total", "cached_prompt_tokens",
+                 "Prompt tokens read from the provider's prefix cache"),
+                ("agent_llm_completion_tokens_total", "completion_tokens", "Completion tokens received"),
+                ("agent_llm_cost_usd_total", "cost_usd", "Estimated spend in USD"),
+                ("agent_llm_calls_total", "calls", "LLM calls made"),
+            ]:
+                lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+                for (node, model), usage in self.llm_tokens.items():
+                    lines.append(f'{metric}{{node="{node}",model="{model}"}} {usage[key]}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """Export as Prometheus text (.prom/.txt) or JSON (anything else)"""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json())
+
+
+def _histogram_lines(metric: str, help_text: str, series: Dict[tuple, Histogram]) -> List[str]:
+    lines = [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+    for labels, h in series.items():
+        label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+        for bound, count in zip(h.buckets, h.counts):
+            lines.append(f'{metric}_bucket{{{label_text},le="{bound}"}} {count}')
+        lines.append(f'{metric}_bucket{{{label_text},le="+Inf"}} {h.count}')
+        lines.append(f"{metric}_sum{{{label_text}}} {h.sum}")
+        lines.append(f"{metric}_count{{{label_text}}} {h.count}")
+    return lines
+
+
+registry = MetricsRegistry()
+
+
+# ==================
+# 3. Instrumentation
+# ==================
+def session_id_from(config: Optional[RunnableConfig]) -> Optional[str]:
+    if not config:
+        return None
+    return (config.get("metadata") or {}).get("session_id") or (config.get("configurable") or {}).get("thread_id")
+
+
+def timed_node(name: str, node):
+    """Wrap a graph node to record its wall time.
+
+    Not functools.wraps: LangGraph reads the signature to decide whether to pass config.
+    """
+    def wrapper(state, config: RunnableConfig = None):
+        started = time.perf_counter()
+        try:
+            return node(state)
+        finally:
+            registry.record_node(name, time.perf_counter() - started, session_id_from(config))
+    wrapper.__name__ = getattr(node, "__name__", name)
+    wrapper.__doc__ = node.__doc__
+    return wrapper
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """Records latency, tokens and cost for every chat model call it is attached to"""
+
+    def __init__(self, metrics: MetricsRegistry = registry):
+        self.metrics = metrics
+        self._runs: Dict[UUID, Tuple[float, str, str, Optional[str]]] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata=None, **kwargs) -> None:
+        metadata = metadata or {}
+        params = kwargs.get("invocation_params") or {}
+        model = metadata.get("ls_model_name") or params.get("model_name") or params.get("model") or "unknown"
+        node = metadata.get("langgraph_node") or metadata.get("call_site") or "outside_graph"
+        self._runs[run_id] = (time.perf_counter(), node, model, metadata.get("session_id"))
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        started, node, model, session_id = run
+        prompt_tokens, completion_tokens, cached_prompt_tokens = _token_usage(response)
+        self.metrics.record_llm(node, model, time.perf_counter() - started,
+                                prompt_tokens, completion_tokens, session_id, cached_prompt_tokens)
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs) -> None:
+        self._runs.pop(run_id, None)
+
+
+def _token_usage(response) -> Tuple[int, int, int]:
+    """(prompt, completion, cached prompt) tokens"""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                cached = (usage.get("input_token_details") or {}).get("cache_read") or 0
+                return usage.get("input_tokens", 0), usage.get("output_tokens", 0), cached
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0), cached
+
+
+llm_callback = LLMMetricsCallback()
@@ -0,0 +1,151 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# ==================
+# 1. Configuration
+# ==================
+# Sized for SessionEngine's default of 32 concurrent model calls
+POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", 32))
+POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", 16))
+# Patients take a while to answer; keep idle connections long enough to reuse on the next turn
+POOL_KEEPALIVE_SECONDS = float(os.getenv("LLM_POOL_KEEPALIVE_SECONDS", 120))
+PREWARM_CONNECTIONS = int(os.getenv("LLM_PREWARM_CONNECTIONS", 2))
+REQUEST_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 60))
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+
+_lock = threading.Lock()
+_clients: Dict[str, Any] = {}
+_models: Dict[tuple, Any] = {}
+_stats = {"models_built": 0, "models_reused": 0, "prewarmed_connections": 0}
+
+
+# ==================
+# 2. Shared HTTP pools
+# ==================
+def _limits():
+    import httpx
+    return httpx.Limits(max_connections=POOL_MAX_CONNECTIONS, max_keepalive_connections=POOL_MAX_KEEPALIVE,
+                        keepalive_expiry=POOL_KEEPALIVE_SECONDS)
+
+
+def _shared(kind: str):
+    client = _clients.get(kind)
+    if client is None:
+        with _lock:
+            client = _clients.get(kind)
+            if client is None:
+                import httpx
+
+                base = httpx.Client if kind == "sync" else httpx.AsyncClient
+
+                class SharedClient(base):
+                    # AutoGen deep-copies llm_config per agent; every copy must stay the one pool
+                    def __deepcopy__(self, memo):
+                        return self
+
+                # Every model call in the process queues through one rate limiter
+                from rate_limiter import rate_limited_transport
+                inner = (httpx.HTTPTransport if kind == "sync" else httpx.AsyncHTTPTransport)(limits=_limits())
+                client = SharedClient(transport=rate_limited_transport(kind, inner), timeout=REQUEST_TIMEOUT)
+                _clients[kind] = client
+    return client
+
+
+def http_client():
+    """Process-wide keep-alive httpx.Client for model calls"""
+    return _shared("sync")
+
+
+def async_http_client():
+    """Process-wide httpx.AsyncClient; its connections belong to the event loop that opened them"""
+    return _shared("async")
+
+
+def prewarm(connections: int = PREWARM_CONNECTIONS, base_url: str = OPENAI_BASE_URL) -> int:
+    """Open keep-alive connections (DNS + TCP + TLS) before the first model call.
+
+    Runs the handshakes in parallel so each lands on its own pooled connection;
+    returns how many succeeded. Failures are logged, never raised.
+    """
+    client = http_client()
+
+    def connect(_) -> bool:
+        try:
+            client.head(base_url, timeout=5.0)
+            return True
+        except Exception as e:
+            logger.debug("Prewarm of %s failed: %s", base_url, e)
+            return False
+
+    with ThreadPoolExecutor(max_workers=max(1, connections)) as pool:
+        opened = sum(pool.map(connect, range(connections)))
+    with _lock:
+        _stats["prewarmed_connections"] += opened
+    return opened
+
+
+def prewarm_in_background(connections: int = PREWARM_CONNECTIONS) -> threading.Thread:
+    thread = threading.Thread(target=prewarm, args=(connections,), daemon=True)
+    thread.start()
+    return thread
+
+
+# ==================
+# 3. Model instances
+# ==================
+def _key_part(value: Any) -> Any:
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        # Callback lists and the like: the same objects share a model, different ones don't
+        return tuple(id(item) for item in value) if isinstance(value, (list, tuple)) else id(value)
+
+
+def chat_model(model: str = "gpt-4o-mini", temperature: Optional[float] = None, **kwargs):
+    """ChatOpenAI for these settings, built once per process and backed by the shared pools"""
+    key = (model, temperature) + tuple(sorted((k, _key_part(v)) for k, v in kwargs.items()))
+    llm = _models.get(key)
+    if llm is not None:
+        with _lock:
+            _stats["models_reused"] += 1
+        return llm
+    from langchain_openai import ChatOpenAI
+    sync_client, async_client = http_client(), async_http_client()
+    with _lock:
+        llm = _models.get(key)
+        if llm is None:
+            llm = ChatOpenAI(model=model, temperature=temperature, http_client=sync_client,
+                             http_async_client=async_client, **kwargs)
+            _models[key] = llm
+            _stats["models_built"] += 1
+        else:
+            _stats["models_reused"] += 1
+    return llm
+
+
+def autogen_config_list(config_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """config_list entries that share the pooled client instead of opening one pool per agent"""
+    return [
+        entry if "http_client" in entry or "model_client_cls" in entry else {**entry, "http_client": http_client()}
+        for entry in config_list
+    ]
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        return {**_stats, "pool_max_connections": POOL_MAX_CONNECTIONS, "pool_max_keepalive": POOL_MAX_KEEPALIVE}
+
+
+def close() -> None:
+    """Close the shared sync pool (the async one is closed by its event loop's owner)"""
+    with _lock:
+        client = _clients.pop("sync", None)
+        _models.clear()
+    if client is not None:
+        client.close()
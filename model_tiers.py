@@ -0,0 +1,249 @@
+import contextvars
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from streaming import NOSTREAM_TAG, emit_accepted_reply
+from structured_output import is_valid
+
+# ==================
+# 1. Configuration
+# ==================
+# Fastest adequate model first; later tiers only see calls the earlier ones failed
+DEFAULT_TIERS = ["gpt-4o-mini", "gpt-4o"]
+# Calls from one site share their static prompt prefix; one cache key per site keeps them on the same
+# provider cache (PROMPT_CACHE_KEYS=0 for OpenAI-compatible servers that reject the parameter)
+PROMPT_CACHE_KEYS = os.getenv("PROMPT_CACHE_KEYS", "1") != "0"
+
+
+def _override(name: str) -> Optional[str]:
+    return os.getenv(f"MODEL_TIERS_{name.upper()}")
+
+
+def tiers_for(call_site: str, default: Optional[List[str]] = None) -> List[str]:
+    """Tiers for a call site or node; MODEL_TIERS_<NAME>="gpt-4o-mini,gpt-4o" overrides the default"""
+    override = _override(call_site)
+    if override:
+        return [model.strip() for model in override.split(",") if model.strip()]
+    return list(default or DEFAULT_TIERS)
+
+
+# ==================
+# 2. Checks
+# ==================
+# Replies that decline or dodge the task instead of doing it
+_NON_ANSWER = re.compile(r"^\W*(?:I(?:'m| am) sorry,? (?:but )?)?(?:I(?:'m| am) (?:unable to|not able to|not sure how to)"
+                         r"|I (?:can(?:'|no)t|cannot) (?:help|assist|provide|answer)|As an AI\b)", re.I)
+
+
+def reply_check(reply: str, schema: Optional[Dict[str, Any]] = None) -> bool:
+    """A reply is adequate when it isn't empty or a non-answer and, if the caller passed a schema, matches it.
+
+    Free-text calls pass no schema and are held to the first two; validation
+    of JSON includes structured_output's local repair, so only replies that
+    can't be used at all cost an escalation.
+    """
+    text = str(reply or "").strip()
+    if not text or _NON_ANSWER.match(text):
+        return False
+    return schema is None or is_valid(text, schema)
+
+
+def _truncated(reply: Any) -> bool:
+    """Cut off at max_tokens, so even a plausible-looking reply is incomplete"""
+    return (getattr(reply, "response_metadata", None) or {}).get("finish_reason") == "length"
+
+
+# ==================
+# 3. Escalation stats
+# ==================
+_lock = threading.Lock()
+_stats: Dict[str, Dict[str, Any]] = {}
+
+
+def _record(call_site: str, model: str, escalated: bool, unresolved: bool = False) -> None:
+    with _lock:
+        site = _stats.setdefault(call_site, {"calls": 0, "escalations": 0, "unresolved": 0, "tiers": {}})
+        site["tiers"][model] = site["tiers"].get(model, 0) + 1
+        site["escalations"] += int(escalated)
+        if not escalated:
+            site["calls"] += 1
+            site["unresolved"] += int(unresolved)
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    """Per node (or call site outside a node): calls, escalations, model calls per tier, and replies no tier got right"""
+    with _lock:
+        return {site: {**values, "tiers": dict(values["tiers"])} for site, values in _stats.items()}
+
+
+def reset_stats() -> None:
+    with _lock:
+        _stats.clear()
+
+
+# ==================
+# 4. LangChain call sites
+# ==================
+class TieredChatModel:
+    """Chat model client that escalates through tiers when a reply fails its check.
+
+    The tiers come from the graph node making the call (node_tiers, or
+    MODEL_TIERS_<NODE>), so one client shared by several nodes still follows
+    each node's policy; calls outside a node or from nodes without a policy
+    use the client's own tiers. Stats are kept per node. Only invoke/ainvoke
+    are routed, which is all the graph nodes use; the last tier's reply is
+    returned even if it fails too. Calls carry the call site as their
+    prompt_cache_key. A call that asks for JSON passes its schema
+    (invoke(..., schema=QUESTIONS_SCHEMA)) and replies are validated against it. Inside a graph node, tiers that may still be escalated
+    from run tagged NOSTREAM_TAG and their reply is streamed only once
+    accepted, so the patient never sees a rejected draft.
+    """
+
+    def __init__(self, call_site: str, models: List[Tuple[str, Any]],
+                 check: Callable[[str, Optional[Dict[str, Any]]], bool] = reply_check,
+                 node_tiers: Optional[Dict[str, List[str]]] = None,
+                 build: Optional[Callable[[str], Any]] = None):
+        self.call_site = call_site
+        self.models = models
+        self.check = check
+        self.node_tiers = node_tiers or {}
+        self.build = build
+
+    def _route(self, config: Any) -> Tuple[Optional[str], str, List[Tuple[str, Any]]]:
+        """(graph node, stats key, models) for the node this call runs in"""
+        from langchain_core.runnables.config import ensure_config
+
+        node = (ensure_config(config).get("metadata") or {}).get("langgraph_node")
+        if not node:
+            return None, self.call_site, self.models
+        if self.build is not None and (node in self.node_tiers or _override(node)):
+            return node, node, [(model, self.build(model)) for model in tiers_for(node, self.node_tiers.get(node))]
+        return node, node, self.models
+
+    def _accept(self, site: str, last: bool, model_name: str, schema: Optional[Dict[str, Any]], reply: Any) -> bool:
+        passed = self.check(getattr(reply, "content", reply), schema) and not _truncated(reply)
+        if passed or last:
+            _record(site, model_name, escalated=False, unresolved=not passed)
+            return True
+        _record(site, model_name, escalated=True)
+        return False
+
+    def _tier_calls(self, config: Any):
+        """(node, stats key, [(model name, client, config, held back)]) for one call"""
+        from langchain_core.runnables.config import ensure_config
+
+        node, site, models = self._route(config)
+        tags = ensure_config(config).get("tags") or []
+        # Tiers that may be rejected keep their tokens out of the patient's stream
+        held_config = {**ensure_config(config), "tags": [*tags, NOSTREAM_TAG]}
+        calls = []
+        for index, (model_name, llm) in enumerate(models):
+            held = node is not None and NOSTREAM_TAG not in tags and index < len(models) - 1
+            calls.append((model_name, llm, held_config if held else config, held))
+        return node, site, calls
+
+    def _kwargs(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        return {"prompt_cache_key": self.call_site, **kwargs} if PROMPT_CACHE_KEYS else kwargs
+
+    def invoke(self, input, config=None, *, schema: Optional[Dict[str, Any]] = None, **kwargs):
+        kwargs = self._kwargs(kwargs)
+        node, site, calls = self._tier_calls(config)
+        for index, (model_name, llm, tier_config, held) in enumerate(calls):
+            reply = llm.invoke(input, config=tier_config, **kwargs)
+            if self._accept(site, index == len(calls) - 1, model_name, schema, reply):
+                if held:
+                    emit_accepted_reply(reply.content, node)
+                return reply
+
+    async def ainvoke(self, input, config=None, *, schema: Optional[Dict[str, Any]] = None, **kwargs):
+        kwargs = self._kwargs(kwargs)
+        node, site, calls = self._tier_calls(config)
+        for index, (model_name, llm, tier_config, held) in enumerate(calls):
+            reply = await llm.ainvoke(input, config=tier_config, **kwargs)
+            if self._accept(site, index == len(calls) - 1, model_name, schema, reply):
+                if held:
+                    emit_accepted_reply(reply.content, node)
+                return reply
+
+
+def tiered_chat_model(call_site: str, tiers: Optional[List[str]] = None,
+                      node_tiers: Optional[Dict[str, List[str]]] = None, **kwargs) -> TieredChatModel:
+    """TieredChatModel over shared ChatOpenAI instances (kwargs such as temperature apply to every tier)"""
+    from model_registry import chat_model
+
+    def build(model: str):
+        return chat_model(model, **kwargs)
+
+    return TieredChatModel(call_site, [(model, build(model)) for model in tiers_for(call_site, tiers)],
+                           node_tiers=node_tiers, build=build)
+
+
+# ==================
+# 5. AutoGen agents
+# ==================
+def tier_config_list(config_list: List[Dict[str, Any]], model: str) -> List[Dict[str, Any]]:
+    return [{**entry, "model": model} for entry in config_list]
+
+
+class EscalatingReply:
+    """AutoGen reply function that tries one client per tier until a reply passes the check.
+
+    generate_reply() can't carry extra arguments to reply functions, so a
+    caller that asks for JSON wraps the call in expecting(schema).
+    """
+
+    def __init__(self, call_site: str, llm_configs: List[Dict[str, Any]], models: List[str],
+                 check: Callable[[str, Optional[Dict[str, Any]]], bool] = reply_check):
+        from autogen import OpenAIWrapper
+
+        self.call_site = call_site
+        self.models = models
+        self.clients = [OpenAIWrapper(**llm_config) for llm_config in llm_configs]
+        self.check = check
+        self._schema: contextvars.ContextVar = contextvars.ContextVar(f"{call_site}_schema", default=None)
+
+    @contextmanager
+    def expecting(self, schema: Dict[str, Any]) -> Iterator[None]:
+        """Validate replies generated inside the block against schema"""
+        token = self._schema.set(schema)
+        try:
+            yield
+        finally:
+            self._schema.reset(token)
+
+    def __call__(self, recipient, messages=None, sender=None, config=None):
+        schema = self._schema.get()
+        final, reply = False, None
+        for index, client in enumerate(self.clients):
+            final, reply = recipient.generate_oai_reply(messages, sender, config=client)
+            content = reply.get("content") if isinstance(reply, dict) else reply
+            passed = self.check(content or "", schema)
+            if passed or index == len(self.clients) - 1:
+                _record(self.call_site, self.models[index], escalated=False, unresolved=not passed)
+                break
+            _record(self.call_site, self.models[index], escalated=True)
+        return final, reply
+
+
+def apply_autogen_tiers(agents: List[Any], config_list: List[Dict[str, Any]],
+                        tiers: Optional[List[str]] = None) -> Dict[str, EscalatingReply]:
+    """Route each agent's model replies through its tiers; returns each agent's EscalatingReply"""
+    from autogen import Agent
+
+    from model_registry import autogen_config_list
+
+    replies = {}
+    for agent in agents:
+        models = tiers_for(agent.name, tiers)
+        llm_configs = [{"config_list": autogen_config_list(tier_config_list(config_list, model))} for model in models]
+        reply = EscalatingReply(agent.name, llm_configs, models)
+        # Just ahead of the default OpenAI reply, which it replaces; termination and tool replies still go first
+        names = [getattr(entry["reply_func"], "__name__", "") for entry in agent._reply_func_list]
+        position = min((names.index(name) for name in ("a_generate_oai_reply", "generate_oai_reply") if name in names),
+                       default=0)
+        agent.register_reply([Agent, None], reply, position=position)
+        replies[agent.name] = reply
+    return replies
@@ -0,0 +1,126 @@
+import math
+import mmap
+import re
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List
+
+from pypdf import PdfReader
+
+# ==================
+# 1. Page extraction
+# ==================
+# One reader per worker process so pages don't re-parse the cross-reference table
+_worker_readers: Dict[str, PdfReader] = {}
+
+
+def _open_reader(file_path: str):
+    """Memory-map the file so only the pages being read are paged in"""
+    f = open(file_path, "rb")
+    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return f, mapped, PdfReader(mapped)
+
+
+def _extract_page(args) -> str:
+    """Process-pool worker for a single page"""
+    file_path, index = args
+    if file_path not in _worker_readers:
+        _worker_readers[file_path] = _open_reader(file_path)[2]
+    return _worker_readers[file_path].pages[index].extract_text() or ""
+
+
+def iter_raw_pages(file_path: str, workers: int = 0) -> Iterator[str]:
+    """Yield page text in order, optionally extracting pages in a process pool"""
+    f, mapped, reader = _open_reader(file_path)
+    try:
+        page_count = len(reader.pages)
+        if workers <= 1 or page_count < 2:
+            for page in reader.pages:
+                yield page.extract_text() or ""
+            return
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            yield from pool.map(_extract_page, [(file_path, i) for i in range(page_count)], chunksize=4)
+    finally:
+        del reader
+        mapped.close()
+        f.close()
+
+
+# ==================
+# 2. Header/footer stripping
+# ==================
+class BoilerplateFilter:
+    """Drops header/footer lines that repeat across pages.
+
+    Only the first and last few lines of each page are candidates; digits are
+    masked so "Page 3 of 12" matches "Page 4 of 12". Masking also makes lab
+    rows alike ("Glucose # mg/dL"), so a line must be on at least min_share
+    of the pages seen, and on min_repeats of them, to count as boilerplate.
+    Reports shorter than min_pages are left alone: over so few pages a
+    repeated result row can't be told apart from a header.
+    """
+
+    def __init__(self, edge_lines: int = 3, min_repeats: int = 3, min_share: float = 0.5, min_pages: int = 4):
+        self.edge_lines = edge_lines
+        self.min_repeats = min_repeats
+        self.min_share = min_share
+        self.min_pages = min_pages
+        self.counts: Counter = Counter()
+        self.pages = 0
+
+    @staticmethod
+    def _key(line: str) -> str:
+        return re.sub(r"\d+", "#", line.strip().lower())
+
+    def _edges(self, lines: List[str]) -> List[str]:
+        if len(lines) <= 2 * self.edge_lines:
+            return lines
+        return lines[:self.edge_lines] + lines[-self.edge_lines:]
+
+    def observe(self, page_text: str) -> None:
+        lines = [line for line in page_text.splitlines() if line.strip()]
+        self.counts.update({self._key(line) for line in self._edges(lines)})
+        self.pages += 1
+
+    def _threshold(self) -> int:
+        return max(self.min_repeats, math.ceil(self.pages * self.min_share))
+
+    def clean(self, page_text: str) -> str:
+        if self.pages < self.min_pages:
+            return page_text
+        lines = [line for line in page_text.splitlines() if line.strip()]
+        edges = set(range(min(self.edge_lines, len(lines)))) | set(range(max(len(lines) - self.edge_lines, 0), len(lines)))
+        threshold = self._threshold()
+        kept = [
+            line for i, line in enumerate(lines)
+            if i not in edges or self.counts[self._key(line)] < threshold
+        ]
+        return "\n".join(kept)
+
+
+def iter_pdf_pages(file_path: str, strip_boilerplate: bool = True, warmup_pages: int = 3,
+                   workers: int = 0) -> Iterator[str]:
+    """Stream cleaned page text.
+
+    The first warmup_pages are held back to learn repeated headers/footers
+    (keep it at least BoilerplateFilter's min_pages - 1 so short reports stay
+    whole); after that each page is yielded as soon as it is extracted.
+    """
+    pages = iter_raw_pages(file_path, workers=workers)
+    if not strip_boilerplate:
+        yield from pages
+        return
+
+    boilerplate = BoilerplateFilter()
+    held: deque = deque()
+    for page_text in pages:
+        boilerplate.observe(page_text)
+        held.append(page_text)
+        if len(held) > warmup_pages:
+            yield boilerplate.clean(held.popleft())
+    while held:
+        yield boilerplate.clean(held.popleft())
+
+
+def load_pdf_text(file_path: str, workers: int = 0) -> str:
+    return "\n\n".join(page for page in iter_pdf_pages(file_path, workers=workers) if page.strip())
@@ -0,0 +1,357 @@
+import asyncio
+import email.utils
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# ==================
+# 1. Configuration
+# ==================
+# Account limits shared by every session in the process
+REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_RPM", 500))
+TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TPM", 200000))
+# Concurrency starts here and adapts between the bounds (AIMD)
+INITIAL_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY_INITIAL", 8))
+MIN_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY_MIN", 1))
+MAX_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY_MAX", 32))
+# Back off when recent latency exceeds this multiple of the long-run baseline
+LATENCY_TOLERANCE = float(os.getenv("LLM_LATENCY_TOLERANCE", 2.0))
+# 429s retried here, after waiting, before the caller ever sees one
+MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", 5))
+# Completion budget assumed when a request doesn't set max_tokens
+DEFAULT_COMPLETION_TOKENS = 256
+
+
+# ==================
+# 2. Token buckets
+# ==================
+class TokenBucket:
+    """Refills continuously up to per_minute; amounts larger than that are capped to it"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate) if self.rate else 0.0
+
+    def take(self, amount: float) -> None:
+        self.level -= min(amount, self.capacity)
+
+    def sync(self, remaining: float) -> None:
+        """Trust the server's count when it says less is left than we think"""
+        self.level = min(self.level, remaining)
+
+
+# ==================
+# 3. Adaptive limiter
+# ==================
+class RateLimiter:
+    """Request/token buckets plus an AIMD concurrency limit, shared by every model call.
+
+    Callers queue in acquire() until a slot and enough budget are free, so
+    bursts wait instead of failing. Each release adds 1/limit to the
+    concurrency limit; a 429 halves it and pauses everyone for the
+    Retry-After time, and latency rising past LATENCY_TOLERANCE times its
+    baseline trims it by 10%.
+    """
+
+    def __init__(self, requests_per_minute: int = REQUESTS_PER_MINUTE, tokens_per_minute: int = TOKENS_PER_MINUTE,
+                 initial_concurrency: int = INITIAL_CONCURRENCY, min_concurrency: int = MIN_CONCURRENCY,
+                 max_concurrency: int = MAX_CONCURRENCY, latency_tolerance: float = LATENCY_TOLERANCE):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.limit = float(min(max(initial_concurrency, self.min_concurrency), self.max_concurrency))
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._fast_latency: Optional[float] = None
+        self._baseline_latency: Optional[float] = None
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self._stats = {"calls": 0, "queued": 0, "queue_depth": 0, "max_queue_depth": 0, "waited_seconds": 0.0,
+                       "max_wait_seconds": 0.0, "throttled": 0, "latency_backoffs": 0, "held_seconds": 0.0}
+
+    def _try_acquire(self, tokens: int) -> float:
+        """0 when the call may go now (budget taken), else seconds until it might"""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.in_flight >= int(self.limit):
+            return 0.25  # woken earlier by release()
+        wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+        if wait > 0:
+            return wait
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        self.in_flight += 1
+        return 0.0
+
+    def _queue(self, delta: int) -> None:
+        self._stats["queue_depth"] += delta
+        self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._stats["queue_depth"])
+
+    def _granted(self, queued: bool, started: float) -> float:
+        waited = time.monotonic() - started if queued else 0.0
+        self._stats["calls"] += 1
+        self._stats["queued"] += int(queued)
+        self._stats["waited_seconds"] += waited
+        self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], waited)
+        return waited
+
+    def acquire(self, tokens: int) -> None:
+        started = time.monotonic()
+        with self._cond:
+            wait = self._try_acquire(tokens)
+            queued = bool(wait)
+            if queued:
+                self._queue(1)
+                while wait:
+                    self._cond.wait(wait)
+                    wait = self._try_acquire(tokens)
+                self._queue(-1)
+            waited = self._granted(queued, started)
+        _record_wait(waited, self)
+
+    async def aacquire(self, tokens: int) -> None:
+        started = time.monotonic()
+        with self._cond:
+            wait = self._try_acquire(tokens)
+            queued = bool(wait)
+            if queued:
+                self._queue(1)
+        try:
+            while wait:
+                # Never block the event loop on the condition; poll instead
+                await asyncio.sleep(min(wait, 0.05))
+                with self._cond:
+                    wait = self._try_acquire(tokens)
+        finally:
+            # Also when the caller is cancelled while queued
+            if queued:
+                with self._cond:
+                    self._queue(-1)
+        with self._cond:
+            waited = self._granted(queued, started)
+        _record_wait(waited, self)
+
+    def release(self, latency: Optional[float] = None, throttled: bool = False, retry_after: float = 0.0,
+                headers: Optional[Any] = None, held: float = 0.0) -> None:
+        """Free a slot; latency (time to response headers) drives AIMD, held is only counted in stats"""
+        with self._cond:
+            self.in_flight -= 1
+            self._stats["held_seconds"] += held
+            now = time.monotonic()
+            if throttled:
+                self._stats["throttled"] += 1
+                self.limit = max(self.min_concurrency, self.limit / 2)
+                self.paused_until = max(self.paused_until, now + retry_after)
+            elif latency is not None:
+                self._observe_latency(latency, now)
+            if headers is not None:
+                self._sync_headers(headers)
+            self._cond.notify_all()
+
+    def cap(self, max_concurrency: int) -> None:
+        """Lower the concurrency ceiling, e.g. to a session engine's max_concurrent_llm"""
+        with self._cond:
+            self.max_concurrency = max(self.min_concurrency, min(self.max_concurrency, max_concurrency))
+            self.limit = min(self.limit, float(self.max_concurrency))
+
+    def _observe_latency(self, latency: float, now: float) -> None:
+        if self._baseline_latency is None:
+            self._fast_latency = self._baseline_latency = latency
+        self._fast_latency = 0.3 * latency + 0.7 * self._fast_latency
+        self._baseline_latency = 0.05 * latency + 0.95 * self._baseline_latency
+        if (self._fast_latency > self.latency_tolerance * self._baseline_latency
+                and now - self._last_decrease > self._fast_latency):
+            # At most one latency backoff per round trip
+            self.limit = max(self.min_concurrency, self.limit * 0.9)
+            self._last_decrease = now
+            self._stats["latency_backoffs"] += 1
+        else:
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+
+    def _sync_headers(self, headers: Any) -> None:
+        for header, bucket in (("x-ratelimit-remaining-requests", self.requests),
+                               ("x-ratelimit-remaining-tokens", self.tokens)):
+            try:
+                bucket.sync(float(headers[header]))
+            except (KeyError, TypeError, ValueError):
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update(concurrency_limit=int(self.limit), in_flight=self.in_flight)
+        stats["waited_seconds"] = round(stats["waited_seconds"], 3)
+        stats["max_wait_seconds"] = round(stats["max_wait_seconds"], 3)
+        stats["held_seconds"] = round(stats["held_seconds"], 3)
+        return stats
+
+
+def _record_wait(seconds: float, limiter: RateLimiter) -> None:
+    try:
+        from metrics import registry
+    except ImportError:  # metrics needs langchain_core; the limiter doesn't
+        return
+    registry.record_rate_limit(seconds, limiter._stats["queue_depth"], int(limiter.limit))
+
+
+limiter = RateLimiter()
+
+
+# ==================
+# 4. httpx transports
+# ==================
+def estimate_tokens(request) -> int:
+    """Prompt bytes / 4 plus the completion budget; refined by the server's remaining-token header"""
+    body = request.content or b""
+    completion = DEFAULT_COMPLETION_TOKENS
+    for key in (b'"max_tokens":', b'"max_completion_tokens":'):
+        at = body.find(key)
+        if at >= 0:
+            digits = body[at + len(key):at + len(key) + 12].strip().split(b",")[0].split(b"}")[0]
+            if digits.strip().isdigit():
+                completion = int(digits)
+    return max(1, len(body) // 4) + completion
+
+
+def _retry_after(response) -> float:
+    for header in ("retry-after-ms", "retry-after"):
+        value = response.headers.get(header)
+        if value is None:
+            continue
+        try:
+            seconds = float(value)
+            return seconds / 1000 if header == "retry-after-ms" else seconds
+        except ValueError:
+            parsed = email.utils.parsedate_to_datetime(value)
+            return max(0.0, parsed.timestamp() - time.time())
+    return 1.0
+
+
+def _limited(request) -> bool:
+    # Model calls only; connection prewarming and the like pass straight through
+    return request.method == "POST"
+
+
+def rate_limited_transport(kind: str, inner, rate_limiter: Optional[RateLimiter] = None,
+                           max_retries: int = MAX_RETRIES):
+    """httpx transport ("sync" or "async") that queues model calls through the shared limiter.
+
+    A call holds its slot until the response body is closed, so streamed
+    completions count against the concurrency limit for their whole length.
+    The latency fed to the limiter is the time to the response headers: the
+    full call grows with the completion length, which says nothing about load.
+    """
+    import httpx
+
+    rate_limiter = rate_limiter or limiter
+
+    def releasing(response, request, started: float):
+        """The response with a body that releases the slot once, when it is closed"""
+        released = threading.Event()
+        # inner transports return once the headers are in; the body is still to come
+        latency = time.monotonic() - started
+
+        def release():
+            if not released.is_set():
+                released.set()
+                rate_limiter.release(latency, throttled=response.status_code == 429, headers=response.headers,
+                                     held=time.monotonic() - started)
+
+        class ReleasingStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+            def __iter__(self):
+                yield from response.stream
+
+            async def __aiter__(self):
+                async for chunk in response.stream:
+                    yield chunk
+
+            def close(self):
+                try:
+                    response.stream.close()
+                finally:
+                    release()
+
+            async def aclose(self):
+                try:
+                    await response.stream.aclose()
+                finally:
+                    release()
+
+        return httpx.Response(response.status_code, headers=response.headers, stream=ReleasingStream(),
+                              extensions=response.extensions, request=request)
+
+    class RateLimitedTransport(httpx.BaseTransport):
+        def handle_request(self, request):
+            if not _limited(request):
+                return inner.handle_request(request)
+            request.read()
+            tokens = estimate_tokens(request)
+            for attempt in range(max_retries + 1):
+                rate_limiter.acquire(tokens)
+                started = time.monotonic()
+                try:
+                    response = inner.handle_request(request)
+                except BaseException:
+                    rate_limiter.release()
+                    raise
+                if response.status_code == 429 and attempt < max_retries:
+                    retry_after = _retry_after(response)
+                    response.close()
+                    rate_limiter.release(throttled=True, retry_after=retry_after)
+                    logger.info("429 from %s; retrying in %.1fs", request.url.host, retry_after)
+                    continue
+                return releasing(response, request, started)
+
+        def close(self):
+            inner.close()
+
+    class AsyncRateLimitedTransport(httpx.AsyncBaseTransport):
+        async def handle_async_request(self, request):
+            if not _limited(request):
+                return await inner.handle_async_request(request)
+            await request.aread()
+            tokens = estimate_tokens(request)
+            for attempt in range(max_retries + 1):
+                await rate_limiter.aacquire(tokens)
+                started = time.monotonic()
+                try:
+                    response = await inner.handle_async_request(request)
+                except BaseException:
+                    rate_limiter.release()
+                    raise
+                if response.status_code == 429 and attempt < max_retries:
+                    retry_after = _retry_after(response)
+                    await response.aclose()
+                    rate_limiter.release(throttled=True, retry_after=retry_after)
+                    logger.info("429 from %s; retrying in %.1fs", request.url.host, retry_after)
+                    continue
+                return releasing(response, request, started)
+
+        async def aclose(self):
+            await inner.aclose()
+
+    if kind == "sync":
+        return RateLimitedTransport()
+    return AsyncRateLimitedTransport()
+
+
+def stats() -> Dict[str, Any]:
+    return limiter.stats()
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+# ==================
+# 1. Configuration
+# ==================
+REPORT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR", ".report_cache")
+# Bounds on the in-process copy; the disk copy is unbounded and keyed by content
+REPORT_CACHE_MAX_ENTRIES = int(os.getenv("REPORT_CACHE_MAX_ENTRIES", 64))
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# Bump when extraction output changes so stale entries are ignored
+EXTRACTOR_VERSION = 3
+
+
+def file_digest(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# ==================
+# 2. Extraction cache
+# ==================
+class ExtractionCache:
+    """Extracted report text keyed by file content hash.
+
+    Lookups go memory LRU -> disk -> extractor, so a re-upload, retry or a
+    second agent reading the same report costs one hash instead of a parse.
+    """
+
+    def __init__(self, directory: str = REPORT_CACHE_DIR, max_entries: int = REPORT_CACHE_MAX_ENTRIES,
+                 max_bytes: int = REPORT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _remember(self, key: str, entry: Dict[str, Any]) -> None:
+        size = entry["metadata"]["chars"]
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._memory:
+                self._bytes -= self._memory.pop(key)["metadata"]["chars"]
+            self._memory[key] = entry
+            self._bytes += size
+            while len(self._memory) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._bytes -= evicted["metadata"]["chars"]
+
+    def lookup(self, digest: str) -> Optional[Dict[str, Any]]:
+        """Cached {"parts", "metadata"} for a content hash, or None"""
+        with self._lock:
+            entry = self._memory.get(digest)
+            if entry is not None:
+                self._memory.move_to_end(digest)
+                self.counters["memory_hits"] += 1
+                return entry
+        try:
+            with open(self._path(digest), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("metadata", {}).get("extractor_version") != EXTRACTOR_VERSION:
+            return None
+        with self._lock:
+            self.counters["disk_hits"] += 1
+        self._remember(digest, entry)
+        return entry
+
+    def store(self, digest: str, file_path: str, parts: List[str], extract_seconds: float = 0.0) -> Dict[str, Any]:
+        """Cache a report's extracted parts (pages or paragraphs) so readers can regroup them identically"""
+        entry = {
+            "parts": parts,
+            "metadata": {
+                "sha256": digest,
+                "source": os.path.basename(file_path),
+                "extension": os.path.splitext(file_path)[1].lower(),
+                "size_bytes": os.path.getsize(file_path),
+                "chars": sum(len(part) for part in parts),
+                "extract_seconds": round(extract_seconds, 4),
+                "extracted_at": time.time(),
+                "extractor_version": EXTRACTOR_VERSION,
+            },
+        }
+        path = self._path(digest)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Atomic replace so concurrent processes never read a partial entry
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass  # A read-only disk still gets the in-memory copy
+        self._remember(digest, entry)
+        return entry
+
+    def record_miss(self) -> None:
+        with self._lock:
+            self.counters["misses"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self.counters, "memory_entries": len(self._memory), "memory_bytes": self._bytes}
+
+
+_cache: Optional[ExtractionCache] = None
+
+
+def get_cache() -> ExtractionCache:
+    global _cache
+    if _cache is None:
+        _cache = ExtractionCache()
+    return _cache
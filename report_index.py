@@ -0,0 +1,122 @@
+import math
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+# ==================
+# 1. Configuration
+# ==================
+MAX_CHUNK_CHARS = int(os.getenv("REPORT_CHUNK_CHARS", 1200))
+REPORT_QA_TOP_K = int(os.getenv("REPORT_QA_TOP_K", 4))
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+# All-caps result values that look like headings but are cell contents
+_VALUE_WORDS = {"POSITIVE", "NEGATIVE", "NORMAL", "ABNORMAL", "HIGH", "LOW", "NIL", "ABSENT", "PRESENT",
+                "MALE", "FEMALE", "REACTIVE", "NON REACTIVE", "TEST NOT DONE", "NOT DONE"}
+_STOPWORDS = {"a", "an", "the", "is", "are", "was", "were", "am", "i", "my", "me", "do", "does", "did", "of",
+              "to", "in", "on", "for", "and", "or", "it", "this", "that", "what", "which", "how", "be", "have",
+              "has", "with", "at", "by", "from", "can", "you", "your", "report", "test"}
+
+CITATION_INSTRUCTION = "Answer only from the excerpts and cite the chunk ids you used, e.g. [C2]."
+
+
+def tokenize(text: str) -> List[str]:
+    # Plural folding is enough stemming for "mites" to match "MITE"
+    return [t[:-1] if len(t) > 3 and t.endswith("s") and not t.endswith("ss") else t
+            for t in re.findall(r"[a-z0-9]+", text.lower()) if t not in _STOPWORDS]
+
+
+# ==================
+# 2. Section-aware chunking
+# ==================
+def _is_heading(line: str) -> bool:
+    if len(line) > 60 or re.search(r"\d", line) or not re.search(r"[A-Za-z]{3}", line):
+        return False
+    if line.endswith(":") and ":" not in line[:-1]:
+        return True
+    return line == line.upper() and ":" not in line and line not in _VALUE_WORDS
+
+
+def split_sections(text: str) -> List[Tuple[str, List[str]]]:
+    """(heading, lines) pairs; text before the first heading goes under "General" """
+    sections: List[Tuple[str, List[str]]] = [("General", [])]
+    for raw in text.splitlines():
+        line = re.sub(r"\s+", " ", raw).strip()
+        if not line:
+            continue
+        if _is_heading(line):
+            sections.append((line.rstrip(":"), []))
+        else:
+            sections[-1][1].append(line)
+    return [(heading, lines) for heading, lines in sections if lines]
+
+
+def chunk_report(text: str, max_chars: int = MAX_CHUNK_CHARS) -> List[Dict[str, str]]:
+    """Chunks never cross a section boundary; long sections split on line boundaries"""
+    chunks = []
+    for heading, lines in split_sections(text):
+        current, size = [], 0
+        for line in lines:
+            if current and size + len(line) > max_chars:
+                chunks.append((heading, current))
+                current, size = [], 0
+            current.append(line)
+            size += len(line) + 1
+        if current:
+            chunks.append((heading, current))
+    return [
+        {"id": f"C{i}", "section": heading, "text": "\n".join(lines)}
+        for i, (heading, lines) in enumerate(chunks, 1)
+    ]
+
+
+# ==================
+# 3. BM25 index
+# ==================
+class ReportIndex:
+    """In-memory BM25 over one report's chunks"""
+
+    def __init__(self, chunks: List[Dict[str, str]]):
+        self.chunks = chunks
+        # Section names are indexed with the chunk so "dust mite" finds the HOUSE DUST MITE rows
+        self._terms = [Counter(tokenize(f"{c['section']} {c['text']}")) for c in chunks]
+        self._lengths = [sum(terms.values()) for terms in self._terms]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if chunks else 0.0
+        document_freq = Counter(term for terms in self._terms for term in terms)
+        n = len(chunks)
+        self._idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in document_freq.items()}
+
+    def search(self, query: str, k: int = REPORT_QA_TOP_K) -> List[Tuple[Dict[str, str], float]]:
+        """Top-k (chunk, score); falls back to the first chunks when nothing matches"""
+        query_terms = tokenize(query)
+        scored = []
+        for i, terms in enumerate(self._terms):
+            score = 0.0
+            for term in query_terms:
+                tf = terms.get(term, 0)
+                if tf:
+                    norm = K1 * (1 - B + B * self._lengths[i] / (self._avg_length or 1))
+                    score += self._idf[term] * tf * (K1 + 1) / (tf + norm)
+            if score > 0:
+                scored.append((self.chunks[i], score))
+        if not scored:
+            return [(chunk, 0.0) for chunk in self.chunks[:k]]
+        scored.sort(key=lambda hit: hit[1], reverse=True)
+        return scored[:k]
+
+    def context(self, query: str, k: int = REPORT_QA_TOP_K) -> str:
+        """Prompt-ready excerpts, each tagged with its chunk id for citation"""
+        return "\n\n".join(
+            f"[{chunk['id']}] ({chunk['section']})\n{chunk['text']}" for chunk, _ in self.search(query, k)
+        )
+
+
+@lru_cache(maxsize=32)
+def report_index(text: str) -> ReportIndex:
+    """Index for a report's text, built once per distinct report"""
+    return ReportIndex(chunk_report(text))
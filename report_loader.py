@@ -0,0 +1,81 @@
+import os
+import time
+from typing import Iterator, Optional
+
+from report_cache import file_digest, get_cache
+
+# ==================
+# Report text extraction
+# ==================
+SUPPORTED_EXTENSIONS = (".docx", ".pdf")
+
+# Roughly 3k tokens per analysis chunk
+DEFAULT_CHUNK_CHARS = 12000
+
+
+def _group_parts(parts, max_chars: float) -> Iterator[str]:
+    chunk = []
+    size = 0
+    for part in parts:
+        if chunk and size + len(part) > max_chars:
+            yield "\n\n".join(chunk)
+            chunk, size = [], 0
+        chunk.append(part)
+        size += len(part)
+    if chunk:
+        yield "\n\n".join(chunk)
+
+
+def _parse_report_parts(file_path: str, workers: int) -> Iterator[str]:
+    """Non-blank pages of a PDF, or paragraphs of a DOCX, in order"""
+    # Parsers load on the first cache miss, so cached reports never import them
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == ".docx":
+        from langchain_community.document_loaders import Docx2txtLoader
+        for doc in Docx2txtLoader(file_path).load():
+            for paragraph in doc.page_content.split("\n\n"):
+                if paragraph.strip():
+                    yield paragraph.strip("\n")
+    else:
+        from pdf_reader import iter_pdf_pages
+        for page in iter_pdf_pages(file_path, workers=workers):
+            if page.strip():
+                yield page
+
+
+def iter_report_chunks(file_path: str, max_chars: float = DEFAULT_CHUNK_CHARS, workers: int = 0,
+                       digest: Optional[str] = None) -> Iterator[str]:
+    """Yield report text in chunks as it is parsed.
+
+    PDF pages (DOCX paragraphs) are grouped up to max_chars as they are
+    parsed, so analysis of the first pages can start before the rest of the
+    file is parsed. Reports already extracted (same content hash) are served
+    from the extraction cache, which keeps the parts, so a hit yields the same
+    chunks as the first read.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension not in SUPPORTED_EXTENSIONS:
+        raise ValueError(f"Unsupported report format: {extension or file_path}")
+    cache = get_cache()
+    digest = digest or file_digest(file_path)
+    entry = cache.lookup(digest)
+    if entry is not None:
+        yield from _group_parts(entry["parts"], max_chars)
+        return
+
+    cache.record_miss()
+    started = time.perf_counter()
+    parts = []
+
+    def parsed():
+        for part in _parse_report_parts(file_path, workers):
+            parts.append(part)
+            yield part
+
+    yield from _group_parts(parsed(), max_chars)
+    cache.store(digest, file_path, parts, time.perf_counter() - started)
+
+
+def load_report_text(file_path: str, digest: Optional[str] = None) -> str:
+    """Extract plain text from a DOCX or PDF report"""
+    return "\n\n".join(iter_report_chunks(file_path, max_chars=float("inf"), digest=digest))
@@ -0,0 +1,130 @@
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# ==================
+# 1. Configuration
+# ==================
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", 1))
+
+# Typed at any patient prompt to hand a report over without leaving the interview
+_REPORT_COMMAND = re.compile(r"^\s*/report\s+(.+?)\s*$", re.I)
+
+
+def parse_report_command(text: str) -> Optional[str]:
+    """Report path from a "/report <path>" reply, else None"""
+    match = _REPORT_COMMAND.match(text or "")
+    return match.group(1).strip("\"'") if match else None
+
+
+def _file_version(path: str) -> Tuple[Optional[int], Optional[int]]:
+    """(mtime, size) of the file, so a report replaced at the same path is processed again"""
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None, None
+    return info.st_mtime_ns, info.st_size
+
+
+# ==================
+# 2. Background preprocessing
+# ==================
+class ReportPreprocessor:
+    """Runs report parsing and analysis on a background thread while the interview continues.
+
+    process(path) does the work; submit() starts it and result() collects it,
+    waiting only for whatever is still running. Submitting the same unchanged
+    file again reuses the run; a run that failed, or one for a file that has
+    since been replaced, is not reused. A job is forgotten once its result is
+    collected, so the table only holds reports still waiting to be used.
+    """
+
+    def __init__(self, process: Callable[[str], Any], max_workers: int = REPORT_WORKERS):
+        self.process = process
+        self.max_workers = max_workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Tuple[Tuple[Optional[int], Optional[int]], Future]] = {}
+        self._stats = {"submitted": 0, "ready_when_needed": 0, "waited_seconds": 0.0, "background_seconds": 0.0}
+
+    def _run(self, path: str) -> Any:
+        started = time.perf_counter()
+        try:
+            return self.process(path)
+        finally:
+            with self._lock:
+                self._stats["background_seconds"] += time.perf_counter() - started
+
+    @staticmethod
+    def _reusable(version: Tuple[Optional[int], Optional[int]], entry) -> bool:
+        if entry is None or entry[0] != version:
+            return False
+        job = entry[1]
+        return not (job.done() and (job.cancelled() or job.exception() is not None))
+
+    def submit(self, path: str) -> Future:
+        version = _file_version(path)
+        with self._lock:
+            entry = self._jobs.get(path)
+            if self._reusable(version, entry):
+                return entry[1]
+            if entry is not None:
+                entry[1].cancel()  # Stale: the file changed or the run failed
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="report")
+            job = self._pool.submit(self._run, path)
+            self._jobs[path] = (version, job)
+            self._stats["submitted"] += 1
+        return job
+
+    def submitted(self, path: str) -> bool:
+        return path in self._jobs
+
+    def result(self, path: str, timeout: Optional[float] = None) -> Any:
+        """The processed report, waiting for it if needed; None if it was never submitted.
+
+        None too if the file changed since it was submitted, so the caller
+        processes the current file. Errors from process() are re-raised here,
+        where the caller would have seen them had it processed the report inline.
+        """
+        with self._lock:
+            entry = self._jobs.get(path)
+        if entry is None:
+            return None
+        version, job = entry
+        if version != _file_version(path):
+            self._forget(path, job)
+            job.cancel()
+            return None
+        ready = job.done()
+        started = time.perf_counter()
+        try:
+            return job.result(timeout=timeout)
+        finally:
+            if job.done():  # Collected, value or error; a timed-out job stays for a later call
+                self._forget(path, job)
+            with self._lock:
+                self._stats["ready_when_needed"] += int(ready)
+                self._stats["waited_seconds"] += time.perf_counter() - started
+
+    def _forget(self, path: str, job: Future) -> None:
+        with self._lock:
+            if path in self._jobs and self._jobs[path][1] is job:
+                del self._jobs[path]
+
+    def stats(self) -> Dict[str, Any]:
+        """background_seconds minus waited_seconds is report work the patient never waited for"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["waited_seconds"] = round(stats["waited_seconds"], 3)
+        stats["background_seconds"] = round(stats["background_seconds"], 3)
+        return stats
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
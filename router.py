@@ -0,0 +1,54 @@
+from typing import Optional
+
+# ==================
+# Rule-based routing for the supervisor node
+# ==================
+VALID_ACTIONS = ["collect_symptoms", "process_report", "clarify_questions", "follow_up", "exit"]
+
+# Returned when the worker for this turn already ran and the graph should hand
+# control back to the patient without ending the consultation.
+AWAIT_INPUT = "await_input"
+
+
+def decide_next_action(state: dict) -> Optional[str]:
+    """Settle the obvious routing cases from state alone.
+
+    Returns None when the state is ambiguous and the LLM supervisor should decide.
+    """
+    user_input = state.get("user_input", "").strip()
+    symptoms_collected = state.get("symptoms_collected", False)
+    pending_questions = state.get("pending_questions") or []
+
+    # An uploaded report is always processed before anything else
+    if state.get("test_report"):
+        return "process_report"
+
+    # Nothing left from the patient this turn: wait for the next message
+    if not user_input:
+        return AWAIT_INPUT
+
+    if pending_questions:
+        return "clarify_questions"
+
+    if not symptoms_collected:
+        return "collect_symptoms"
+
+    # A processed report only makes exit possible; whether this message ends the
+    # consultation, needs a follow-up or asks for a report is the LLM's call
+    return None
+
+
+def route_after_supervisor(state: dict) -> str:
+    """Edge function for the supervisor's conditional edges"""
+    action = state["next_action"]
+    # Without a report attached the interface has to prompt for one first
+    if action == "process_report" and not state.get("test_report"):
+        return AWAIT_INPUT
+    return action
+
+
+def routing_counters(state: dict, used_llm: bool) -> dict:
+    """State update counting rule-based vs. LLM routing decisions for the session"""
+    if used_llm:
+        return {"routing_llm_calls": state.get("routing_llm_calls", 0) + 1}
+    return {"routing_llm_calls_saved": state.get("routing_llm_calls_saved", 0) + 1}
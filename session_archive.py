@@ -0,0 +1,253 @@
+import argparse
+import datetime
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# ==================
+# 1. Configuration
+# ==================
+SESSION_ARCHIVE_PATH = os.getenv("SESSION_ARCHIVE_PATH", "session_archive.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    source TEXT,
+    patient TEXT,
+    report_date TEXT,
+    urgency TEXT,
+    created_at REAL,
+    summary TEXT,
+    report_text TEXT,
+    verification TEXT
+);
+CREATE INDEX IF NOT EXISTS sessions_patient ON sessions (patient);
+CREATE INDEX IF NOT EXISTS sessions_report_date ON sessions (report_date);
+CREATE INDEX IF NOT EXISTS sessions_urgency ON sessions (urgency);
+CREATE VIRTUAL TABLE IF NOT EXISTS sessions_fts USING fts5 (
+    patient, summary, report_text, verification,
+    content = 'sessions', content_rowid = 'rowid',
+    tokenize = 'porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS sessions_fts_insert AFTER INSERT ON sessions BEGIN
+    INSERT INTO sessions_fts (rowid, patient, summary, report_text, verification)
+    VALUES (new.rowid, new.patient, new.summary, new.report_text, new.verification);
+END;
+CREATE TRIGGER IF NOT EXISTS sessions_fts_update AFTER UPDATE ON sessions BEGIN
+    INSERT INTO sessions_fts (sessions_fts, rowid, patient, summary, report_text, verification)
+    VALUES ('delete', old.rowid, old.patient, old.summary, old.report_text, old.verification);
+    INSERT INTO sessions_fts (rowid, patient, summary, report_text, verification)
+    VALUES (new.rowid, new.patient, new.summary, new.report_text, new.verification);
+END;
+CREATE TRIGGER IF NOT EXISTS sessions_fts_delete AFTER DELETE ON sessions BEGIN
+    INSERT INTO sessions_fts (sessions_fts, rowid, patient, summary, report_text, verification)
+    VALUES ('delete', old.rowid, old.patient, old.summary, old.report_text, old.verification);
+END;
+"""
+
+_COLUMNS = ("session_id", "source", "patient", "report_date", "urgency", "created_at", "summary",
+            "report_text", "verification")
+
+
+# ==================
+# 2. Field extraction (no LLM)
+# ==================
+def extract_patient(report_text: str) -> Optional[str]:
+    match = re.search(r"PATIENT\s+NAME\s*:\s*([^\n]+)", report_text or "", re.I)
+    if not match:
+        return None
+    return re.sub(r"\s+", " ", match.group(1)).strip().title() or None
+
+
+def extract_report_date(report_text: str) -> Optional[str]:
+    """First DATE: dd/mm/yyyy in the report, as ISO yyyy-mm-dd"""
+    match = re.search(r"DATE\s*:\s*(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})", report_text or "", re.I)
+    if not match:
+        return None
+    day, month, year = (int(g) for g in match.groups())
+    try:
+        return datetime.date(year, month, day).isoformat()
+    except ValueError:
+        return None
+
+
+def extract_urgency(summary: str) -> Optional[str]:
+    match = re.search(r"Urgency(?:\s+Level|\s+Assessment)?\W{0,6}(Low|Medium|Moderate|High)", summary or "", re.I)
+    if not match:
+        return None
+    level = match.group(1).lower()
+    return "medium" if level == "moderate" else level
+
+
+def _fts_query(text: str) -> str:
+    # Quote every term so patient wording can't hit FTS5 syntax (hyphens, colons, AND/OR)
+    return " ".join(f'"{term}"' for term in re.findall(r"\w+", text))
+
+
+def _patient_query(patient: str) -> str:
+    """FTS5 filter on the patient column: every name term, as a prefix ("asok" finds "Asokan")"""
+    terms = [f'"{term}"*' for term in re.findall(r"\w+", patient)]
+    return f"patient : ({' AND '.join(terms)})" if terms else ""
+
+
+def consultation_id(session_id: Optional[str] = None) -> str:
+    """Archive key for one finished consultation.
+
+    Session ids can be shared by many consultations (every --async terminal
+    session is "terminal"), so the finishing time is appended.
+    """
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    return f"{session_id or uuid.uuid4()}-{stamp}"
+
+
+# ==================
+# 3. Archive
+# ==================
+class SessionArchive:
+    """Completed sessions in SQLite: indexed fields plus an FTS5 index over the texts.
+
+    The FTS index is an external-content table keyed by the sessions rowid and
+    kept in step by triggers, so a write only touches its own index rows.
+    """
+
+    def __init__(self, path: str = SESSION_ARCHIVE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Archives from before the rowid-keyed index: rebuild it from the sessions table
+        legacy = "session_id" in [row[1] for row in self._conn.execute("PRAGMA table_info(sessions_fts)")]
+        if legacy:
+            self._conn.execute("DROP TABLE sessions_fts")
+        self._conn.executescript(SCHEMA)
+        if legacy:
+            with self._conn:
+                self._conn.execute("INSERT INTO sessions_fts (sessions_fts) VALUES ('rebuild')")
+
+    def add(self, session_id: str, summary: str, report_text: str = "", verification: Any = "",
+            source: str = "", patient: Optional[str] = None, report_date: Optional[str] = None,
+            urgency: Optional[str] = None) -> Dict[str, Any]:
+        """Insert or update one session; the triggers touch only its own index rows"""
+        if not isinstance(verification, str):
+            verification = json.dumps(verification, ensure_ascii=False)
+        row = {
+            "session_id": session_id,
+            "source": source,
+            "patient": patient or extract_patient(report_text),
+            "report_date": report_date or extract_report_date(report_text),
+            "urgency": (urgency or extract_urgency(summary) or "").lower() or None,
+            "created_at": time.time(),
+            "summary": summary,
+            "report_text": report_text,
+            "verification": verification,
+        }
+        # An upsert keeps the rowid, so the update trigger can find the old index rows
+        updates = ", ".join(f"{column} = excluded.{column}" for column in _COLUMNS[1:])
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT INTO sessions ({', '.join(_COLUMNS)}) VALUES ({', '.join(':' + c for c in _COLUMNS)}) "
+                f"ON CONFLICT (session_id) DO UPDATE SET {updates}", row
+            )
+        return row
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return dict(row) if row else None
+
+    def search(self, query: str = "", patient: Optional[str] = None, date_from: Optional[str] = None,
+               date_to: Optional[str] = None, urgency: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """Keyword search (ranked by bm25) narrowed by patient, ISO date range and urgency.
+
+        The patient filter goes through the FTS index (name-term prefixes), not a table scan.
+        """
+        clauses, params = [], []
+        if date_from:
+            clauses.append("s.report_date >= ?")
+            params.append(date_from)
+        if date_to:
+            clauses.append("s.report_date <= ?")
+            params.append(date_to)
+        if urgency:
+            clauses.append("s.urgency = ?")
+            params.append(urgency.lower())
+
+        columns = "s.session_id, s.source, s.patient, s.report_date, s.urgency, s.created_at"
+        keywords = _fts_query(query)
+        match = " AND ".join(part for part in (f"({keywords})" if keywords else "",
+                                               _patient_query(patient or "")) if part)
+        if match:
+            snippet = ("snippet(sessions_fts, -1, '[', ']', '...', 12)" if keywords
+                       else "substr(s.summary, 1, 120)")
+            sql = (f"SELECT {columns}, {snippet} AS snippet "
+                   "FROM sessions_fts JOIN sessions s ON s.rowid = sessions_fts.rowid "
+                   "WHERE sessions_fts MATCH ?")
+            params.insert(0, match)
+            order = "bm25(sessions_fts)" if keywords else "s.created_at DESC"
+        else:
+            sql = f"SELECT {columns}, substr(s.summary, 1, 120) AS snippet FROM sessions s WHERE 1 = 1"
+            order = "s.created_at DESC"
+        for clause in clauses:
+            sql += f" AND {clause}"
+        sql += f" ORDER BY {order} LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+_archive: Optional[SessionArchive] = None
+
+
+def get_archive() -> SessionArchive:
+    global _archive
+    if _archive is None:
+        _archive = SessionArchive()
+    return _archive
+
+
+def archive_session(session_id: str, summary: str, **fields) -> None:
+    """Record a finished session; archiving problems never break the consultation"""
+    try:
+        get_archive().add(session_id, summary, **fields)
+    except Exception as e:
+        logger.warning("Could not archive session %s: %s", session_id, e)
+
+
+# ==================
+# 4. CLI
+# ==================
+def main():
+    parser = argparse.ArgumentParser(description="Search archived consultations")
+    parser.add_argument("query", nargs="?", default="", help="keywords over summaries, reports and answers")
+    parser.add_argument("--patient")
+    parser.add_argument("--date-from", help="yyyy-mm-dd")
+    parser.add_argument("--date-to", help="yyyy-mm-dd")
+    parser.add_argument("--urgency", choices=["low", "medium", "high"])
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--show", metavar="SESSION_ID", help="print one archived summary")
+    args = parser.parse_args()
+
+    archive = get_archive()
+    if args.show:
+        session = archive.get(args.show)
+        print(session["summary"] if session else f"No archived session {args.show}")
+        return
+    for hit in archive.search(args.query, args.patient, args.date_from, args.date_to, args.urgency, args.limit):
+        print(f"{hit['session_id']}  {hit['patient'] or '-'}  {hit['report_date'] or '-'}  "
+              f"{hit['urgency'] or '-'}  {hit['snippet']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Protocol, Tuple
+
+from report_worker import parse_report_command
+
+REPORT_PROMPT = "[System] Please upload test report path:"
+REPORT_RECEIVED = "[System] Report received. It's being analysed while we continue."
+
+# ==================
+# 1. Transports
+# ==================
+class Transport(Protocol):
+    """Moves patient messages in and assistant messages out, for any number of sessions"""
+
+    def messages(self) -> AsyncIterator[Tuple[str, str]]:
+        """Yield (session_id, text) pairs until the transport shuts down"""
+        ...
+
+    async def send(self, session_id: str, text: str) -> None:
+        ...
+
+    async def close_session(self, session_id: str) -> None:
+        ...
+
+
+class TerminalTransport:
+    """Single patient on stdin/stdout, same prompts as chat_interface"""
+
+    def __init__(self, session_id: str = "terminal"):
+        self.session_id = session_id
+        self._closed = asyncio.Event()
+        self._ready = asyncio.Event()
+        self._prompt = "\nPatient: "
+
+    async def messages(self) -> AsyncIterator[Tuple[str, str]]:
+        self._ready.set()
+        while not self._closed.is_set():
+            text = await asyncio.to_thread(input, self._prompt)
+            self._ready.clear()
+            yield self.session_id, text
+            # Wait for the reply before prompting again
+            await self._ready.wait()
+
+    async def send(self, session_id: str, text: str) -> None:
+        if text == REPORT_PROMPT:
+            self._prompt = f"\n{text} "
+        else:
+            self._prompt = "\nPatient: "
+            print(f"\n{text}")
+        self._ready.set()
+
+    async def close_session(self, session_id: str) -> None:
+        self._closed.set()
+        self._ready.set()
+
+
+class QueueTransport:
+    """In-memory transport for many sessions; feed with put(), read replies from outbox"""
+
+    def __init__(self):
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.outbox: asyncio.Queue = asyncio.Queue()
+
+    async def put(self, session_id: str, text: str) -> None:
+        await self.inbox.put((session_id, text))
+
+    async def shutdown(self) -> None:
+        await self.inbox.put(None)
+
+    async def messages(self) -> AsyncIterator[Tuple[str, str]]:
+        while True:
+            item = await self.inbox.get()
+            if item is None:
+                return
+            yield item
+
+    async def send(self, session_id: str, text: str) -> None:
+        await self.outbox.put((session_id, text))
+
+    async def close_session(self, session_id: str) -> None:
+        await self.outbox.put((session_id, None))
+
+
+# ==================
+# 2. Session engine
+# ==================
+class SessionEngine:
+    """Runs many patient sessions of a compiled graph in one event loop.
+
+    max_concurrent_llm caps concurrent model calls, not sessions: it lowers
+    the shared rate limiter's concurrency ceiling, which every model request
+    queues through, and sizes the engine's thread pool that runs the graph's
+    sync nodes. With reports (a ReportPreprocessor), "/report <path>" starts
+    the report in the background and hands it over once symptoms are in, as
+    in chat_interface.
+    """
+
+    def __init__(self, graph, new_state: Callable[[], dict], transport: Transport,
+                 finalize: Optional[Callable[[dict, dict], str]] = None, max_concurrent_llm: int = 32,
+                 reports: Optional[Any] = None, limiter: Optional[Any] = None):
+        if limiter is None:
+            from rate_limiter import limiter
+        self.graph = graph
+        self.new_state = new_state
+        self.transport = transport
+        self.finalize = finalize
+        self.reports = reports
+        limiter.cap(max_concurrent_llm)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_llm, thread_name_prefix="session")
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        self._queued_reports: Dict[str, str] = {}
+        self.states: Dict[str, dict] = {}
+
+    async def run(self) -> None:
+        # Sync graph nodes (and the transports' blocking reads) run on the engine's pool
+        asyncio.get_running_loop().set_default_executor(self._executor)
+        async for session_id, text in self.transport.messages():
+            if session_id not in self._queues:
+                self._start_session(session_id)
+            await self._queues[session_id].put(text)
+        # Let in-flight sessions finish their queued turns
+        for queue in self._queues.values():
+            await queue.put(None)
+        await asyncio.gather(*self._workers.values(), return_exceptions=True)
+
+    def _start_session(self, session_id: str) -> None:
+        self.states[session_id] = self.new_state()
+        self._queues[session_id] = asyncio.Queue()
+        self._workers[session_id] = asyncio.create_task(self._session_worker(session_id))
+
+    async def _session_worker(self, session_id: str) -> None:
+        queue = self._queues[session_id]
+        while True:
+            text = await queue.get()
+            if text is None:
+                break
+            if await self._turn(session_id, text):
+                break
+        self._queues.pop(session_id, None)
+        self._workers.pop(session_id, None)
+        self._queued_reports.pop(session_id, None)
+        self.states.pop(session_id, None)
+        await self.transport.close_session(session_id)
+
+    async def _turn(self, session_id: str, text: str) -> bool:
+        """Handle one patient message; returns True when the session is finished"""
+        state = self.states[session_id]
+        report_path = parse_report_command(text) if self.reports is not None else None
+        if report_path:
+            # Parsed and analysed on the worker thread while the interview carries on
+            self.reports.submit(report_path)
+            self._queued_reports[session_id] = report_path
+            if not (state["symptoms_collected"] or state["next_action"] == "process_report"):
+                await self.transport.send(session_id, REPORT_RECEIVED)
+        elif state["next_action"] == "process_report":
+            if await self._step(session_id, test_report=text, user_input="[REPORT_UPLOADED]"):
+                return True
+        elif await self._step(session_id, user_input=text):
+            return True
+
+        # A queued report goes in once symptoms are collected, or as soon as the graph asks for one
+        while session_id in self._queued_reports and (
+                state["symptoms_collected"] or state["next_action"] == "process_report"):
+            report_path = self._queued_reports.pop(session_id)
+            if await self._step(session_id, test_report=report_path, user_input="[REPORT_UPLOADED]"):
+                return True
+        return False
+
+    async def _step(self, session_id: str, **turn) -> bool:
+        """Run the graph once and send its reply; returns True when the session is finished"""
+        state = self.states[session_id]
+        state.update(turn)
+        config = {"metadata": {"session_id": session_id}}
+        try:
+            result = await self.graph.ainvoke(state, config=config)
+        except Exception as e:
+            state["next_action"] = "supervisor"
+            await self.transport.send(session_id, f"Error in conversation: {str(e)}")
+            return False
+        state.update(result)
+
+        if state.get("next_action") == "exit":
+            if self.finalize is not None:
+                summary = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self.finalize, state, config)
+                await self.transport.send(session_id, f"Consultation Summary for Doctor:\n{summary}")
+            return True
+
+        if state["next_action"] == "process_report" and not state.get("test_report"):
+            if session_id not in self._queued_reports:
+                await self.transport.send(session_id, REPORT_PROMPT)
+        elif state["conversation_history"]:
+            reply = state["conversation_history"][-1].split("Assistant: ")[-1]
+            await self.transport.send(session_id, f"Assistant: {reply}")
+        return False
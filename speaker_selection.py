@@ -0,0 +1,97 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+# ==================
+# Phase-aware speaker selection for the AutoGen GroupChat
+# ==================
+# Interview phases run agent/patient turns until the agent writes SUMMARY:;
+# single phases end after one message from their agent.
+INTERVIEW = "interview"
+SINGLE = "single"
+SUMMARY_MARKER = "SUMMARY:"
+REPORT_MARKER = "DOCUMENT_UPLOAD:"
+
+# (phase, agent name, kind, needs a report)
+DEFAULT_PHASES = [
+    ("symptoms", "Symptom_Collector", INTERVIEW, False),
+    ("report", "Report_Analyzer", SINGLE, True),
+    ("verification", "Symptom_Verifier", INTERVIEW, True),
+    ("liaison", "Doctor_Liaison", SINGLE, False),
+]
+
+
+def _content(message: dict) -> str:
+    return str(message.get("content") or "")
+
+
+class PhaseSpeakerSelector:
+    """speaker_selection_method for a GroupChat whose flow is a fixed order of phases.
+
+    The phase is re-derived from the chat messages on every call, so it works
+    on the copy of the GroupChat the manager runs. Returns "auto" (one LLM
+    selection call) only when the state is ambiguous, and None to end the
+    chat when the next phase needs a report that hasn't arrived yet or every
+    phase is done.
+    """
+
+    def __init__(self, patient_name: str = "Patient_Proxy", phases: List[Tuple[str, str, str, bool]] = None,
+                 report_available: Optional[Callable[[], bool]] = None):
+        self.patient_name = patient_name
+        self.phases = phases or DEFAULT_PHASES
+        self.report_available = report_available or (lambda: False)
+        self.counts = {"rule": 0, "llm": 0}
+
+    def current_phase(self, messages: List[dict]) -> int:
+        """Index of the first phase not yet completed"""
+        index = 0
+        for message in messages:
+            if index >= len(self.phases):
+                break
+            _, agent_name, kind, _ = self.phases[index]
+            if message.get("name") == agent_name and (kind == SINGLE or SUMMARY_MARKER in _content(message)):
+                index += 1
+        return index
+
+    def _has_report(self, messages: List[dict]) -> bool:
+        return self.report_available() or any(REPORT_MARKER in _content(m) for m in messages)
+
+    def decide(self, last_speaker_name: str, messages: List[dict]) -> Optional[str]:
+        """Name of the next speaker, "auto" when ambiguous, or None to end the chat"""
+        index = self.current_phase(messages)
+        phase_agents = [phase[1] for phase in self.phases]
+        previous_index = phase_agents.index(last_speaker_name) if last_speaker_name in phase_agents else None
+        skipped = False
+        if index < len(self.phases) and self.phases[index][3] and not self._has_report(messages):
+            if previous_index == index - 1:
+                # The previous phase just closed and the report is asked for after the chat
+                return None
+            # The chat went on without a report: continue with the phases that don't need one
+            while index < len(self.phases) and self.phases[index][3]:
+                index += 1
+            skipped = True
+        if index >= len(self.phases):
+            return None
+        _, agent_name, kind, _ = self.phases[index]
+
+        if last_speaker_name == self.patient_name:
+            last_text = _content(messages[-1]).strip() if messages else ""
+            # The patient asked something rather than answering: any agent may be the right one
+            return "auto" if last_text.endswith("?") else agent_name
+        if not skipped and previous_index == index and kind == INTERVIEW:
+            return self.patient_name
+        if not skipped and previous_index == index - 1:
+            # The last speaker just closed its phase; the next phase's agent opens
+            return agent_name
+        # An agent spoke out of order
+        return "auto"
+
+    def __call__(self, last_speaker, groupchat):
+        choice = self.decide(last_speaker.name, groupchat.messages)
+        if choice == "auto":
+            self.counts["llm"] += 1
+            return "auto"
+        self.counts["rule"] += 1
+        return None if choice is None else groupchat.agent_by_name(choice)
+
+    def stats(self) -> Dict[str, int]:
+        """Every rule-based choice is one speaker-selection LLM call avoided"""
+        return {"selection_llm_calls_avoided": self.counts["rule"], "selection_llm_calls": self.counts["llm"]}
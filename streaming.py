@@ -0,0 +1,58 @@
+import sys
+from typing import Callable, Iterable, Optional, Tuple
+
+# ==================
+# Token streaming for patient-facing replies
+# ==================
+# Only these nodes talk to the patient; supervisor routing and report analysis stay hidden
+PATIENT_FACING_NODES = ("collect_symptoms", "follow_up")
+
+# Tag for LLM calls inside patient-facing nodes that must not be shown (e.g. memory summaries)
+NOSTREAM_TAG = "nostream"
+# Custom stream event carrying a reply that was held back (NOSTREAM_TAG) until it was accepted
+ACCEPTED_REPLY = "accepted_reply"
+
+
+def emit_accepted_reply(text: str, node: str) -> None:
+    """Show a held-back reply now that it is final; a no-op outside a streamed graph run"""
+    try:
+        from langgraph.config import get_stream_writer
+        writer = get_stream_writer()
+    except (ImportError, RuntimeError, KeyError):
+        return
+    writer({ACCEPTED_REPLY: text, "langgraph_node": node})
+
+
+def stream_turn(graph, state: dict, config: Optional[dict] = None,
+                nodes: Iterable[str] = PATIENT_FACING_NODES,
+                write: Callable[[str], object] = sys.stdout.write) -> Tuple[dict, bool]:
+    """Run one graph turn, writing the assistant's reply token by token.
+
+    Returns the final state and whether anything was streamed, so the caller
+    can fall back to printing the last message (e.g. for cached replies).
+    """
+    result = state
+    streamed = False
+    for mode, payload in graph.stream(state, config=config, stream_mode=["messages", "values", "custom"]):
+        if mode == "values":
+            result = payload
+            continue
+        if mode == "custom":
+            if not isinstance(payload, dict) or ACCEPTED_REPLY not in payload:
+                continue
+            node, text = payload["langgraph_node"], payload[ACCEPTED_REPLY]
+        else:
+            chunk, metadata = payload
+            if NOSTREAM_TAG in (metadata.get("tags") or []):
+                continue
+            node, text = metadata.get("langgraph_node"), chunk.content
+        if node not in nodes or not text:
+            continue
+        if not streamed:
+            write("\nAssistant: ")
+            streamed = True
+        write(text)
+        sys.stdout.flush()
+    if streamed:
+        write("\n")
+    return result, streamed
@@ -0,0 +1,285 @@
+import json
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# ==================
+# 1. Schemas
+# ==================
+# Re-asks after a reply that can't be repaired; 0 keeps every structured call to one round trip
+STRUCTURED_RETRIES = int(os.getenv("STRUCTURED_OUTPUT_RETRIES", 0))
+
+# A small JSON-schema subset: object/array/string, required, enum, minItems, maxItems.
+# "examples" is what the prompt shows the model.
+QUESTIONS_SCHEMA = {
+    "type": "object",
+    "properties": {"questions": {"type": "array", "items": {"type": "string"}, "minItems": 1}},
+    "required": ["questions"],
+    "examples": [{"questions": ["<question>", "<question>"]}],
+}
+
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "key_findings": {"type": "array", "items": {"type": "string"}, "minItems": 1},
+        "recommendations": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["summary", "key_findings", "recommendations"],
+    "examples": [{"summary": "<2-3 sentences>", "key_findings": ["<finding>"],
+                  "recommendations": ["<recommendation>"]}],
+}
+
+# Batched analysis of the patient's answers (see clarification.analyze_answers)
+ANSWERS_SCHEMA = {
+    "type": "object",
+    "properties": {"answers": {"type": "array", "minItems": 1, "items": {
+        "type": "object",
+        "properties": {"question": {}, "answer": {"type": "string"}, "analysis": {"type": "string"}},
+        "required": ["analysis"],
+    }}},
+    "required": ["answers"],
+    "examples": [{"answers": [{"question": "<number>", "answer": "<patient's answer>", "analysis": "<1 sentence>"}]}],
+}
+
+
+def routing_schema(actions: List[str]) -> Dict[str, Any]:
+    return {
+        "type": "object",
+        "properties": {"action": {"type": "string", "enum": list(actions)}},
+        "required": ["action"],
+        "examples": [{"action": " | ".join(actions)}],
+    }
+
+
+def schema_instruction(schema: Dict[str, Any]) -> str:
+    """Prompt text asking for JSON that matches the schema"""
+    example = schema.get("examples", [schema])[0]
+    return "Respond with JSON only, no prose or code fences, in exactly this shape:\n" + json.dumps(example)
+
+
+# ==================
+# 2. Counters
+# ==================
+_lock = threading.Lock()
+_stats = {"parsed": 0, "repaired": 0, "parse_failures": 0, "retries": 0}
+
+
+def _count(key: str) -> None:
+    with _lock:
+        _stats[key] += 1
+
+
+def count_retry() -> None:
+    _count("retries")
+
+
+def stats() -> Dict[str, int]:
+    """parsed: valid JSON first time; repaired: fixed locally; parse_failures: unusable"""
+    with _lock:
+        return dict(_stats)
+
+
+# ==================
+# 3. Validation
+# ==================
+# A list marker is followed by whitespace, so "-1.5 T-score" and "2.5x ULN" keep their numbers
+_LIST_PREFIX = re.compile(r"^\s*(?:[-*•]|\(?\d+[.):]|q\d+[.):]?)(?:\s+|$)", re.I)
+
+
+def _clean_item(text: str) -> str:
+    """A plain-text list line without its bullet or number; JSON string values never go through this"""
+    return _LIST_PREFIX.sub("", str(text)).replace("**", "").strip().strip('"').strip()
+
+
+def _validate(value: Any, schema: Dict[str, Any]) -> Any:
+    """The value coerced to the schema (a list from a bulleted string block); ValueError if impossible"""
+    kind = schema.get("type")
+    if kind == "object":
+        if not isinstance(value, dict):
+            raise ValueError("expected an object")
+        result = {}
+        for key, sub in schema.get("properties", {}).items():
+            if key in value:
+                result[key] = _validate(value[key], sub)
+            elif key in schema.get("required", []):
+                raise ValueError(f"missing {key!r}")
+        return result
+    if kind == "array":
+        if isinstance(value, str):
+            # A bulleted/numbered block where a list belongs
+            value = [_clean_item(line) for line in value.splitlines() if line.strip()]
+        if not isinstance(value, list):
+            raise ValueError("expected an array")
+        items = []
+        for item in value:
+            try:
+                item = _validate(item, schema.get("items", {}))
+            except ValueError:
+                continue  # One bad entry doesn't sink the rest; minItems decides
+            if item not in ("", None) and item not in items:
+                items.append(item)
+        if len(items) < schema.get("minItems", 0):
+            raise ValueError(f"expected at least {schema['minItems']} items")
+        return items[:schema["maxItems"]] if "maxItems" in schema else items
+    if kind == "string":
+        if isinstance(value, (dict, list)):
+            raise ValueError("expected a string")
+        text = str(value).strip() if value is not None else ""
+        enum = schema.get("enum")
+        if enum is not None:
+            match = next((option for option in enum if option == text.lower()), None)
+            if match is None:
+                raise ValueError(f"{text!r} not one of {enum}")
+            return match
+        return text
+    return value
+
+
+# ==================
+# 4. Parsing and local repair
+# ==================
+def _json_candidates(text: str) -> List[str]:
+    text = re.sub(r"```(?:json)?", "", text)
+    start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+    if start < 0:
+        return []
+    body = text[start:]
+    end = max(body.rfind("}"), body.rfind("]"))
+    body = body[:end + 1] if end >= 0 else body
+    repaired = body
+    if "'" in repaired and '"' not in repaired:
+        repaired = repaired.replace("'", '"')
+    # Close what a truncated reply left open: a string, then brackets
+    outside_strings = re.sub(r'"(?:\\.|[^"\\])*"', "", repaired)
+    if '"' in outside_strings:
+        repaired += '"'
+    closers = []
+    for char in outside_strings:
+        if char in "{[":
+            closers.append("}" if char == "{" else "]")
+        elif char in "}]" and closers:
+            closers.pop()
+    repaired += "".join(reversed(closers))
+    repaired = re.sub(r",\s*([}\]])", r"\1", repaired)  # trailing commas
+    return [body] if repaired == body else [body, repaired]
+
+
+def _from_text(text: str, schema: Dict[str, Any]) -> Any:
+    """Best-effort object from a plain-text reply in the format older prompts asked for"""
+    properties = schema.get("properties", {})
+    if "questions" in properties:
+        questions = []
+        for line in text.splitlines():
+            listed = bool(_LIST_PREFIX.match(line))
+            item = _clean_item(line)
+            # Numbered/bulleted lines and bare questions count; headers and blank lines don't
+            if item and (item.endswith("?") or (listed and not item.endswith(":"))):
+                questions.append(item)
+        return {"questions": questions} if questions else None
+    if "action" in properties:
+        # The first action the reply names
+        found = [(match.start(), action) for action in properties["action"]["enum"]
+                 for match in [re.search(rf"\b{re.escape(action)}\b", text.lower())] if match]
+        return {"action": min(found)[1]} if found else None
+    if "key_findings" in properties:
+        sections = {"summary": [], "key_findings": [], "recommendations": []}
+        current = "summary"
+        for line in text.splitlines():
+            header = line.strip().lower().rstrip(":")
+            if header.startswith("key findings"):
+                current = "key_findings"
+                continue
+            if header.startswith("recommendation"):
+                current = "recommendations"
+                continue
+            line = re.sub(r"^\s*report summary:\s*", "", line, flags=re.I)
+            if line.strip():
+                sections[current].append(line if current == "summary" else _clean_item(line))
+        if not sections["summary"] and not sections["key_findings"]:
+            return None
+        return {"summary": " ".join(s.strip() for s in sections["summary"]),
+                "key_findings": sections["key_findings"], "recommendations": sections["recommendations"]}
+    return None
+
+
+def _unwrapped(value: Any, schema: Dict[str, Any]) -> Any:
+    """A bare array where the schema wants an object around its one required array"""
+    required = schema.get("required", [])
+    if (isinstance(value, list) and schema.get("type") == "object" and len(required) == 1
+            and schema.get("properties", {}).get(required[0], {}).get("type") == "array"):
+        return {required[0]: value}
+    return value
+
+
+def _parse(text: Any, schema: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], str]:
+    if isinstance(text, dict):
+        text = text.get("content") or ""
+    text = str(text or "")
+    for attempt, candidate in enumerate(_json_candidates(text)):
+        try:
+            raw = json.loads(candidate)
+            value = _validate(_unwrapped(raw, schema), schema)
+        except ValueError:  # JSONDecodeError is a ValueError
+            continue
+        exact = attempt == 0 and candidate.strip() == text.strip() and not isinstance(raw, list)
+        return value, "parsed" if exact else "repaired"
+    try:
+        value = _from_text(text, schema)
+        if value is not None:
+            value = _validate(value, schema)
+    except ValueError:
+        value = None
+    return value, "repaired" if value is not None else "parse_failures"
+
+
+def parse_structured(text: Any, schema: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Validated object from a model reply, repaired locally; None (and a counted failure) if unusable.
+
+    Tries the JSON as sent, then with common damage fixed (code fences,
+    trailing commas, single quotes, truncation, a bare array), then the plain-text format
+    the prompts used before, so a malformed reply never costs another call.
+    """
+    value, outcome = _parse(text, schema)
+    _count(outcome)
+    return value
+
+
+def is_valid(text: Any, schema: Dict[str, Any]) -> bool:
+    """Whether parse_structured would succeed, without touching the counters"""
+    return _parse(text, schema)[0] is not None
+
+
+def request_structured(ask: Callable[[], Any], schema: Dict[str, Any],
+                       retries: int = STRUCTURED_RETRIES) -> Optional[Dict[str, Any]]:
+    """Call ask() for a reply and parse it, re-asking at most retries times"""
+    value = parse_structured(ask(), schema)
+    while value is None and retries > 0:
+        retries -= 1
+        count_retry()
+        value = parse_structured(ask(), schema)
+    return value
+
+
+def parse_questions(text: Any, limit: Optional[int] = None) -> List[str]:
+    value = parse_structured(text, QUESTIONS_SCHEMA)
+    questions = value["questions"] if value else []
+    return questions[:limit] if limit is not None else questions
+
+
+def parse_analysis(text: Any) -> Optional[Dict[str, Any]]:
+    return parse_structured(text, ANALYSIS_SCHEMA)
+
+
+def parse_action(text: Any, actions: List[str]) -> Optional[str]:
+    value = parse_structured(text, routing_schema(actions))
+    return value["action"] if value else None
+
+
+def format_analysis(analysis: Dict[str, Any]) -> str:
+    """The analysis in the layout patients and doctors already see"""
+    findings = "\n".join(f"- {f}" for f in analysis["key_findings"])
+    recommendations = "\n".join(f"- {r}" for r in analysis["recommendations"])
+    return (f"Report Summary: {analysis['summary']}\n\nKey Findings:\n{findings}"
+            f"\n\nRecommendations:\n{recommendations}")
@@ -0,0 +1,182 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# ==================
+# 1. Configuration
+# ==================
+TASK_WORKERS = int(os.getenv("TASK_WORKERS", 4))
+
+
+# ==================
+# 2. Dependency-graph executor
+# ==================
+class TaskGraph:
+    """Runs named tasks on a thread pool, each as soon as the tasks it depends on finish.
+
+    A task's function receives its dependencies' results as keyword arguments
+    named after them. Values (add_value) are known up front; inputs
+    (add_input) are supplied later from the calling thread, e.g. patient
+    answers. A failed task fails every task that depends on it. cancel()
+    drops a graph that is no longer needed.
+    """
+
+    def __init__(self, max_workers: int = TASK_WORKERS):
+        self.max_workers = max_workers
+        self._tasks: Dict[str, Callable[..., Any]] = {}
+        self._deps: Dict[str, List[str]] = {}
+        self._futures: Dict[str, Future] = {}
+        self._timings: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+        self._waiting: Dict[str, set] = {}
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._started_at = 0.0
+        self._cancelled = False
+
+    def add(self, name: str, fn: Callable[..., Any], deps: Iterable[str] = ()) -> "TaskGraph":
+        self._check_new(name)
+        self._tasks[name] = fn
+        self._deps[name] = list(deps)
+        self._futures[name] = Future()
+        return self
+
+    def add_value(self, name: str, value: Any) -> "TaskGraph":
+        self._check_new(name)
+        self._futures[name] = Future()
+        self._futures[name].set_result(value)
+        return self
+
+    def add_input(self, name: str) -> "TaskGraph":
+        """A value set later with set_input; tasks that need it wait for it"""
+        self._check_new(name)
+        self._futures[name] = Future()
+        self._futures[name].add_done_callback(lambda _, name=name: self._finished(name))
+        return self
+
+    def set_input(self, name: str, value: Any) -> None:
+        if not self._cancelled:
+            self._futures[name].set_result(value)
+
+    def _check_new(self, name: str) -> None:
+        if self._pool is not None:
+            raise RuntimeError("TaskGraph already started")
+        if name in self._futures:
+            raise ValueError(f"Duplicate task {name!r}")
+
+    def _check_acyclic(self) -> None:
+        state: Dict[str, int] = {}  # 1 visiting, 2 done
+
+        def visit(name: str, path: List[str]) -> None:
+            if state.get(name) == 2:
+                return
+            if state.get(name) == 1:
+                raise ValueError(f"Dependency cycle: {' -> '.join(path + [name])}")
+            state[name] = 1
+            for dep in self._deps.get(name, []):
+                if dep not in self._futures:
+                    raise ValueError(f"Task {name!r} depends on unknown {dep!r}")
+                visit(dep, path + [name])
+            state[name] = 2
+
+        for name in self._tasks:
+            visit(name, [])
+
+    # ==================
+    # 3. Scheduling
+    # ==================
+    def start(self) -> "TaskGraph":
+        self._check_acyclic()
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="task")
+        self._started_at = time.perf_counter()
+        with self._lock:
+            self._waiting = {name: {d for d in deps if not self._futures[d].done()} for name, deps in self._deps.items()}
+            ready = [name for name, waiting in self._waiting.items() if not waiting]
+        for name in ready:
+            self._submit(name)
+        return self
+
+    def _submit(self, name: str) -> None:
+        if self._cancelled:
+            return
+        deps = self._deps[name]
+        failed = next((self._futures[d] for d in deps if self._futures[d].exception() is not None), None)
+        if failed is not None:
+            self._futures[name].set_exception(failed.exception())
+            self._finished(name)
+            return
+        kwargs = {d: self._futures[d].result() for d in deps}
+        try:
+            self._pool.submit(self._run, name, kwargs)
+        except RuntimeError:  # Pool shut down by a concurrent cancel()
+            self._futures[name].cancel()
+
+    def _run(self, name: str, kwargs: Dict[str, Any]) -> None:
+        future = self._futures[name]
+        if not future.set_running_or_notify_cancel():
+            return
+        started = time.perf_counter()
+        try:
+            result = self._tasks[name](**kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        finally:
+            self._timings[name] = [started - self._started_at, time.perf_counter() - self._started_at]
+        self._finished(name)
+
+    def _finished(self, name: str) -> None:
+        with self._lock:
+            ready = []
+            for task, waiting in self._waiting.items():
+                if name in waiting:
+                    waiting.discard(name)
+                    if not waiting:
+                        ready.append(task)
+        for task in ready:
+            self._submit(task)
+
+    # ==================
+    # 4. Results
+    # ==================
+    def future(self, name: str) -> Future:
+        return self._futures[name]
+
+    def result(self, name: str, timeout: Optional[float] = None) -> Any:
+        return self._futures[name].result(timeout=timeout)
+
+    def run(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Start (if needed) and wait for every task; inputs must be set by other threads"""
+        if self._pool is None:
+            self.start()
+        return {name: self.result(name, timeout) for name in self._futures}
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-task seconds, their serial sum, and the wall time the graph actually took"""
+        timings = dict(self._timings)
+        seconds = {name: round(end - start, 3) for name, (start, end) in timings.items()}
+        return {
+            "tasks": seconds,
+            "serial_seconds": round(sum(seconds.values()), 3),
+            "wall_seconds": round(max((end for _, end in timings.values()), default=0.0), 3),
+        }
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+
+    def cancel(self) -> None:
+        """Stop the graph: tasks not yet running never start (their futures are cancelled).
+
+        A task already running can't be interrupted; it finishes, but
+        nothing that depends on it is started.
+        """
+        with self._lock:
+            self._cancelled = True
+            self._waiting.clear()
+        for future in self._futures.values():
+            future.cancel()  # No-op for running and finished tasks
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,45 @@
+from agent_context import CONTEXT_POLICIES, RoleContext
+from conversation_memory import count_tokens
+
+
+def _role(name):
+    return RoleContext(name, **CONTEXT_POLICIES[name])
+
+
+def _interview(rounds):
+    messages = []
+    for n in range(rounds):
+        messages.append({"name": "Symptom_Collector", "role": "user",
+                         "content": f"Question {n}: how is the cough today?"})
+        messages.append({"name": "Patient_Proxy", "role": "user", "content": f"Answer {n}: " + "still coughing " * 10})
+    return messages
+
+
+def test_report_analyzer_sees_the_summary_and_report_not_the_interview():
+    chat = _interview(5) + [
+        {"name": "Symptom_Collector", "role": "user", "content": "SUMMARY: dry cough for two weeks"},
+        {"name": "Patient_Proxy", "role": "user", "content": "DOCUMENT_UPLOAD: Eosinophils 9% (high)"},
+        {"name": "Patient_Proxy", "role": "user", "content": "Please look at my report"},
+    ]
+    transformed = _role("Report_Analyzer").apply_transform(chat)
+    assert transformed[0]["content"] == ("Symptom summary:\ndry cough for two weeks\n\n"
+                                         "Test report:\nEosinophils 9% (high)")
+    assert transformed[-1] == chat[-1]
+    assert not any("Question" in message["content"] for message in transformed)
+
+
+def test_long_interviews_stop_growing_the_prompt():
+    collector = _role("Symptom_Collector")
+    sizes = []
+    for rounds in (60, 120):
+        transformed = collector.apply_transform(_interview(rounds))
+        assert transformed[0]["content"].startswith("Earlier turns (condensed):")
+        assert len(transformed) == CONTEXT_POLICIES["Symptom_Collector"]["keep_last"] + 1
+        sizes.append(sum(count_tokens(message["content"]) for message in transformed))
+    assert abs(sizes[1] - sizes[0]) < 20
+    assert collector.stats["tokens_after"] < collector.stats["tokens_before"] / 5
+
+
+def test_direct_prompts_pass_through():
+    prompt = [{"role": "user", "content": "Analyze this report"}]
+    assert _role("Report_Analyzer").apply_transform(prompt) is prompt
@@ -0,0 +1,33 @@
+import asyncio
+import hashlib
+import json
+
+from batch_ingest import find_reports, load_completed, run_batch
+
+
+def test_torn_last_line_is_not_counted_as_done(tmp_path):
+    output = tmp_path / "results.jsonl"
+    output.write_text(json.dumps({"path": "a.docx", "sha256": "1", "status": "ok"}) + "\n"
+                      + json.dumps({"path": "b.docx", "sha256": "2", "status": "error"}) + "\n"
+                      + '{"path": "c.docx", "sha2')
+    assert load_completed(str(output)) == {"a.docx": "1"}
+
+
+def test_rerun_skips_unchanged_reports_and_records_failures(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "offline-test")
+    reports = tmp_path / "reports"
+    reports.mkdir()
+    (reports / "done.docx").write_bytes(b"analysed last run")
+    (reports / "broken.docx").write_bytes(b"not a zip archive")
+    (reports / "~$done.docx").write_bytes(b"Word lock file")
+    (reports / "notes.txt").write_text("not a report")
+    assert [path.rsplit("/", 1)[-1] for path in find_reports(str(reports))] == ["broken.docx", "done.docx"]
+
+    output = tmp_path / "results.jsonl"
+    digest = hashlib.sha256(b"analysed last run").hexdigest()
+    output.write_text(json.dumps({"path": str(reports / "done.docx"), "sha256": digest, "status": "ok"}) + "\n")
+    counts = asyncio.run(run_batch(str(reports), str(output), workers=1))
+    assert counts == {"ok": 0, "error": 1, "skipped": 1}
+    record = json.loads(output.read_text().splitlines()[-1])
+    assert record["path"] == str(reports / "broken.docx")
+    assert record["status"] == "error"
@@ -0,0 +1,46 @@
+import asyncio
+import operator
+import uuid
+from typing import Annotated, List, TypedDict
+
+from langgraph.graph import END, StateGraph
+
+from checkpointing import load_session, open_checkpointer, session_config
+from metrics import registry
+
+
+class Chat(TypedDict):
+    conversation_history: Annotated[List[str], operator.add]
+    user_input: str
+
+
+def _compile(path):
+    graph = StateGraph(Chat)
+    graph.add_node("reply", lambda state: {"conversation_history": [f"Patient: {state['user_input']}"]})
+    graph.set_entry_point("reply")
+    graph.add_edge("reply", END)
+    return graph.compile(checkpointer=open_checkpointer(path))
+
+
+def test_session_resumes_after_a_restart(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+    session_id = f"resume-{uuid.uuid4()}"
+    graph = _compile(path)
+    graph.invoke({"conversation_history": [], "user_input": "headache"}, config=session_config(session_id))
+    # Later turns send only the new input; the checkpoint holds the rest
+    graph.invoke({"user_input": "since monday"}, config=session_config(session_id))
+
+    config, saved = load_session(_compile(path), session_id)
+    assert config["configurable"]["thread_id"] == session_id
+    assert saved["conversation_history"] == ["Patient: headache", "Patient: since monday"]
+    assert load_session(_compile(path), "never-seen")[1] == {}
+
+    totals = registry.session_totals(session_id)
+    assert totals["checkpoint_reads"] >= 2 and totals["checkpoint_writes"] >= 2
+
+
+def test_async_runs_use_the_same_store(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+    config = session_config(f"async-{uuid.uuid4()}")
+    asyncio.run(_compile(path).ainvoke({"conversation_history": [], "user_input": "cough"}, config=config))
+    assert _compile(path).get_state(config).values["conversation_history"] == ["Patient: cough"]
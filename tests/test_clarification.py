@@ -0,0 +1,76 @@
+import json
+
+from clarification import CLARIFY_BATCH_SIZE, analyze_answers, clarification_update, format_question_batch
+
+
+class Recorder:
+    """Chat model stand-in: the batch reply first, then one reply per single-question fallback"""
+
+    def __init__(self, batch_reply):
+        self.replies = [batch_reply]
+        self.calls = 0
+
+    def invoke(self, messages, config=None, **kwargs):
+        self.calls += 1
+        content = self.replies.pop(0) if self.replies else "Fallback analysis."
+        return type("Reply", (), {"content": content})()
+
+
+QUESTIONS = ["Any rashes?", "Worse around cats?", "Dust makes you sneeze?"]
+
+
+def test_one_call_covers_a_batch_and_the_next_batch_is_asked():
+    pending = QUESTIONS + [f"Follow-up question {n}?" for n in range(CLARIFY_BATCH_SIZE)]
+    answers = [{"question": n, "answer": "yes", "analysis": f"Finding {n} confirmed."}
+               for n in range(1, CLARIFY_BATCH_SIZE + 1)]
+    llm = Recorder(json.dumps({"answers": answers}))
+    update = clarification_update(llm, pending, "yes to all of them")
+    assert llm.calls == 1
+    assert update["pending_questions"] == pending[CLARIFY_BATCH_SIZE:]
+    assert sum(entry.startswith("Asked: ") for entry in update["conversation_history"]) == CLARIFY_BATCH_SIZE
+    assert update["conversation_history"][-1] == f"Assistant: {format_question_batch(pending[CLARIFY_BATCH_SIZE:])}"
+
+
+def test_single_question_keeps_the_one_question_flow():
+    llm = Recorder("The patient denies rashes.")
+    assert analyze_answers(llm, QUESTIONS[:1], "no") == [
+        {"question": "Any rashes?", "reply": "no", "answer": "", "analysis": "The patient denies rashes."}]
+    assert format_question_batch(QUESTIONS[:1]) == "Any rashes?"
+    assert format_question_batch(QUESTIONS).endswith(
+        "\n1. Any rashes?\n2. Worse around cats?\n3. Dust makes you sneeze?")
+
+
+def test_almost_valid_batch_json_needs_no_fallback_calls():
+    reply = """```json
+{"answers": [
+  {"question": 1, "answer": "no", "analysis": "No skin involvement."},
+  {"question": 2, "answer": "yes", "analysis": "Consistent with cat dander sensitization."},
+  {"question": 3, "answer": "yes", "analysis": "Consistent with dust mite sensitization."},
+]}
+```"""
+    llm = Recorder(reply)
+    results = analyze_answers(llm, QUESTIONS, "1 no 2 yes 3 yes")
+    assert llm.calls == 1
+    assert [r["answer"] for r in results] == ["no", "yes", "yes"]
+
+
+def test_only_missing_answers_fall_back():
+    reply = ('{"answers": [{"question": 1, "answer": "no", "analysis": "No skin involvement."}, '
+             '{"question": 2, "answer": "yes"}]}')
+    llm = Recorder(reply)
+    results = analyze_answers(llm, QUESTIONS, "1 no 2 yes")
+    # Question 2 has no analysis and question 3 is missing: two single calls
+    assert llm.calls == 3
+    assert results[0]["analysis"] == "No skin involvement."
+    assert results[1]["analysis"] == results[2]["analysis"] == "Fallback analysis."
+
+
+def test_history_keeps_the_patients_own_reply():
+    reply = ('{"answers": [{"question": 1, "answer": "as reported", "analysis": "No skin involvement."}, '
+             '{"question": 2, "answer": "yes", "analysis": "Cat dander likely."}]}')
+    typed = "1. no rashes at all 2. yes, my eyes itch around cats"
+    update = clarification_update(Recorder(reply), QUESTIONS[:2], typed)
+    history = update["conversation_history"]
+    assert history[1] == f"Patient: {typed}" and history[4] == f"Patient: {typed}"
+    assert history[2] == "Analysis: (answer: as reported) No skin involvement."
+    assert "Patient: as reported" not in history
@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+
+from conversation_memory import FOLD_BATCH, KEEP_LAST_ENTRIES, window_context
+
+
+class Summarizer:
+    def __init__(self):
+        self.folded = []
+
+    def invoke(self, messages, config=None):
+        new_lines = messages[-1].content.split("New lines:\n", 1)[1]
+        self.folded.append(new_lines.splitlines())
+        return SimpleNamespace(content=f"summary of {sum(len(lines) for lines in self.folded)} lines")
+
+
+def test_short_history_is_passed_through():
+    summarizer = Summarizer()
+    history = ["Patient: headache", "Assistant: Since when?"]
+    context, update = window_context({"conversation_history": history}, "collect_symptoms", summarizer)
+    assert context == "\n".join(history)
+    assert update == {} and summarizer.folded == []
+
+
+def test_old_entries_are_folded_once_per_batch():
+    summarizer = Summarizer()
+    history = [f"Patient: answer {n}" for n in range(KEEP_LAST_ENTRIES + FOLD_BATCH)]
+    context, update = window_context({"conversation_history": history}, "follow_up", summarizer)
+    assert summarizer.folded == [history[:FOLD_BATCH]]
+    assert update == {"history_summary": f"summary of {FOLD_BATCH} lines", "summarized_upto": FOLD_BATCH}
+    assert context.startswith(f"Summary of earlier conversation:\nsummary of {FOLD_BATCH} lines")
+    assert context.endswith("\n".join(history[FOLD_BATCH:]))
+
+    # One more turn is not a full batch: the window slides without another summary call
+    state = {"conversation_history": history + ["Patient: one more"], **update}
+    _, update = window_context(state, "follow_up", summarizer)
+    assert update == {} and len(summarizer.folded) == 1
@@ -0,0 +1,52 @@
+import os
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from benchmark import load_scripts, percentile
+from fake_llm import PREFIX_CACHE_MIN_TOKENS, LatencyModel, ScriptedChatModel, ScriptedResponder, cached_tokens
+
+BENCH_SCRIPTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench_scripts")
+
+
+def test_rules_match_the_prompt_and_lists_play_in_order():
+    responder = ScriptedResponder([(r"supervisor", "collect_symptoms"), (r"interview", ["First?", "Second?"])],
+                                  default="fallback")
+    llm = ScriptedChatModel(responder=responder)
+    prompt = [SystemMessage(content="You are a medical interview specialist"), HumanMessage(content="headache")]
+    assert [llm.invoke(prompt).content for _ in range(3)] == ["First?", "Second?", "Second?"]
+    assert llm.invoke("You are the workflow SUPERVISOR").content == "collect_symptoms"
+    assert llm.invoke("anything else").content == "fallback"
+    assert responder.totals()["calls"] == 5
+
+
+def test_latency_is_seeded_and_scaled():
+    def run():
+        responder = ScriptedResponder([], latency=LatencyModel.parse("lognormal:0.8:0.3", seed=7), time_scale=0.001)
+        return [responder.respond("prompt")[1] for _ in range(5)]
+
+    delays = run()
+    assert delays == run()
+    assert all(0 < delay < 0.01 for delay in delays)
+    assert percentile(delays, 100) == max(delays)
+
+
+def test_bundled_scripts_load():
+    scripts = {script["name"]: script for script in load_scripts(BENCH_SCRIPTS)}
+    assert {"headache", "allergy_with_report"} <= set(scripts)
+    assert all(script["turns"] for script in scripts.values())
+
+
+def test_prefix_cache_serves_repeated_leading_tokens_in_steps():
+    assert cached_tokens(shared=2000, prompt_tokens=900) == 0  # Under the provider's minimum prompt size
+    assert cached_tokens(shared=PREFIX_CACHE_MIN_TOKENS - 1, prompt_tokens=3000) == 0
+    assert cached_tokens(shared=1300, prompt_tokens=3000) == 1280
+
+    responder = ScriptedResponder([])
+    llm = ScriptedChatModel(responder=responder)
+    instructions = "You route the consultation. " * 200
+    llm.invoke(instructions + "Patient: headache")
+    reply = llm.invoke(instructions + "Patient: it started yesterday")
+    first, second = responder.calls
+    assert first["cached_prompt_tokens"] == 0
+    assert second["shared_prefix_tokens"] >= PREFIX_CACHE_MIN_TOKENS
+    assert reply.usage_metadata["input_token_details"]["cache_read"] == second["cached_prompt_tokens"] > 0
@@ -0,0 +1,36 @@
+from typing import List, TypedDict
+
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, StateGraph
+
+from human_input import ask_patient, ask_patient_many, next_event
+
+
+class Interview(TypedDict):
+    symptom: str
+    answers: List[str]
+
+
+def _interview():
+    graph = StateGraph(Interview)
+    graph.add_node("ask_symptom", lambda state: {"symptom": ask_patient("What brings you in today?")})
+    graph.add_node("verify", lambda state: {"answers": ask_patient_many("A few questions about your report",
+                                                                         ["Any rashes?", "Worse around cats?"])})
+    graph.set_entry_point("ask_symptom")
+    graph.add_edge("ask_symptom", "verify")
+    graph.add_edge("verify", END)
+    return graph.compile(checkpointer=MemorySaver())
+
+
+def test_graph_pauses_for_each_answer_and_resumes_from_the_checkpoint():
+    graph, config = _interview(), {"configurable": {"thread_id": "patient-1"}}
+    event = next_event(graph, config, state={"symptom": "", "answers": []})
+    assert event == {"status": "needs_input", "kind": "patient_response",
+                     "message": "What brings you in today?", "prompt": "[Patient]"}
+
+    event = next_event(graph, config, answer="itchy eyes")
+    assert event["kind"] == "verification"
+    assert event["questions"] == ["Any rashes?", "Worse around cats?"]
+
+    event = next_event(graph, config, answer=["no", "yes"])
+    assert event == {"status": "done", "state": {"symptom": "itchy eyes", "answers": ["no", "yes"]}}
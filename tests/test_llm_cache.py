@@ -0,0 +1,57 @@
+from llm_cache import AutoGenResponseCache, LangChainResponseCache, ResponseStore, make_key
+
+
+def test_responses_survive_a_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    store = ResponseStore(path)
+    LangChainResponseCache(store).update("Describe the rash", "gpt-4o|temperature=0", ["reply"])
+    store.close()
+    reopened = LangChainResponseCache(ResponseStore(path))
+    assert reopened.lookup("Describe   the\n rash", "gpt-4o|temperature=0") == ["reply"]
+    assert reopened.lookup("Describe the rash", "gpt-4o|temperature=0.7") is None
+
+
+def test_frameworks_do_not_share_keys(tmp_path):
+    store = ResponseStore(str(tmp_path / "cache.sqlite"))
+    AutoGenResponseCache(store).set("prompt", "autogen reply")
+    assert store.get(make_key("autogen", "prompt")) == "autogen reply"
+    assert store.get(make_key("langchain", "prompt")) is None
+
+
+def test_expired_entries_miss(tmp_path):
+    store = ResponseStore(str(tmp_path / "cache.sqlite"), ttl_seconds=-1)
+    store.set("a", "reply")
+    assert store.get("a") is None
+    assert store.stats()["expirations"] == 1
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    store = ResponseStore(str(tmp_path / "cache.sqlite"), max_entries=2)
+    store.set("old", 1)
+    store.set("new", 2)
+    store.set("newest", 3)
+    assert store.get("old") is None
+    assert store.stats()["entries"] == 2
+    assert store.stats()["evictions"] == 1
+
+
+def test_hits_do_not_write_until_flushed(tmp_path):
+    store = ResponseStore(str(tmp_path / "cache.sqlite"))
+    store.set("a", "reply")
+    writes = store._conn.total_changes
+    for _ in range(10):
+        assert store.get("a") == "reply"
+    assert store._conn.total_changes == writes
+    store.flush()
+    assert store._conn.total_changes == writes + 1
+
+
+def test_eviction_sees_unflushed_hits(tmp_path):
+    store = ResponseStore(str(tmp_path / "cache.sqlite"), max_entries=2)
+    store.set("old", 1)
+    store.set("new", 2)
+    assert store.get("old") == 1  # Only recorded in memory
+    store.set("newest", 3)
+    assert store.get("old") == 1
+    assert store.get("new") is None
+    store.close()
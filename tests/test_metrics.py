@@ -0,0 +1,37 @@
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from metrics import LLMMetricsCallback, MetricsRegistry, estimate_cost
+
+
+def test_dated_snapshots_price_like_their_family():
+    assert estimate_cost("gpt-4o-mini-2024-07-18", 1_000_000, 0) == pytest.approx(0.15)
+    assert estimate_cost("gpt-4o-2024-08-06", 0, 1_000_000) == pytest.approx(10.00)
+    assert estimate_cost("claude-unknown", 1000, 1000) == 0.0
+
+
+def test_callback_records_usage_per_node_and_session():
+    metrics = MetricsRegistry()
+    reply = AIMessage(content="When did it start?",
+                      usage_metadata={"input_tokens": 1000, "output_tokens": 200, "total_tokens": 1200})
+    llm = GenericFakeChatModel(messages=iter([reply]), callbacks=[LLMMetricsCallback(metrics)])
+    llm.invoke("headache", config={"metadata": {"session_id": "s1", "call_site": "symptom_llm",
+                                                "ls_model_name": "gpt-4o"}})
+
+    totals = metrics.session_totals("s1")
+    assert (totals["llm_calls"], totals["prompt_tokens"], totals["completion_tokens"]) == (1, 1000, 200)
+    assert totals["cost_usd"] == pytest.approx(estimate_cost("gpt-4o", 1000, 200))
+    assert 'agent_llm_calls_total{node="symptom_llm",model="gpt-4o"} 1' in metrics.to_prometheus()
+
+
+def test_cached_prompt_tokens_are_priced_lower_and_split_per_node():
+    metrics = MetricsRegistry()
+    reply = AIMessage(content="collect_symptoms", usage_metadata={
+        "input_tokens": 2048, "output_tokens": 4, "total_tokens": 2052, "input_token_details": {"cache_read": 1536}})
+    llm = GenericFakeChatModel(messages=iter([reply]), callbacks=[LLMMetricsCallback(metrics)])
+    llm.invoke("route", config={"metadata": {"call_site": "supervisor", "ls_model_name": "gpt-4o"}})
+
+    assert estimate_cost("gpt-4o", 2048, 4, cached_prompt_tokens=1536) < estimate_cost("gpt-4o", 2048, 4)
+    assert metrics.prompt_cache()["supervisor"] == {"prompt_tokens": 2048, "cached_prompt_tokens": 1536,
+                                                    "uncached_prompt_tokens": 512, "hit_rate": 0.75}
@@ -0,0 +1,22 @@
+import copy
+
+import model_registry
+
+
+def test_same_settings_share_one_model_and_one_pool(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "offline-test")
+    supervisor = model_registry.chat_model("gpt-4o-mini", temperature=0.1)
+    assert model_registry.chat_model("gpt-4o-mini", temperature=0.1) is supervisor
+    summarizer = model_registry.chat_model("gpt-4o-mini", temperature=0.5)
+    assert summarizer is not supervisor
+    assert summarizer.http_client is supervisor.http_client is model_registry.http_client()
+    assert summarizer.http_async_client is model_registry.async_http_client()
+
+
+def test_autogen_agents_keep_the_pool_through_deep_copies():
+    config_list = model_registry.autogen_config_list([{"model": "gpt-4", "api_key": "offline-test"},
+                                                      {"model": "scripted", "model_client_cls": "ScriptedModelClient"}])
+    assert config_list[0]["http_client"] is model_registry.http_client()
+    assert "http_client" not in config_list[1]
+    # AutoGen deep-copies llm_config for every agent
+    assert copy.deepcopy(config_list)[0]["http_client"] is model_registry.http_client()
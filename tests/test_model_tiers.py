@@ -0,0 +1,152 @@
+from typing import TypedDict
+
+from langchain_core.messages import AIMessage
+
+import model_tiers
+from fake_llm import ScriptedChatModel, ScriptedResponder
+from model_tiers import TieredChatModel, reply_check, tiers_for
+
+
+def _scripted(reply):
+    return ScriptedChatModel(responder=ScriptedResponder([], default=reply))
+
+
+def test_adequate_fast_replies_never_reach_the_large_model():
+    model_tiers.reset_stats()
+    large = _scripted("unused")
+    llm = TieredChatModel("follow_up", [("fast", _scripted("Any fever?")), ("large", large)])
+    for _ in range(3):
+        assert llm.invoke("Ask one question").content == "Any fever?"
+    assert model_tiers.stats()["follow_up"] == {"calls": 3, "escalations": 0, "unresolved": 0, "tiers": {"fast": 3}}
+
+
+def test_failed_replies_escalate_and_the_last_tier_always_answers():
+    model_tiers.reset_stats()
+    llm = TieredChatModel("summary", [("fast", _scripted("")), ("large", _scripted("Headache for 3 days."))])
+    assert llm.invoke("Summarize").content == "Headache for 3 days."
+
+    stuck = TieredChatModel("stuck", [("fast", _scripted("")), ("large", _scripted(" "))])
+    assert stuck.invoke("Summarize").content == " "
+    stats = model_tiers.stats()
+    assert stats["summary"]["tiers"] == {"fast": 1, "large": 1} and stats["summary"]["escalations"] == 1
+    assert stats["stuck"]["unresolved"] == 1
+
+
+def test_tiers_can_be_overridden_per_call_site(monkeypatch):
+    assert tiers_for("report_questions") == model_tiers.DEFAULT_TIERS
+    monkeypatch.setenv("MODEL_TIERS_REPORT_QUESTIONS", "gpt-4o, ")
+    assert tiers_for("report_questions") == ["gpt-4o"]
+
+
+def test_calls_share_a_prompt_cache_key_per_call_site():
+    seen = []
+
+    class Recording:
+        def invoke(self, input, config=None, **kwargs):
+            seen.append(kwargs)
+            return _scripted("Any fever?").invoke(input)
+
+    TieredChatModel("follow_up", [("fast", Recording())]).invoke("Ask one question")
+    assert seen == [{"prompt_cache_key": "follow_up"}]
+
+
+class State(TypedDict):
+    reply: str
+
+
+def _tiered(replies):
+    """TieredChatModel whose tiers ("fast", "large") answer from replies[tier]"""
+    def build(model):
+        return ScriptedChatModel(responder=ScriptedResponder([], default=replies[model]), model_name=model)
+    return TieredChatModel("shared_llm", [("fast", build("fast"))],
+                           node_tiers={"summary_node": ["large"], "ask_node": ["fast", "large"]}, build=build)
+
+
+def test_tiers_follow_the_calling_node():
+    from langgraph.graph import END, StateGraph
+
+    model_tiers.reset_stats()
+    llm = _tiered({"fast": "I'm not sure how to answer that.", "large": "When did it start?"})
+    graph = StateGraph(State)
+    for node in ("summary_node", "ask_node"):
+        graph.add_node(node, lambda state: {"reply": llm.invoke("hello").content})
+    graph.set_entry_point("summary_node")
+    graph.add_edge("summary_node", "ask_node")
+    graph.add_edge("ask_node", END)
+    assert graph.compile().invoke({"reply": ""})["reply"] == "When did it start?"
+
+    stats = model_tiers.stats()
+    assert stats["summary_node"]["tiers"] == {"large": 1}
+    assert stats["ask_node"]["tiers"] == {"fast": 1, "large": 1}
+    assert stats["ask_node"]["escalations"] == 1
+    # Outside a graph node the client's own tiers apply
+    llm.invoke("hello")
+    assert model_tiers.stats()["shared_llm"]["unresolved"] == 1
+
+
+def test_free_text_check():
+    assert reply_check("I'm sorry to hear that. When did the pain start?")
+    assert not reply_check("I'm sorry, but I can't help with that.")
+    assert not reply_check("  ")
+
+
+def test_only_calls_passing_a_schema_are_validated_as_json():
+    from structured_output import QUESTIONS_SCHEMA, schema_instruction
+
+    model_tiers.reset_stats()
+    llm = TieredChatModel("analysis_llm", [
+        ("fast", ScriptedChatModel(responder=ScriptedResponder([], default="Here are some questions."))),
+        ("large", ScriptedChatModel(responder=ScriptedResponder([], default='{"questions": ["Any fever?"]}'))),
+    ])
+    prompt = "List questions. " + schema_instruction(QUESTIONS_SCHEMA)
+    # The prompt text alone doesn't make a call structured
+    assert llm.invoke(prompt).content == "Here are some questions."
+    assert llm.invoke(prompt, schema=QUESTIONS_SCHEMA).content == '{"questions": ["Any fever?"]}'
+    assert model_tiers.stats()["analysis_llm"]["escalations"] == 1
+
+
+def test_truncated_reply_escalates():
+    model_tiers.reset_stats()
+
+    class Truncated:
+        def invoke(self, input, config=None, **kwargs):
+            return AIMessage(content="Symptoms: head", response_metadata={"finish_reason": "length"})
+
+    llm = TieredChatModel("summary", [("fast", Truncated()),
+                                      ("large", ScriptedChatModel(responder=ScriptedResponder([], default="Full")))])
+    assert llm.invoke("Summarize").content == "Full"
+    assert model_tiers.stats()["summary"]["escalations"] == 1
+
+
+def _follow_up_graph(llm):
+    from langgraph.graph import END, StateGraph
+
+    graph = StateGraph(State)
+    graph.add_node("follow_up", lambda state: {"reply": llm.invoke("Ask one question").content})
+    graph.set_entry_point("follow_up")
+    graph.add_edge("follow_up", END)
+    return graph.compile()
+
+
+def test_stream_shows_only_the_accepted_tier():
+    from streaming import stream_turn
+
+    written = []
+    llm = TieredChatModel("follow_up", [
+        ("fast", ScriptedChatModel(responder=ScriptedResponder([], default="I'm not able to answer that."))),
+        ("large", ScriptedChatModel(responder=ScriptedResponder([], default="When did it start?"))),
+    ])
+    result, streamed = stream_turn(_follow_up_graph(llm), {"reply": ""}, write=written.append)
+    assert streamed and result["reply"] == "When did it start?"
+    assert "".join(written) == "\nAssistant: When did it start?\n"
+
+
+def test_accepted_first_tier_is_still_streamed_once():
+    from streaming import stream_turn
+
+    written = []
+    llm = _tiered({"fast": "Does light bother you?", "large": "unused"})
+    llm.models = [("fast", llm.build("fast")), ("large", llm.build("large"))]
+    _, streamed = stream_turn(_follow_up_graph(llm), {"reply": ""}, write=written.append)
+    assert streamed
+    assert "".join(written) == "\nAssistant: Does light bother you?\n"
@@ -0,0 +1,64 @@
+import os
+
+from pdf_reader import BoilerplateFilter, iter_pdf_pages, iter_raw_pages
+
+REPORT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Diya Pramanick A29011.pdf")
+
+
+def test_pages_come_out_in_order_with_or_without_a_process_pool():
+    pages = list(iter_raw_pages(REPORT))
+    assert len(pages) == 2
+    assert pages[0].startswith("ALLERGY TEST (SPT) REPORT")
+    assert list(iter_raw_pages(REPORT, workers=2)) == pages
+    assert list(iter_pdf_pages(REPORT, strip_boilerplate=False)) == pages
+
+
+def test_running_headers_and_page_numbers_are_stripped():
+    panels = ["Lipid profile", "Liver function", "Thyroid panel", "Renal function"]
+    pages = ["\n".join(["SUNRISE HOSPITAL", "Department of Pathology", panel, "Sample: serum", "Method: ECLIA",
+                        f"{panel} within range", f"{panel} reviewed", f"Page {n} of 4"])
+             for n, panel in enumerate(panels, 1)]
+    boilerplate = BoilerplateFilter()
+    for page in pages:
+        boilerplate.observe(page)
+    assert boilerplate.clean(pages[2]).splitlines() == [
+        "Thyroid panel", "Sample: serum", "Method: ECLIA", "Thyroid panel within range", "Thyroid panel reviewed"]
+
+
+def _page(number, first_row):
+    return "\n".join([
+        "CITY DIAGNOSTICS LAB",
+        f"{first_row}",
+        "Haemoglobin 13.2 g/dL",
+        "Platelets 250 10^3/uL",
+        "WBC 7.1 10^3/uL",
+        f"Page {number} of 4",
+    ])
+
+
+def _cleaned(pages):
+    boilerplate = BoilerplateFilter()
+    for page in pages:
+        boilerplate.observe(page)
+    return [boilerplate.clean(page) for page in pages]
+
+
+def test_lab_row_repeating_on_two_page_edges_survives():
+    pages = [_page(1, "Glucose 95 mg/dL"), _page(2, "Glucose 182 mg/dL"),
+             _page(3, "Creatinine 0.9 mg/dL"), _page(4, "Urea 30 mg/dL")]
+    cleaned = _cleaned(pages)
+    assert "Glucose 95 mg/dL" in cleaned[0]
+    assert "Glucose 182 mg/dL" in cleaned[1]
+    # Header and page footer are on every page and still go
+    assert all("CITY DIAGNOSTICS LAB" not in page and "Page" not in page for page in cleaned)
+
+
+def test_two_page_report_keeps_everything():
+    pages = [_page(1, "Glucose 95 mg/dL"), _page(2, "Glucose 182 mg/dL")]
+    assert _cleaned(pages) == [page for page in pages]
+
+
+def test_three_page_report_keeps_rows_repeated_on_every_page():
+    pages = [_page(1, "Glucose 95 mg/dL"), _page(2, "Glucose 97 mg/dL"), _page(3, "Glucose 99 mg/dL")]
+    cleaned = _cleaned(pages)
+    assert cleaned == pages
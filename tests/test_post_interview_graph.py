@@ -0,0 +1,64 @@
+import builtins
+import threading
+
+from task_graph import TaskGraph
+
+
+def test_cancelled_graph_starts_nothing_new():
+    gate, ran = threading.Event(), []
+    graph = TaskGraph()
+    graph.add("slow", lambda: gate.wait(5))
+    graph.add("after", lambda slow: ran.append("after"), deps=["slow"])
+    graph.start()
+    graph.cancel()
+    gate.set()
+    assert graph.future("after").cancelled()
+    assert ran == []
+
+
+def test_second_report_upload_cancels_the_first_graph(monkeypatch):
+    import session_archive
+
+    monkeypatch.setenv("OPENAI_API_KEY", "offline-test")
+    # The archive path is read at import, so point the shared archive at memory directly
+    monkeypatch.setattr(session_archive, "_archive", session_archive.SessionArchive(":memory:"))
+    import agen3
+
+    system = agen3.MedicalAgentSystem()
+    first_parsed = threading.Event()
+    release_first = threading.Event()
+    analysed = []
+
+    def process_document(path):
+        if path == "first.pdf":
+            first_parsed.set()
+            release_first.wait(5)
+        return f"PATIENT NAME : Test\nreport {path}"
+
+    monkeypatch.setattr(system, "process_document", process_document)
+    monkeypatch.setattr(system, "analyze_report", lambda text: analysed.append(text) or "analysis")
+    monkeypatch.setattr(system, "generate_verification_questions", lambda text, summary=None: ["q?"])
+    monkeypatch.setattr(system, "generate_final_report", lambda summary, report_text, answers: "report")
+
+    replies = iter(["/report first.pdf", "/report second.pdf", "I have a headache"])
+    monkeypatch.setattr(builtins, "input", lambda prompt="": next(replies))
+    first_graph = []
+    start = system.start_post_interview
+
+    def record(path):
+        graph = start(path)
+        first_graph.append(graph)
+        if path == "first.pdf":
+            first_parsed.wait(5)  # The first report is mid-parse when the second one arrives
+        return graph
+
+    monkeypatch.setattr(system, "start_post_interview", record)
+
+    assert system.user_proxy.get_human_input("> ") == "I have a headache"
+    first, second = first_graph
+    assert system.post_interview is second
+    release_first.set()
+    assert second.result("analysis", timeout=5) == "analysis"
+    assert first.future("analysis").cancelled() and first.future("questions").cancelled()
+    assert analysed == ["PATIENT NAME : Test\nreport second.pdf"]
+    second.cancel()
@@ -0,0 +1,121 @@
+import asyncio
+import time
+
+import httpx
+
+from rate_limiter import RateLimiter, TokenBucket, estimate_tokens, rate_limited_transport
+
+
+def test_bucket_wait_grows_with_the_shortfall():
+    bucket = TokenBucket(per_minute=60)  # One per second
+    bucket.take(60)
+    now = bucket.updated
+    assert bucket.wait_time(1, now) == 1.0
+    assert bucket.wait_time(600, now) == 60.0  # Capped to the bucket's size, so it still fits eventually
+    bucket.sync(0)
+    assert bucket.wait_time(1, now + 0.5) == 0.5
+
+
+def test_429s_are_retried_after_the_server_pause_and_halve_the_limit():
+    replies = [httpx.Response(429, headers={"retry-after-ms": "10"}),
+               httpx.Response(200, json={"choices": []}, headers={"x-ratelimit-remaining-tokens": "50"})]
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        return replies.pop(0)
+
+    limiter = RateLimiter(initial_concurrency=8)
+    client = httpx.Client(transport=rate_limited_transport("sync", httpx.MockTransport(handler), limiter))
+    response = client.post("https://api.example/v1/chat/completions", json={"max_tokens": 10})
+    assert response.status_code == 200
+    assert len(seen) == 2
+    stats = limiter.stats()
+    assert stats["throttled"] == 1 and stats["in_flight"] == 0
+    assert limiter.limit < 8 / 2 + 1  # Halved, then one additive step back
+    assert limiter.tokens.level <= 50  # The server's count wins when it is lower
+
+
+def test_fast_replies_raise_the_limit_additively():
+    limiter = RateLimiter(initial_concurrency=2, max_concurrency=4)
+    for _ in range(20):
+        limiter.acquire(1)
+        limiter.release(latency=0.1)
+    assert limiter.limit == 4
+    assert limiter.stats()["latency_backoffs"] == 0
+
+
+def test_token_estimate_uses_the_requested_completion_budget():
+    request = httpx.Request("POST", "https://api.example/v1/chat/completions",
+                            content=b'{"messages": [], "max_tokens": 100}')
+    assert estimate_tokens(request) == len(request.content) // 4 + 100
+
+
+def test_only_model_calls_are_queued():
+    limiter = RateLimiter()
+    transport = httpx.MockTransport(lambda request: httpx.Response(200))
+    client = httpx.Client(transport=rate_limited_transport("sync", transport, limiter))
+    client.get("https://api.example/v1/models")
+    assert limiter.stats()["calls"] == 0
+
+
+def _ok(request):
+    return httpx.Response(200, content=b'{"choices": []}')
+
+
+def test_streamed_response_holds_its_slot_until_closed():
+    limiter = RateLimiter(initial_concurrency=1, max_concurrency=1)
+    client = httpx.Client(transport=rate_limited_transport("sync", httpx.MockTransport(_ok), limiter))
+    request = client.build_request("POST", "https://api.example/v1/chat/completions", json={"stream": True})
+    response = client.send(request, stream=True)
+    assert limiter.in_flight == 1
+    assert response.read() == b'{"choices": []}'
+    response.close()
+    assert limiter.in_flight == 0
+    # Closing twice releases once
+    response.close()
+    assert limiter.in_flight == 0
+
+
+def test_limiter_sees_time_to_headers_not_the_whole_stream():
+    class SlowBody(httpx.SyncByteStream):
+        def __iter__(self):
+            time.sleep(0.2)
+            yield b"data: [DONE]"
+
+    limiter = RateLimiter()
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, stream=SlowBody()))
+    client = httpx.Client(transport=rate_limited_transport("sync", transport, limiter))
+    with client.stream("POST", "https://api.example/v1/chat/completions", json={"stream": True}) as response:
+        response.read()
+    assert limiter._baseline_latency < 0.1
+    assert limiter.stats()["held_seconds"] >= 0.2
+
+
+def test_async_stream_releases_on_close():
+    async def run():
+        limiter = RateLimiter(initial_concurrency=1, max_concurrency=1)
+        transport = rate_limited_transport("async", httpx.MockTransport(_ok), limiter)
+        async with httpx.AsyncClient(transport=transport) as client:
+            async with client.stream("POST", "https://api.example/v1/chat/completions", json={}) as response:
+                assert limiter.in_flight == 1
+                await response.aread()
+            assert limiter.in_flight == 0
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        limiter = RateLimiter(initial_concurrency=1, max_concurrency=1)
+        await limiter.aacquire(1)
+        waiter = asyncio.ensure_future(limiter.aacquire(1))
+        await asyncio.sleep(0.1)
+        assert limiter.stats()["queue_depth"] == 1
+        waiter.cancel()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            pass
+        assert limiter.stats()["queue_depth"] == 0
+        assert limiter.in_flight == 1
+    asyncio.run(run())
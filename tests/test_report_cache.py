@@ -0,0 +1,41 @@
+import os
+import shutil
+
+import pytest
+
+import report_cache
+from report_cache import ExtractionCache, file_digest
+from report_loader import load_report_text
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DOCX = os.path.join(REPO, "Asokan Ganesh A28984.docx")
+PDF = os.path.join(REPO, "Diya Pramanick A29011.pdf")
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = ExtractionCache(str(tmp_path / "extracted"), max_entries=1)
+    monkeypatch.setattr(report_cache, "_cache", cache)
+    return cache
+
+
+def test_same_report_under_another_name_is_not_parsed_again(cache, tmp_path):
+    renamed = tmp_path / "report (1).docx"
+    shutil.copy(DOCX, renamed)
+    text = load_report_text(DOCX)
+    assert load_report_text(str(renamed)) == text
+    assert (cache.stats()["misses"], cache.stats()["memory_hits"]) == (1, 1)
+
+
+def test_memory_copy_is_bounded_and_the_disk_copy_backs_it(cache):
+    text = load_report_text(DOCX)
+    load_report_text(PDF)
+    assert cache.stats()["memory_entries"] == 1
+    assert load_report_text(DOCX) == text
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_entries_from_another_extractor_version_are_ignored(cache, monkeypatch):
+    load_report_text(DOCX)
+    monkeypatch.setattr(report_cache, "EXTRACTOR_VERSION", report_cache.EXTRACTOR_VERSION + 1)
+    assert ExtractionCache(cache.directory).lookup(file_digest(DOCX)) is None
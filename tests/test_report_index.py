@@ -0,0 +1,33 @@
+from report_index import chunk_report, report_index
+
+ALLERGY_REPORT = """ALLERGY TEST (SPT) REPORT
+PATIENT NAME: TEST PATIENT
+AGE: 13 Years
+HOUSE DUST MITE
+11 Dermatophagoides farinae POSITIVE
+12 Dermatophagoides pteronyssinus POSITIVE
+EPITHELIA
+21 Cat dander NEGATIVE
+22 Dog epithelia NEGATIVE
+FOOD
+61 Cow's Milk TEST NOT DONE
+62 Wheat Flour TEST NOT DONE
+"""
+
+
+def test_chunks_follow_report_sections():
+    chunks = chunk_report(ALLERGY_REPORT)
+    assert [chunk["section"] for chunk in chunks] == [
+        "ALLERGY TEST (SPT) REPORT", "HOUSE DUST MITE", "EPITHELIA", "FOOD"]
+    assert [chunk["id"] for chunk in chunks] == ["C1", "C2", "C3", "C4"]
+    # Result values in capitals are rows, not headings
+    assert "61 Cow's Milk TEST NOT DONE" in chunks[3]["text"]
+
+
+def test_questions_retrieve_the_matching_section_with_its_id():
+    index = report_index(ALLERGY_REPORT)
+    best, score = index.search("Am I allergic to dust mites?", k=1)[0]
+    assert best["section"] == "HOUSE DUST MITE" and score > 0
+    assert index.context("What about cats?", k=1).startswith("[C3] (EPITHELIA)\n21 Cat dander NEGATIVE")
+    # Nothing matches: the first chunks still give the model something to work from
+    assert [chunk["id"] for chunk, _ in index.search("zzz", k=2)] == ["C1", "C2"]
@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+import report_cache
+from report_cache import ExtractionCache
+from report_loader import iter_report_chunks
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("name", ["Asokan Ganesh A28984.docx", "Diya Pramanick A29011.pdf"])
+def test_cached_read_yields_the_same_chunks(tmp_path, monkeypatch, name):
+    pytest.importorskip("docx2txt" if name.endswith(".docx") else "pypdf")
+    cache = ExtractionCache(str(tmp_path))
+    monkeypatch.setattr(report_cache, "_cache", cache)
+    path = os.path.join(REPO, name)
+
+    cold = list(iter_report_chunks(path, max_chars=1000))
+    assert cache.stats()["misses"] == 1
+    assert len(cold) > 1 and all(chunk.strip() for chunk in cold)
+    assert list(iter_report_chunks(path, max_chars=1000)) == cold
+    # A fresh process reads the disk copy
+    monkeypatch.setattr(report_cache, "_cache", ExtractionCache(str(tmp_path)))
+    assert list(iter_report_chunks(path, max_chars=1000)) == cold
+    assert report_cache._cache.stats()["disk_hits"] == 1
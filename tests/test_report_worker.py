@@ -0,0 +1,77 @@
+import os
+import threading
+
+import pytest
+
+from report_worker import ReportPreprocessor, parse_report_command
+
+
+@pytest.mark.parametrize("text, path", [
+    ("/report labs.pdf", "labs.pdf"),
+    ('  /REPORT "My Labs/cbc.docx"  ', "My Labs/cbc.docx"),
+    ("I have a report", None),
+    ("", None),
+])
+def test_report_command_is_recognised_at_any_prompt(text, path):
+    assert parse_report_command(text) == path
+
+
+def test_report_is_processed_while_the_interview_goes_on(tmp_path):
+    report = tmp_path / "labs.pdf"
+    report.write_text("IgE 240")
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def process(path):
+        calls.append(path)
+        started.set()
+        release.wait(5)
+        return open(path).read()
+
+    worker = ReportPreprocessor(process)
+    job = worker.submit(str(report))
+    assert started.wait(5)  # Running before anyone asks for it
+    assert worker.submit(str(report)) is job  # A second upload of the same report reuses the run
+    assert not job.done()
+    release.set()
+    assert worker.result(str(report), timeout=5) == "IgE 240"
+    assert calls == [str(report)]
+    assert worker.stats()["submitted"] == 1
+    worker.shutdown()
+
+
+def test_reports_never_submitted_have_no_result(tmp_path):
+    worker = ReportPreprocessor(lambda path: path)
+    assert worker.result(str(tmp_path / "missing.pdf")) is None
+    assert worker.stats()["submitted"] == 0
+
+
+def test_failed_runs_and_replaced_files_are_processed_again(tmp_path):
+    report = tmp_path / "report.pdf"
+    report.write_text("first")
+    calls = []
+
+    def process(path):
+        calls.append(path)
+        text = open(path).read()
+        if len(calls) == 1:
+            raise ValueError("parse failed")
+        return text
+
+    worker = ReportPreprocessor(process)
+    worker.submit(str(report)).exception(timeout=5)
+    with pytest.raises(ValueError):
+        worker.result(str(report))
+    # The failure is not cached
+    worker.submit(str(report))
+    assert worker.result(str(report), timeout=5) == "first"
+    assert not worker.submitted(str(report))
+
+    worker.submit(str(report)).result(timeout=5)
+    report.write_text("second, replaced")
+    os.utime(report, ns=(1, 1))
+    assert worker.result(str(report)) is None  # Stale run; the caller reads the new file
+    worker.submit(str(report))
+    assert worker.result(str(report), timeout=5) == "second, replaced"
+    assert len(calls) == 4
+    worker.shutdown()
@@ -0,0 +1,37 @@
+import pytest
+
+from router import AWAIT_INPUT, decide_next_action, route_after_supervisor, routing_counters
+
+
+@pytest.mark.parametrize("state, action", [
+    ({"user_input": "", "test_report": "CBC: haemoglobin 11.2"}, "process_report"),
+    ({"user_input": "  "}, AWAIT_INPUT),
+    ({"user_input": "Headache since Monday"}, "collect_symptoms"),
+    ({"user_input": "It's getting worse", "symptoms_collected": True}, None),
+])
+def test_obvious_cases_are_settled_without_the_llm(state, action):
+    assert decide_next_action(state) == action
+
+
+def test_report_action_waits_for_an_upload():
+    assert route_after_supervisor({"next_action": "process_report", "test_report": ""}) == AWAIT_INPUT
+    assert route_after_supervisor({"next_action": "process_report", "test_report": "CBC"}) == "process_report"
+    assert route_after_supervisor({"next_action": "follow_up"}) == "follow_up"
+
+
+def test_counters_split_rule_and_llm_decisions():
+    assert routing_counters({"routing_llm_calls_saved": 2}, used_llm=False) == {"routing_llm_calls_saved": 3}
+    assert routing_counters({}, used_llm=True) == {"routing_llm_calls": 1}
+
+
+def test_reply_after_the_report_goes_to_the_supervisor_llm():
+    state = {"user_input": "No rashes", "symptoms_collected": True, "report_processed": True,
+             "pending_questions": []}
+    assert decide_next_action(state) is None
+    assert decide_next_action({**state, "user_input": ""}) == AWAIT_INPUT
+
+
+def test_pending_questions_are_clarified_first():
+    state = {"user_input": "1. no 2. yes", "symptoms_collected": True, "report_processed": True,
+             "pending_questions": ["Any rashes?", "Worse around cats?"]}
+    assert decide_next_action(state) == "clarify_questions"
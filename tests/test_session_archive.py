@@ -0,0 +1,89 @@
+import sqlite3
+
+import pytest
+
+from session_archive import SessionArchive, consultation_id, extract_patient, extract_report_date, extract_urgency
+
+LAB_REPORT = ("ALLERGY TEST (SPT) REPORT\nPATIENT NAME:  DIYA   PRAMANICK\nDATE:     01/01/2025\n"
+              "House dust mite POSITIVE")
+
+
+@pytest.fixture
+def archive():
+    archive = SessionArchive(":memory:")
+    archive.add("jan", "Wheezing at night. Urgency Level: High", report_text=LAB_REPORT,
+                verification={"Any rashes?": "no"})
+    archive.add("mar", "Sneezing in spring. Urgency: Low", report_text=LAB_REPORT.replace("01/01/2025", "15/03/2025"))
+    yield archive
+    archive.close()
+
+
+def test_fields_come_from_the_report_and_summary_without_a_model():
+    assert extract_patient(LAB_REPORT) == "Diya Pramanick"
+    assert extract_report_date(LAB_REPORT) == "2025-01-01"
+    assert extract_report_date("DATE: 31/02/2025") is None
+    assert extract_urgency("3. Urgency Assessment: Moderate") == "medium"
+
+
+def test_keyword_search_is_narrowed_by_date_and_urgency(archive):
+    # Porter stemming: "mites" finds "mite"
+    assert {hit["session_id"] for hit in archive.search("dust mites")} == {"jan", "mar"}
+    assert [hit["session_id"] for hit in archive.search("dust", date_from="2025-02-01")] == ["mar"]
+    assert [hit["session_id"] for hit in archive.search(urgency="HIGH")] == ["jan"]
+    assert [hit["session_id"] for hit in archive.search("rashes")] == ["jan"]
+
+
+def test_patient_wording_is_not_read_as_query_syntax(archive):
+    assert [hit["session_id"] for hit in archive.search('night-time wheezing: "NOT" OR')] == []
+    assert [hit["session_id"] for hit in archive.search("wheezing at night")] == ["jan"]
+
+
+REPORT = "PATIENT NAME : {name}\nDATE : 12/03/2024\nSerum IgE raised, positive to cat dander"
+
+
+def _archive():
+    archive = SessionArchive(":memory:")
+    archive.add("s1", "Sneezing around cats. Urgency Level: Low", report_text=REPORT.format(name="ASOKAN GANESH"))
+    archive.add("s2", "Rash after dust exposure. Urgency Level: High", report_text=REPORT.format(name="DIYA PRAMANICK"))
+    return archive
+
+
+def test_patient_filter_uses_the_fts_index():
+    archive = _archive()
+    assert [hit["session_id"] for hit in archive.search(patient="asok")] == ["s1"]
+    assert [hit["session_id"] for hit in archive.search(patient="Diya Pramanick")] == ["s2"]
+    assert [hit["session_id"] for hit in archive.search("cat", patient="diya")] == ["s2"]
+    assert archive.search("rash", patient="asokan") == []
+    plan = " ".join(str(tuple(row)) for row in archive._conn.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM sessions_fts JOIN sessions s ON s.rowid = sessions_fts.rowid "
+        "WHERE sessions_fts MATCH ?", ('patient : ("asok"*)',)))
+    assert "VIRTUAL TABLE INDEX" in plan and "SEARCH s USING INTEGER PRIMARY KEY" in plan
+
+
+def test_consultations_sharing_a_session_id_are_kept_apart():
+    archive = _archive()
+    first, second = consultation_id("terminal"), consultation_id("terminal")
+    assert first != second and first.startswith("terminal-")
+    archive.add(first, "First patient")
+    archive.add(second, "Second patient")
+    assert archive.get(first)["summary"] == "First patient"
+
+
+def test_rearchiving_a_session_replaces_its_index_rows():
+    archive = _archive()
+    archive.add("s1", "Wheezing on exertion. Urgency Level: Medium", report_text=REPORT.format(name="ASOKAN GANESH"))
+    assert archive.search("sneezing") == []
+    assert [hit["session_id"] for hit in archive.search("wheezing")] == ["s1"]
+    assert archive._conn.execute("SELECT COUNT(*) FROM sessions_fts").fetchone()[0] == 2
+    # The old rows were removed by rowid: the index still matches the sessions table
+    archive._conn.execute("INSERT INTO sessions_fts (sessions_fts, rank) VALUES ('integrity-check', 1)")
+
+
+def test_legacy_index_is_rebuilt(tmp_path):
+    path = str(tmp_path / "archive.sqlite")
+    SessionArchive(path).add("s1", "Sneezing around cats", report_text=REPORT.format(name="ASOKAN GANESH"))
+    conn = sqlite3.connect(path)
+    conn.executescript("DROP TABLE sessions_fts; CREATE VIRTUAL TABLE sessions_fts USING fts5 "
+                       "(session_id UNINDEXED, patient, summary, report_text, verification);")
+    conn.close()
+    assert [hit["session_id"] for hit in SessionArchive(path).search("sneezing", patient="asokan")] == ["s1"]
@@ -0,0 +1,132 @@
+import asyncio
+
+from rate_limiter import RateLimiter
+from session_engine import REPORT_RECEIVED, QueueTransport, SessionEngine
+
+
+class EchoGraph:
+    """Compiled-graph stand-in: numbers each reply, "bye" ends the session, "boom" fails the turn"""
+
+    async def ainvoke(self, state, config=None):
+        if state["user_input"] == "boom":
+            raise RuntimeError("model unavailable")
+        history = state["conversation_history"]
+        reply = f"Assistant: #{len(history) + 1} {state['user_input']}"
+        return {"conversation_history": history + [reply],
+                "next_action": "exit" if state["user_input"] == "bye" else "supervisor"}
+
+
+def _fresh_state():
+    return {"conversation_history": [], "test_report": "", "symptoms_collected": False,
+            "next_action": "collect_symptoms", "user_input": ""}
+
+
+def _serve(messages, finalize=None):
+    """Play (session_id, text) messages through an engine; each session's replies up to its close"""
+    async def run():
+        transport = QueueTransport()
+        engine = SessionEngine(EchoGraph(), _fresh_state, transport, finalize=finalize)
+        task = asyncio.create_task(engine.run())
+        for session_id, text in messages:
+            await transport.put(session_id, text)
+        await transport.shutdown()
+        await task
+        replies = {}
+        while not transport.outbox.empty():
+            session_id, text = transport.outbox.get_nowait()
+            replies.setdefault(session_id, []).append(text)
+        return replies
+
+    return asyncio.run(run())
+
+
+def test_sessions_keep_their_own_state():
+    replies = _serve([("ana", "headache"), ("ben", "cough"), ("ana", "since monday")])
+    assert replies["ana"] == ["Assistant: #1 headache", "Assistant: #2 since monday", None]
+    assert replies["ben"] == ["Assistant: #1 cough", None]
+
+
+def test_failed_turn_keeps_the_session_and_exit_finalizes_it():
+    replies = _serve([("ana", "boom"), ("ana", "headache"), ("ana", "bye")],
+                     finalize=lambda state, *config: f"{len(state['conversation_history'])} turns")
+    assert replies["ana"] == ["Error in conversation: model unavailable", "Assistant: #1 headache",
+                              "Consultation Summary for Doctor:\n2 turns", None]
+
+
+class Graph:
+    """Stand-in compiled graph: symptoms are in after two messages, a report gets one reply"""
+
+    def __init__(self, gate=None):
+        self.turns = []
+        self.gate = gate
+
+    async def ainvoke(self, state, config=None):
+        self.turns.append((state["user_input"], state.get("test_report") or None))
+        if self.gate is not None:
+            await self.gate.wait()
+        if state.get("test_report"):
+            return {"test_report": "", "report_processed": True, "next_action": "supervisor",
+                    "conversation_history": ["Assistant: Report read"]}
+        done = sum(1 for user_input, _ in self.turns if user_input != "[REPORT_UPLOADED]") >= 2
+        return {"symptoms_collected": done, "next_action": "supervisor",
+                "conversation_history": [f"Assistant: got {state['user_input']}"]}
+
+
+class Reports:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, path):
+        self.submitted.append(path)
+
+
+def _state():
+    return {"conversation_history": [], "test_report": "", "symptoms_collected": False,
+            "next_action": "collect_symptoms", "user_input": ""}
+
+
+async def _replies(transport, count):
+    return [(await transport.outbox.get())[1] for _ in range(count)]
+
+
+def test_report_command_is_handed_over_once_symptoms_are_in():
+    async def run():
+        transport, graph, reports = QueueTransport(), Graph(), Reports()
+        engine = SessionEngine(graph, _state, transport, reports=reports, limiter=RateLimiter())
+        task = asyncio.create_task(engine.run())
+        for text in ("/report r.pdf", "headache", "since monday"):
+            await transport.put("s1", text)
+        replies = await _replies(transport, 4)
+        await transport.shutdown()
+        await task
+        return graph.turns, reports.submitted, replies
+
+    turns, submitted, replies = asyncio.run(run())
+    assert submitted == ["r.pdf"]
+    assert turns == [("headache", None), ("since monday", None), ("[REPORT_UPLOADED]", "r.pdf")]
+    assert replies == [REPORT_RECEIVED, "Assistant: got headache", "Assistant: got since monday",
+                       "Assistant: Report read"]
+
+
+def test_limit_applies_to_model_calls_not_sessions():
+    async def run():
+        gate = asyncio.Event()
+        transport, graph, limiter = QueueTransport(), Graph(gate), RateLimiter(max_concurrency=32)
+        engine = SessionEngine(graph, _state, transport, max_concurrent_llm=1, limiter=limiter)
+        task = asyncio.create_task(engine.run())
+        await transport.put("s1", "headache")
+        await transport.put("s2", "cough")
+        for _ in range(50):
+            if len(graph.turns) == 2:
+                break
+            await asyncio.sleep(0.01)
+        in_flight = len(graph.turns)
+        gate.set()
+        await _replies(transport, 2)
+        await transport.shutdown()
+        await task
+        return in_flight, limiter.max_concurrency, engine._executor._max_workers
+
+    in_flight, ceiling, workers = asyncio.run(run())
+    assert in_flight == 2  # Both sessions run; only their model requests queue
+    assert ceiling == 1 and workers == 1
@@ -0,0 +1,30 @@
+from speaker_selection import PhaseSpeakerSelector
+
+
+def said(name, content):
+    return {"name": name, "content": content}
+
+
+def test_interview_alternates_then_stops_for_the_report():
+    selector = PhaseSpeakerSelector()
+    chat = [said("Patient_Proxy", "Let's begin."), said("Symptom_Collector", "When did it start?")]
+    assert selector.decide("Symptom_Collector", chat) == "Patient_Proxy"
+    chat.append(said("Patient_Proxy", "Three days ago"))
+    assert selector.decide("Patient_Proxy", chat) == "Symptom_Collector"
+    chat.append(said("Symptom_Collector", "SUMMARY: headache for three days"))
+    # Report analysis needs a report, which is asked for once the chat ends
+    assert selector.decide("Symptom_Collector", chat) is None
+
+
+def test_uploaded_report_opens_the_next_phase():
+    selector = PhaseSpeakerSelector(report_available=lambda: True)
+    chat = [said("Symptom_Collector", "SUMMARY: cough"), said("Report_Analyzer", "Key findings: ...")]
+    assert selector.decide("Symptom_Collector", chat[:1]) == "Report_Analyzer"
+    assert selector.decide("Report_Analyzer", chat) == "Symptom_Verifier"
+
+
+def test_patient_question_is_left_to_the_llm():
+    selector = PhaseSpeakerSelector()
+    chat = [said("Symptom_Collector", "Any fever?"), said("Patient_Proxy", "Should I see a doctor?")]
+    assert selector.decide("Patient_Proxy", chat) == "auto"
+    assert selector.decide("Symptom_Collector", chat[:1]) == "Patient_Proxy"
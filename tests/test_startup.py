@@ -0,0 +1,23 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("langchain_core", "langchain_openai", "langgraph", "openai", "dotenv", "tiktoken")
+
+
+@pytest.mark.parametrize("module", ["main", "main2"])
+def test_import_loads_no_framework(module):
+    probe = (f"import sys; import {module}; "
+             f"print(sorted({{m.split('.')[0] for m in sys.modules}} & set({HEAVY!r})))")
+    out = subprocess.run([sys.executable, "-c", probe], cwd=REPO, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
+
+
+def test_model_clients_are_built_on_first_use():
+    names = ("supervisor_llm", "symptom_llm", "analysis_llm", "summary_llm")
+    probe = f"import main; print([name for name in {names!r} if name in vars(main)])"
+    out = subprocess.run([sys.executable, "-c", probe], cwd=REPO, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
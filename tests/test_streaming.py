@@ -0,0 +1,49 @@
+from typing import TypedDict
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langgraph.graph import END, StateGraph
+
+from streaming import NOSTREAM_TAG, stream_turn
+
+
+class Turn(TypedDict):
+    route: str
+    summary: str
+    reply: str
+
+
+def _graph(route_to: str):
+    supervisor_llm = GenericFakeChatModel(messages=iter([AIMessage(content=route_to)]))
+    symptom_llm = GenericFakeChatModel(messages=iter([AIMessage(content="Rolling summary"),
+                                                      AIMessage(content="When did it start?")]))
+
+    def collect_symptoms(state):
+        summary = symptom_llm.invoke("summarize", config={"tags": [NOSTREAM_TAG]}).content
+        return {"summary": summary, "reply": symptom_llm.invoke("ask").content}
+
+    graph = StateGraph(Turn)
+    graph.add_node("supervisor", lambda state: {"route": supervisor_llm.invoke("route").content})
+    graph.add_node("collect_symptoms", collect_symptoms)
+    graph.set_entry_point("supervisor")
+    graph.add_conditional_edges("supervisor", lambda state: state["route"],
+                                {"collect_symptoms": "collect_symptoms", "exit": END})
+    graph.add_edge("collect_symptoms", END)
+    return graph.compile()
+
+
+def test_only_the_patient_facing_reply_is_streamed():
+    written = []
+    result, streamed = stream_turn(_graph("collect_symptoms"), {"route": "", "summary": "", "reply": ""},
+                                   write=written.append)
+    assert streamed
+    assert result["summary"] == "Rolling summary" and result["reply"] == "When did it start?"
+    assert len(written) > 3  # token by token
+    assert "".join(written) == "\nAssistant: When did it start?\n"
+
+
+def test_turn_without_a_patient_reply_streams_nothing():
+    written = []
+    result, streamed = stream_turn(_graph("exit"), {"route": "", "summary": "", "reply": ""}, write=written.append)
+    assert not streamed and written == []
+    assert result["route"] == "exit"
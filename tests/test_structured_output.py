@@ -0,0 +1,65 @@
+import json
+
+import structured_output
+from structured_output import (QUESTIONS_SCHEMA, format_analysis, parse_action, parse_analysis, parse_questions,
+                               parse_structured, request_structured)
+
+
+def test_damaged_json_is_repaired_without_another_call():
+    before = structured_output.stats()
+    assert parse_structured('{"questions": ["Any fever?", "Any cough?"', QUESTIONS_SCHEMA) == {
+        "questions": ["Any fever?", "Any cough?"]}  # Truncated
+    assert parse_structured("{'questions': ['Any fever?']}", QUESTIONS_SCHEMA) == {"questions": ["Any fever?"]}
+    after = structured_output.stats()
+    assert after["repaired"] - before["repaired"] == 2
+    assert after["parse_failures"] == before["parse_failures"]
+
+
+def test_unusable_replies_are_re_asked_only_when_retries_allow():
+    replies = iter(["I can't format that.", '{"questions": ["Any rashes?"]}'])
+    assert request_structured(lambda: next(replies), QUESTIONS_SCHEMA) is None  # Default: one round trip
+
+    replies = iter(["I can't format that.", '{"questions": ["Any rashes?"]}'])
+    before = structured_output.stats()["retries"]
+    assert request_structured(lambda: next(replies), QUESTIONS_SCHEMA, retries=1) == {"questions": ["Any rashes?"]}
+    assert structured_output.stats()["retries"] == before + 1
+
+
+def test_analysis_keeps_the_layout_patients_see():
+    analysis = {"summary": "Mild anaemia.", "key_findings": ["Hb 10.9 g/dL"], "recommendations": ["Iron studies"]}
+    assert format_analysis(analysis) == (
+        "Report Summary: Mild anaemia.\n\nKey Findings:\n- Hb 10.9 g/dL\n\nRecommendations:\n- Iron studies")
+
+
+def test_json_strings_keep_decimals_and_negative_numbers():
+    reply = json.dumps({
+        "summary": "5.6% HbA1c is borderline",
+        "key_findings": ["7.2 mmol/L fasting glucose", "-1.5 T-score at hip"],
+        "recommendations": ["2. follow-up in 3 months"],
+    })
+    analysis = parse_analysis(reply)
+    assert analysis["summary"] == "5.6% HbA1c is borderline"
+    assert analysis["key_findings"] == ["7.2 mmol/L fasting glucose", "-1.5 T-score at hip"]
+    assert analysis["recommendations"] == ["2. follow-up in 3 months"]
+
+
+def test_json_questions_keep_leading_numbers():
+    reply = json.dumps({"questions": ["2.5x ULN ALT: have you noticed dark urine?", "-0.8 SDS height: any growth concerns?"]})
+    assert parse_questions(reply) == ["2.5x ULN ALT: have you noticed dark urine?",
+                                      "-0.8 SDS height: any growth concerns?"]
+
+
+def test_plain_text_fallback_strips_list_markers_only():
+    reply = ("Report Summary: Mild anaemia.\n\nKey Findings:\n- 7.2 mmol/L fasting glucose\n- -1.5 T-score at hip\n"
+             "\nRecommendations:\n1. Repeat HbA1c (5.6%)")
+    analysis = parse_analysis(reply)
+    assert analysis["key_findings"] == ["7.2 mmol/L fasting glucose", "-1.5 T-score at hip"]
+    assert analysis["recommendations"] == ["Repeat HbA1c (5.6%)"]
+    assert parse_questions("1. 2.5x ULN ALT: any dark urine?\n2. Any itching?") == [
+        "2.5x ULN ALT: any dark urine?", "Any itching?"]
+
+
+def test_repaired_json_and_actions():
+    assert parse_questions('```json\n{"questions": ["Any fever?",]}\n```') == ["Any fever?"]
+    assert parse_action('{"action": "process_report"}', ["collect_symptoms", "process_report"]) == "process_report"
+    assert parse_action("I would collect_symptoms first", ["collect_symptoms", "process_report"]) == "collect_symptoms"
@@ -0,0 +1,61 @@
+import threading
+
+import pytest
+
+from task_graph import TaskGraph
+
+
+def test_independent_tasks_overlap_and_dependents_get_their_results():
+    both_running = threading.Barrier(2, timeout=5)
+
+    def analysis(report):
+        both_running.wait()  # Only returns if questions is running at the same time
+        return f"analysis of {report}"
+
+    def questions(report):
+        both_running.wait()
+        return [f"about {report}?"]
+
+    graph = TaskGraph(max_workers=2)
+    graph.add_value("report", "cbc.pdf")
+    graph.add("analysis", analysis, deps=["report"])
+    graph.add("questions", questions, deps=["report"])
+    graph.add("final", lambda analysis, questions: (analysis, questions), deps=["analysis", "questions"])
+    results = graph.run(timeout=5)
+    assert results["final"] == ("analysis of cbc.pdf", ["about cbc.pdf?"])
+    assert set(graph.stats()["tasks"]) == {"analysis", "questions", "final"}
+    graph.shutdown()
+
+
+def test_tasks_wait_for_inputs_set_later():
+    graph = TaskGraph()
+    graph.add_input("answers")
+    graph.add("final", lambda answers: answers.upper(), deps=["answers"])
+    graph.start()
+    assert not graph.future("final").done()
+    graph.set_input("answers", "no rashes")
+    assert graph.result("final", timeout=5) == "NO RASHES"
+    graph.shutdown()
+
+
+def test_a_failed_task_fails_its_dependents():
+    def parse():
+        raise ValueError("unreadable report")
+
+    graph = TaskGraph()
+    graph.add("parse", parse)
+    graph.add("analysis", lambda parse: parse, deps=["parse"])
+    graph.start()
+    with pytest.raises(ValueError, match="unreadable"):
+        graph.result("analysis", timeout=5)
+    graph.shutdown()
+
+
+def test_cycles_and_unknown_dependencies_are_rejected():
+    graph = TaskGraph()
+    graph.add("a", lambda b: b, deps=["b"])
+    graph.add("b", lambda a: a, deps=["a"])
+    with pytest.raises(ValueError, match="cycle"):
+        graph.start()
+    with pytest.raises(ValueError, match="unknown"):
+        TaskGraph().add("a", lambda missing: missing, deps=["missing"]).start()